@@ -0,0 +1,5 @@
+'''
+Created on October 17, 2026
+
+Acquisition and waveform benchmarks (simulated devices), run as scripts from the repository root
+'''
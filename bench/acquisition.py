@@ -0,0 +1,290 @@
+'''
+Created on October 17, 2026
+
+End-to-end acquisition benchmarks with simulated camera, DAQ and motors
+
+Runs live mode (finite or continuous scans), single scan and stack mode for several sensor sizes and ETL steps and
+writes frames/s, per-frame (or per-plane) latency, memory high-water mark and saving
+throughput to a JSON file. Run from the repository root:
+
+    python bench/acquisition.py --sizes 512,2048 --etl-steps 1,5 --output bench_acquisition.json
+'''
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import tracemalloc
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from src.camera import Camera
+from src.siggen import SigGen
+from src.motors import Motors
+from src.stack import LiveEngine, StackEngine, StackPipeline, acquire_scan
+from src.stitching import LinearBlendStitcher, FrameRing, stitch_tiles
+from src.writers import HDF5VolumeWriter, TiffVolumeWriter, ZarrVolumeWriter
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VOLUME_WRITERS = {  'hdf5': (HDF5VolumeWriter, '.hdf5'),
+                    'tiff': (TiffVolumeWriter, '.ome.tif'),
+                    'zarr': (ZarrVolumeWriter, '.ome.zarr') }
+
+
+def write_simulated_config(directory:str, sensor_size:int):
+    '''Writes a copy of the repository config.ini with every device simulated'''
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(os.path.join(REPOSITORY, 'config.ini'))
+    for section in ('Camera', 'SigGen', 'Lasers', 'Motors'):
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, 'Simulated', 'True')
+    config.set('Camera', 'Simulated Sensor Size', str(sensor_size) + ', ' + str(sensor_size))
+    with open(os.path.join(directory, 'config.ini'), 'w') as config_file:
+        config.write(config_file)
+
+
+def check_ring_images(camera:Camera, first_image:int, number_of_images:int):
+    '''Asserts that the last images copied from the camera ring buffer are the expected ones (recorder image numbers start at 1)'''
+    expected = [first_image + k + 1 for k in range(number_of_images)]
+    assert camera.ring_image_numbers == expected, 'Ring buffer images ' + str(camera.ring_image_numbers) + ' copied instead of ' + str(expected)
+
+
+def latency_statistics(latencies):
+    '''Mean and max latency in ms'''
+    if not latencies:
+        return {'latency mean (ms)': 0.0, 'latency max (ms)': 0.0}
+    return {'latency mean (ms)': 1e3 * float(np.mean(latencies)),
+            'latency max (ms)':  1e3 * float(np.max(latencies))}
+
+
+class Reconstruction:
+    '''Frame reconstruction as done by the controller (tile stitching or linear blend into reusable frames)'''
+
+    def __init__(self, blend:bool):
+        self.blend = blend
+        self.frame_ring = FrameRing()
+        self.stitcher = LinearBlendStitcher()
+
+    def __call__(self, images):
+        if len(images) == 1:
+            return images[0]
+        if self.blend:
+            return self.stitcher.stitch(images, out=self.frame_ring.next(images[0].shape))
+        return stitch_tiles(images, self.frame_ring.next(images[0].shape))
+
+    def release(self, frame):
+        '''Returns a reconstructed frame to the frame ring once it is used'''
+        self.frame_ring.release(frame)
+
+
+def run_live(camera:Camera, siggen:SigGen, reconstruct:Reconstruction, frames:int):
+    '''Live mode loop: scan session kept open, waveforms refreshed for every frame'''
+    latencies = []
+    siggen.open_scan_session('live')
+    start = time.perf_counter()
+    try:
+        for _ in range(frames):
+            frame_start = time.perf_counter()
+            camera.arm_scan()
+            siggen.compute_scan_waveforms()
+            reconstruct.release(reconstruct(acquire_scan(camera, siggen)))
+            latencies.append(time.perf_counter() - frame_start)
+    finally:
+        siggen.close_scan_session()
+    elapsed = time.perf_counter() - start
+    return {'frames': frames, 'frames/s': frames / elapsed, **latency_statistics(latencies)}
+
+
+def run_continuous(camera:Camera, siggen:SigGen, reconstruct:Reconstruction, frames:int):
+    '''Continuous live mode: scans regenerated by the DAQ, camera recording into a ring buffer'''
+    latencies = []
+    live_engine = LiveEngine(camera, siggen)
+    live_engine.start()
+    start = time.perf_counter()
+    try:
+        for _ in range(frames):
+            frame_start = time.perf_counter()
+            live_engine.update()
+            images = live_engine.next_scan()
+            check_ring_images(camera, (live_engine.scans_acquired - 1) * live_engine.images_per_scan, live_engine.images_per_scan)
+            reconstruct.release(reconstruct(images))
+            latencies.append(time.perf_counter() - frame_start)
+    finally:
+        live_engine.stop()
+    elapsed = time.perf_counter() - start
+    return {'frames': frames, 'frames/s': frames / elapsed, **latency_statistics(latencies)}
+
+
+def run_single(camera:Camera, siggen:SigGen, reconstruct:Reconstruction, frames:int, directory:str, file_format:str, compression:str):
+    '''Single scans: scan tasks built for every scan, each reconstructed frame saved to its own file'''
+    volume_writer, extension = VOLUME_WRITERS[file_format]
+    latencies = []
+    saved_bytes = 0
+    saving_time = 0.0
+    start = time.perf_counter()
+    for frame in range(frames):
+        frame_start = time.perf_counter()
+        camera.arm_scan()
+        siggen.compute_scan_waveforms()
+        reconstructed_frame = reconstruct(acquire_scan(camera, siggen))
+        latencies.append(time.perf_counter() - frame_start)
+
+        saving_start = time.perf_counter()
+        writer = volume_writer(os.path.join(directory, 'single_' + str(frame) + extension), 1, 'scan', {}, compression)
+        writer.write_plane(0, reconstructed_frame, {}, writer.prepare_plane(reconstructed_frame, 0))
+        writer.close()
+        reconstruct.release(reconstructed_frame)
+        saving_time += time.perf_counter() - saving_start
+        saved_bytes += reconstructed_frame.nbytes
+    elapsed = time.perf_counter() - start
+    return {'frames': frames, 'frames/s': frames / elapsed, **latency_statistics(latencies),
+            'saved MB/s': saved_bytes / saving_time / 1e6 if saving_time else 0.0}
+
+
+def run_stack(camera:Camera, siggen:SigGen, motors:Motors, reconstruct:Reconstruction, planes:int, directory:str, file_format:str, compression:str, threads:int):
+    '''Stack mode pipeline: stage moves, acquisition, reconstruction and saving overlap'''
+    volume_writer, extension = VOLUME_WRITERS[file_format]
+    writer = volume_writer(os.path.join(directory, 'stack' + extension), planes, 'stack', {}, compression)
+    compression_pool = ThreadPoolExecutor(threads)
+    acquired = {}
+    latencies = []
+    saved_bytes = [0]
+
+    def reconstruct_plane(plane, position, images):
+        acquired[plane] = time.perf_counter()
+        frame = reconstruct(images)
+        # Compression runs in the pool while the next plane is reconstructed, as in FrameSaver
+        return frame, compression_pool.submit(writer.prepare_plane, frame, plane)
+
+    def save_plane(plane, position, data):
+        frame, prepared = data
+        writer.write_plane(plane, frame, {'Horizontal Position': (position, '\u03BCm')}, prepared.result())
+        reconstruct.release(frame)
+        saved_bytes[0] += frame.nbytes
+        latencies.append(time.perf_counter() - acquired[plane])
+
+    camera.arm_scan()
+    siggen.compute_scan_waveforms()
+    start_position = motors.horizontal.get_position('\u03BCm')
+    positions = [start_position + 10.0 * plane for plane in range(planes)]
+
+    engine = StackEngine(camera, siggen, motors.horizontal, motors = motors)
+    copied_images = {}
+    copy_plane = engine.copy_plane
+    def recorded_copy_plane(plane):
+        # Recorder image numbers of each plane, checked once the pipeline is done
+        try:
+            return copy_plane(plane)
+        finally:
+            copied_images[plane] = list(camera.ring_image_numbers)
+    engine.copy_plane = recorded_copy_plane
+
+    pipeline = StackPipeline(engine, reconstruct_plane, save_plane)
+    start = time.perf_counter()
+    timings = pipeline.run(positions, '\u03BCm')
+    writer.close()
+    for plane, image_numbers in copied_images.items():
+        expected = [plane * engine.images_per_plane + k + 1 for k in range(engine.images_per_plane)]
+        assert image_numbers == expected, 'Plane ' + str(plane) + ': ring buffer images ' + str(image_numbers) + ' copied instead of ' + str(expected)
+    elapsed = time.perf_counter() - start
+    compression_pool.shutdown()
+    motors.horizontal.move_absolute_position(start_position, '\u03BCm')
+
+    saving_time = timings['saving']['total']
+    return {'planes': len(latencies), 'planes/s': len(latencies) / elapsed, **latency_statistics(latencies),
+            'saved MB/s': saved_bytes[0] / saving_time / 1e6 if saving_time else 0.0,
+            'stage mean (ms)': {stage: 1e3 * timings[stage]['mean'] for stage in StackPipeline.stages},
+            'bottleneck': timings['bottleneck'],
+            'errors': [stage + ': ' + str(error) for stage, error in pipeline.errors]}
+
+
+def measure(function, *args):
+    '''Runs a benchmark, adds the memory high-water mark (Python and numpy allocations) to its results'''
+    tracemalloc.reset_peak()
+    results = function(*args)
+    results['memory peak (MB)'] = tracemalloc.get_traced_memory()[1] / 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'End-to-end acquisition benchmarks with simulated hardware')
+    parser.add_argument('--sizes', default = '512,2048', help = 'Comma separated sensor sizes (square sensors)')
+    parser.add_argument('--etl-steps', default = '1,5', help = 'Comma separated ETL steps values')
+    parser.add_argument('--modes', default = 'live,single,stack', help = 'Comma separated modes among live, continuous, single and stack')
+    parser.add_argument('--frames', type = int, default = 5, help = 'Frames per live/single run')
+    parser.add_argument('--planes', type = int, default = 5, help = 'Planes per stack run')
+    parser.add_argument('--format', default = 'hdf5', choices = sorted(VOLUME_WRITERS), help = 'Saved file format')
+    parser.add_argument('--compression', default = 'none', help = 'Saving compression codec')
+    parser.add_argument('--threads', type = int, default = 4, help = 'Compression threads (stack mode)')
+    parser.add_argument('--blend', action = 'store_true', help = 'Reconstruct frames with linear blend stitching')
+    parser.add_argument('--output', default = 'bench_acquisition.json', help = 'JSON results file')
+    arguments = parser.parse_args()
+
+    output = os.path.abspath(arguments.output)
+    sizes = [int(size) for size in arguments.sizes.split(',')]
+    etl_steps = [int(steps) for steps in arguments.etl_steps.split(',')]
+    modes = [mode.strip() for mode in arguments.modes.split(',')]
+
+    report = {  'date':         datetime.datetime.now().isoformat(timespec = 'seconds'),
+                'platform':     platform.platform(),
+                'python':       platform.python_version(),
+                'numpy':        np.__version__,
+                'settings':     vars(arguments),
+                'results':      [] }
+
+    working_directory = os.getcwd()
+    tracemalloc.start()
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix = 'bench_acquisition_')
+        try:
+            # Devices read their settings from config.ini in the working directory
+            os.chdir(directory)
+            write_simulated_config(directory, size)
+            camera = Camera()
+            siggen = SigGen(camera)
+            motors = Motors() if 'stack' in modes else None
+            for steps in etl_steps:
+                siggen.etl_steps = steps
+                for mode in modes:
+                    reconstruct = Reconstruction(arguments.blend)
+                    # Saved files of each run go to their own directory
+                    run_directory = tempfile.mkdtemp(prefix = mode + '_' + str(steps) + '_', dir = directory)
+                    if mode == 'live':
+                        results = measure(run_live, camera, siggen, reconstruct, arguments.frames)
+                    elif mode == 'continuous':
+                        results = measure(run_continuous, camera, siggen, reconstruct, arguments.frames)
+                    elif mode == 'single':
+                        results = measure(run_single, camera, siggen, reconstruct, arguments.frames, run_directory, arguments.format, arguments.compression)
+                    elif mode == 'stack':
+                        results = measure(run_stack, camera, siggen, motors, reconstruct, arguments.planes, run_directory, arguments.format, arguments.compression, arguments.threads)
+                    else:
+                        raise ValueError('Unknown mode: ' + mode)
+                    results = {'mode': mode, 'sensor size': size, 'etl steps': steps, **results}
+                    report['results'].append(results)
+                    print(json.dumps(results))
+            if motors is not None:
+                motors.close()
+            camera.close()
+        finally:
+            os.chdir(working_directory)
+            shutil.rmtree(directory, ignore_errors = True)
+    tracemalloc.stop()
+
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent = 2)
+    print('Results written to ' + output)
+
+
+if __name__ == '__main__':
+    main()
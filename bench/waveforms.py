@@ -0,0 +1,197 @@
+'''
+Created on October 17, 2026
+
+Waveform generation microbenchmarks
+
+Times SigGen.compute_scan_waveforms and each waveform generator (squarewave, sawtooth,
+staircase) over a grid of sample rates, ETL steps and camera shutter modes, and reports
+the size of every generated buffer, the memory high-water mark of the generation and the
+generation time as a fraction of the scan time (generation becomes a bottleneck in live
+mode when it approaches the scan time). Run from the repository root:
+
+    python bench/waveforms.py --sample-rates 10000,100000,1000000 --etl-steps 1,10,50 --output bench_waveforms.json
+'''
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import contextlib
+import tracemalloc
+import numpy as np
+
+from src import siggen as siggen_module
+from src.camera import Camera
+from src.siggen import SigGen
+
+from bench.acquisition import write_simulated_config
+
+GENERATORS = ('squarewave', 'sawtooth', 'staircase', 'squarewave_period', 'sawtooth_period', 'staircase_levels')
+
+
+def time_call(function, kwargs:dict, repeat:int):
+    '''Best and mean time (in ms) of repeated calls, prints of the function are discarded'''
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(**kwargs)
+            times.append(time.perf_counter() - start)
+    return {'best (ms)': 1e3 * min(times), 'mean (ms)': 1e3 * float(np.mean(times))}
+
+
+def memory_peak(function, kwargs:dict):
+    '''Memory high-water mark (in MB) of a single call'''
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        try:
+            function(**kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return peak / 1e6
+
+
+def record_generator_calls(siggen:SigGen):
+    '''Runs compute_scan_waveforms once and returns the (generator name, keyword arguments) of every generator call'''
+    calls = []
+
+    def recorder(name):
+        generator = getattr(siggen_module, name)
+        def record(**kwargs):
+            calls.append((name, kwargs))
+            return generator(**kwargs)
+        return record
+
+    originals = {name: getattr(siggen_module, name) for name in GENERATORS}
+    try:
+        for name in GENERATORS:
+            setattr(siggen_module, name, recorder(name))
+        with contextlib.redirect_stdout(io.StringIO()):
+            siggen.compute_scan_waveforms()
+    finally:
+        for name, generator in originals.items():
+            setattr(siggen_module, name, generator)
+    return calls
+
+
+def run_point(siggen:SigGen, repeat:int):
+    '''Benchmarks the waveform generation for the current SigGen and camera settings'''
+    calls = record_generator_calls(siggen)
+    results = {'samples': siggen.total_samples, 'scan time (ms)': 1e3 * siggen.total_time}
+
+    compute = time_call(siggen.compute_scan_waveforms, {}, repeat)
+    results['compute_scan_waveforms'] = {**compute,
+                                         'memory peak (MB)': memory_peak(siggen.compute_scan_waveforms, {}),
+                                         'fraction of scan time': compute['best (ms)'] / (1e3 * siggen.total_time)}
+
+    buffers = {'camera': siggen.waveform_camera, 'galvo left': siggen.waveform_galvo_left, 'galvo right': siggen.waveform_galvo_right,
+               'etl left': siggen.waveform_etl_left, 'etl right': siggen.waveform_etl_right,
+               'camera period': siggen.waveform_camera_period, 'galvo left period': siggen.waveform_galvo_left_period,
+               'galvo right period': siggen.waveform_galvo_right_period,
+               'etl left levels': siggen.waveform_etl_left_levels, 'etl right levels': siggen.waveform_etl_right_levels}
+    buffers = {name: buffer for name, buffer in buffers.items() if buffer is not None}
+    results['buffers (MB)'] = {name: buffer.nbytes / 1e6 for name, buffer in buffers.items()}
+    results['buffers dtype'] = {name: str(buffer.dtype) for name, buffer in buffers.items()}
+
+    if siggen.compact_waveforms:
+        # Galvo + ETL samples are generated period by period when written to the DAQ
+        def generate_periods():
+            out = np.empty((4, siggen.period_samples))
+            for period in range(siggen.waveform_cycles):
+                siggen.galvo_etl_period(period, out = out)
+        results['galvo_etl_period (all periods)'] = {**time_call(generate_periods, {}, repeat),
+                                                     'memory peak (MB)': memory_peak(generate_periods, {})}
+
+    # Settings unchanged between calls (live mode loop), waveforms are taken from the waveform cache
+    siggen.waveform_cache_size = 1
+    siggen.compute_scan_waveforms()
+    results['compute_scan_waveforms (cached)'] = time_call(siggen.compute_scan_waveforms, {}, repeat)
+    siggen.waveform_cache_size = 0
+    siggen.clear_waveform_cache()
+
+    # The two galvos (and the two ETLs) only differ by amplitude and offset, the first call of each generator is timed
+    generators = {}
+    for name, kwargs in calls:
+        if name not in generators:
+            generator = getattr(siggen_module, name)
+            generators[name] = {**time_call(generator, kwargs, repeat),
+                                'memory peak (MB)': memory_peak(generator, kwargs)}
+    results['generators'] = generators
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Waveform generation microbenchmarks')
+    parser.add_argument('--sample-rates', default = '10000,40000,100000,400000,1000000', help = 'Comma separated sample rates (samples/s)')
+    parser.add_argument('--etl-steps', default = '1,5,10,25,50', help = 'Comma separated ETL steps values')
+    parser.add_argument('--shutter-modes', default = 'Lightsheet,Rolling,Global', help = 'Comma separated camera shutter modes')
+    parser.add_argument('--size', type = int, default = 2048, help = 'Sensor size (square sensor), sets the galvo scan time in lightsheet mode')
+    parser.add_argument('--compact', action = 'store_true', help = 'Compact waveforms (one period, ETL levels), see SigGen.compact_waveforms')
+    parser.add_argument('--waveform-type', default = 'float64', choices = ('float64', 'float32', 'int16'), help = 'Galvo + ETL waveforms data type, see SigGen.waveform_type')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Timed calls per measurement')
+    parser.add_argument('--output', default = 'bench_waveforms.json', help = 'JSON results file')
+    arguments = parser.parse_args()
+
+    output = os.path.abspath(arguments.output)
+    sample_rates = [int(rate) for rate in arguments.sample_rates.split(',')]
+    etl_steps = [int(steps) for steps in arguments.etl_steps.split(',')]
+    shutter_modes = [mode.strip() for mode in arguments.shutter_modes.split(',')]
+
+    report = {  'date':         datetime.datetime.now().isoformat(timespec = 'seconds'),
+                'platform':     platform.platform(),
+                'python':       platform.python_version(),
+                'numpy':        np.__version__,
+                'settings':     vars(arguments),
+                'results':      [] }
+
+    working_directory = os.getcwd()
+    directory = tempfile.mkdtemp(prefix = 'bench_waveforms_')
+    try:
+        # Devices read their settings from config.ini in the working directory
+        os.chdir(directory)
+        write_simulated_config(directory, arguments.size)
+        camera = Camera()
+        siggen = SigGen(camera)
+        siggen.etl_activated = True
+        siggen.compact_waveforms = arguments.compact
+        siggen.waveform_type = arguments.waveform_type
+        # Waveforms are generated on every call (the cached case is measured separately)
+        siggen.waveform_cache_size = 0
+        for shutter_mode in shutter_modes:
+            # Arming sets the camera line time of the shutter mode
+            camera.shutter_mode = shutter_mode
+            with contextlib.redirect_stdout(io.StringIO()):
+                camera.arm_scan()
+            for sample_rate in sample_rates:
+                siggen.sample_rate = sample_rate
+                for steps in etl_steps:
+                    siggen.etl_steps = steps
+                    point = {'shutter mode': shutter_mode, 'sample rate': sample_rate, 'etl steps': steps}
+                    try:
+                        results = {**point, **run_point(siggen, arguments.repeat)}
+                    except AssertionError as error:
+                        # Galvo timings too short for the camera readout in this shutter mode
+                        results = {**point, 'error': str(error)}
+                    report['results'].append(results)
+                    print(json.dumps(results))
+        camera.close()
+    finally:
+        os.chdir(working_directory)
+        shutil.rmtree(directory, ignore_errors = True)
+
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent = 2)
+    print('Results written to ' + output)
+
+
+if __name__ == '__main__':
+    main()
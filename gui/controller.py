@@ -16,6 +16,7 @@ import threading
 import time
 import queue
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 import webbrowser
 import nidaqmx
 import h5py
@@ -35,6 +36,9 @@ from src.siggen import SigGen
 from src.motors import Motors
 from src.lasers import Lasers
 from src.etls import ETLs
+from src.stack import LiveEngine, StackEngine, StackPipeline, acquire_scan
+from src.stitching import LinearBlendStitcher, FrameRing, stitch_tiles, crop_tiles
+from src.writers import HDF5VolumeWriter, TiffVolumeWriter, ZarrVolumeWriter
 
 
 class Controller_MainWindow(QMainWindow):
@@ -44,6 +48,14 @@ class Controller_MainWindow(QMainWindow):
     _cfg_settings = {}
     _cfg_settings['Units'] = 'mm'
     _cfg_settings['Image File Format'] = 'HDF5'
+    _cfg_settings['Blend Accumulation'] = 'float64'
+    _cfg_settings['Compression'] = 'none'
+    _cfg_settings['Compression Level'] = 4
+    _cfg_settings['Saver Threads'] = 4
+    _cfg_settings['Saver Queue Size'] = 8
+    _cfg_settings['Saver Backpressure'] = 'block'
+    _cfg_settings['Pyramid Levels'] = '2, 4, 8'
+    _cfg_settings['Live Mode'] = 'finite'
 
     # Signals
     sig_beep = pyqtSignal()
@@ -125,11 +137,39 @@ class Controller_MainWindow(QMainWindow):
 
         if str.lower(self.cfg_settings['Image File Format']) == 'hdf5':
             self.save_format            = 'hdf5'
-        if str.lower(self.cfg_settings['Image File Format']) == 'tiff':
+        elif str.lower(self.cfg_settings['Image File Format']) == 'tiff':
             self.save_format            = 'tiff'
+        elif str.lower(self.cfg_settings['Image File Format']) == 'zarr':
+            self.save_format            = 'zarr'
         else: # default file format
             self.save_format            = 'hdf5'
 
+        if str.lower(self.cfg_settings['Compression']) in ('gzip', 'lzf', 'bitshuffle'):
+            self.save_compression       = str.lower(self.cfg_settings['Compression'])
+        else: # default (no compression)
+            self.save_compression       = 'none'
+        self.save_compression_level = int(self.cfg_settings['Compression Level'])
+        self.saver_threads          = max(1, int(self.cfg_settings['Saver Threads']))
+        self.saver_queue_size       = max(1, int(self.cfg_settings['Saver Queue Size']))
+        if str.lower(self.cfg_settings['Saver Backpressure']) == 'drop':
+            self.saver_backpressure     = 'drop'
+        else: # default (acquisition waits for the saver)
+            self.saver_backpressure     = 'block'
+        # Downsampling factors of the overview levels saved with each volume (empty for none)
+        self.save_pyramid           = tuple(int(factor) for factor in str(self.cfg_settings['Pyramid Levels']).replace(',', ' ').split())
+        # Continuous live mode: scans regenerated by the DAQ board, camera recording into a ring buffer
+        self.live_mode_continuous   = str.lower(self.cfg_settings['Live Mode']) == 'continuous'
+
+        if str.lower(self.cfg_settings['Blend Accumulation']) == 'float32':
+            self.stitcher               = LinearBlendStitcher(accumulation=np.float32)
+        else: # default accumulation (same output as column by column blend)
+            self.stitcher               = LinearBlendStitcher(accumulation=np.float64)
+
+        # Reusable output frames for reconstructed frames and cropped buffers (see acquire_frame, release_frame)
+        self.frame_ring             = FrameRing()
+        self.crop_ring              = FrameRing()
+        self.reconstructed_frame    = None
+
         self.save_directory         = os.path.normpath(os.path.expanduser('~') + '\\Documents\\LightSheetData')
         self.save_filename          = ''
         self.save_description       = ''
@@ -168,6 +208,7 @@ class Controller_MainWindow(QMainWindow):
         self.horizontal_backward_boundary_selected = False
         self.stack_starting_plane = None
         self.stack_ending_plane = None
+        self.stack_pipeline = None
 
         self.default_buttons = [self.ui.pushButton_acqStartPreviewMode,
                                 self.ui.pushButton_acqStartLiveMode,
@@ -420,6 +461,7 @@ class Controller_MainWindow(QMainWindow):
             time.sleep(1)
             self.camera.close()
             self.etls.close()
+            self.motors.close()
             self.timer_imageview.stop()
             QApplication.restoreOverrideCursor()
             event.accept()
@@ -664,19 +706,28 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_position_horizontal(self):
         '''Updates the current horizontal sample position displayed'''
-        self.current_horizontal_position_text = self.units_fixformat.format(self.motors.horizontal.get_position(self.units), self.units)
+        self.current_horizontal_position_text = self.units_fixformat.format(self.motors.horizontal.get_position(self.units, cached=True), self.units)
         self.ui.label_sampleCurrentHPosition.setText(self.current_horizontal_position_text)
 
     def updateUi_position_vertical(self):
         '''Updates the current vertical sample position displayed'''
-        self.current_vertical_position_text = self.units_fixformat.format(self.motors.vertical.get_position(self.units), self.units)
+        self.current_vertical_position_text = self.units_fixformat.format(self.motors.vertical.get_position(self.units, cached=True), self.units)
         self.ui.label_sampleCurrentVPosition.setText(self.current_vertical_position_text)
 
     def updateUi_position_camera(self):
         '''Updates the current camera position displayed'''
-        self.current_camera_position_text = self.units_fixformat.format(self.motors.camera.get_position(self.units), self.units)
+        self.current_camera_position_text = self.units_fixformat.format(self.motors.camera.get_position(self.units, cached=True), self.units)
         self.ui.label_cameraCurrentPosition.setText(self.current_camera_position_text)
 
+    def read_positions_text(self):
+        '''Reads the current (horizontal, vertical, camera) positions from the motors, for the acquisition metadata
+
+        Unlike the displayed positions, these are not taken from the positions cache
+        '''
+        return (self.units_fixformat.format(self.motors.horizontal.get_position(self.units), self.units),
+                self.units_fixformat.format(self.motors.vertical.get_position(self.units), self.units),
+                self.units_fixformat.format(self.motors.camera.get_position(self.units), self.units))
+
     def updateUi_move_to_horizontal_position(self):
         '''Moves the sample to a specified horizontal position'''
         if ((self.ui.doubleSpinBox_sampleSetHPosition.value() >= self.motors.horizontal.get_limit_low(self.units)) and (self.ui.doubleSpinBox_sampleSetHPosition.value() <= self.motors.horizontal.get_limit_high(self.units))):
@@ -753,7 +804,7 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_move_sample_backward(self):
         '''Sample motor backward horizontal motion'''
-        if self.motors.horizontal.get_position(self.units) - self.ui.doubleSpinBox_sampleHStepSize.value() >= self.motors.horizontal.get_limit_low(self.units):
+        if self.motors.horizontal.get_position(self.units, cached=True) - self.ui.doubleSpinBox_sampleHStepSize.value() >= self.motors.horizontal.get_limit_low(self.units):
             self.motors.horizontal.move_relative_position(-self.ui.doubleSpinBox_sampleHStepSize.value(), self.units)
             self.updateUi_message_printer ('Sample moving backward')
             self.updateUi_position_horizontal()
@@ -766,7 +817,7 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_move_sample_forward(self):
         '''Sample motor forward horizontal motion'''
-        if self.motors.horizontal.get_position(self.units) + self.ui.doubleSpinBox_sampleHStepSize.value() <= self.motors.horizontal.get_limit_high(self.units):
+        if self.motors.horizontal.get_position(self.units, cached=True) + self.ui.doubleSpinBox_sampleHStepSize.value() <= self.motors.horizontal.get_limit_high(self.units):
             self.motors.horizontal.move_relative_position(self.ui.doubleSpinBox_sampleHStepSize.value(), self.units)
             self.updateUi_message_printer('Sample moving forward')
             self.updateUi_position_horizontal()
@@ -779,7 +830,7 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_move_sample_up(self):
         '''Sample motor upward vertical motion'''
-        if self.motors.vertical.get_position(self.units) - self.ui.doubleSpinBox_sampleVStepSize.value() >= self.motors.vertical.get_limit_low(self.units):
+        if self.motors.vertical.get_position(self.units, cached=True) - self.ui.doubleSpinBox_sampleVStepSize.value() >= self.motors.vertical.get_limit_low(self.units):
             self.motors.vertical.move_relative_position(-self.ui.doubleSpinBox_sampleVStepSize.value(), self.units)
             self.updateUi_message_printer('Sample stepping up')
             self.updateUi_position_vertical()
@@ -792,7 +843,7 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_move_sample_down(self):
         '''Sample motor downward vertical motion'''
-        if self.motors.vertical.get_position(self.units) + self.ui.doubleSpinBox_sampleVStepSize.value() <= self.motors.vertical.get_limit_high(self.units):
+        if self.motors.vertical.get_position(self.units, cached=True) + self.ui.doubleSpinBox_sampleVStepSize.value() <= self.motors.vertical.get_limit_high(self.units):
             self.motors.vertical.move_relative_position(self.ui.doubleSpinBox_sampleVStepSize.value(), self.units)
             self.updateUi_message_printer('Sample stepping down')
             self.updateUi_position_vertical()
@@ -805,7 +856,7 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_move_camera_backward(self):
         '''Camera motor backward horizontal motion'''
-        if self.motors.camera.get_position(self.units) - self.ui.doubleSpinBox_cameraStepSize.value() >= self.motors.camera.get_limit_low(self.units):
+        if self.motors.camera.get_position(self.units, cached=True) - self.ui.doubleSpinBox_cameraStepSize.value() >= self.motors.camera.get_limit_low(self.units):
             self.motors.camera.move_relative_position(-self.ui.doubleSpinBox_cameraStepSize.value(), self.units)
             self.updateUi_message_printer('Camera stepping backward')
             self.updateUi_position_camera()
@@ -819,7 +870,7 @@ class Controller_MainWindow(QMainWindow):
 
     def updateUi_move_camera_forward(self):
         '''Camera motor forward horizontal motion'''
-        if self.motors.camera.get_position(self.units) + self.ui.doubleSpinBox_cameraStepSize.value() <= self.motors.camera.get_limit_high(self.units):
+        if self.motors.camera.get_position(self.units, cached=True) + self.ui.doubleSpinBox_cameraStepSize.value() <= self.motors.camera.get_limit_high(self.units):
             self.motors.camera.move_relative_position(self.ui.doubleSpinBox_cameraStepSize.value(), self.units)
             self.updateUi_message_printer('Camera stepping forward')
             self.updateUi_position_camera()
@@ -1257,8 +1308,10 @@ class Controller_MainWindow(QMainWindow):
                         self.ui.tableWidget_fileAttributes.resizeColumnsToContents()
                         self.ui.tableWidget_fileAttributes.setEditTriggers(QAbstractItemView.NoEditTriggers) #No editing possible
 
-                    # Display image
-                    data = dataset[()]
+                    # Display image (first image of a volume, coordinates are not displayed)
+                    if dataset.ndim < 2:
+                        continue
+                    data = dataset[(0,) * (dataset.ndim - 2)]
                     plt.figure(self.open_directory + ' (' + self.dataset_name + ')')
                     plt.imshow(data,cmap = 'gray')
                     plt.show(block = False)   #Prevents the plot from blocking the execution of the code...
@@ -1382,14 +1435,29 @@ class Controller_MainWindow(QMainWindow):
         # Starting lasers
         self.start_lasers()
 
-        while self.live_mode_started:
-            # Setting the camera for scan acquisition
-            self.camera.arm_scan()
+        if self.live_mode_continuous:
+            # Scans run continuously, settings changed in the UI are hot-swapped into the running scan
+            live_engine = LiveEngine(self.camera, self.siggen, motors = self.motors)
+            live_engine.start()
+            while self.live_mode_started:
+                live_engine.update()
+                self.store_buffer_metadata()
+                self.process_scan(live_engine.next_scan())
+            live_engine.stop()
+        else:
+            # Scan tasks are built once and re-armed for every live frame
+            self.siggen.open_scan_session('live')
+
+            while self.live_mode_started:
+                # Setting the camera for scan acquisition
+                self.camera.arm_scan()
 
-            # Refresh scan waveforms every loop (live mode)
-            self.siggen.compute_scan_waveforms()
-            # Get single image
-            self.acquire_scan()
+                # Refresh scan waveforms every loop (live mode)
+                self.siggen.compute_scan_waveforms()
+                # Get single image
+                self.acquire_scan()
+
+            self.siggen.close_scan_session()
 
         # Put ETLs in standby mode: 2.5V corresponds no current through coil (mid 0-5V adjustable range)
         self.siggen.update_etls(left_etl=2.5, right_etl=2.5)
@@ -1436,9 +1504,7 @@ class Controller_MainWindow(QMainWindow):
         ##self.move_camera_to_focus()
 
         # Getting positions for the image
-        self.image_hor_pos_text = self.current_horizontal_position_text
-        self.image_ver_pos_text = self.current_vertical_position_text
-        self.image_cam_pos_text = self.current_camera_position_text
+        self.image_hor_pos_text, self.image_ver_pos_text, self.image_cam_pos_text = self.read_positions_text()
 
         # Setting the camera for scan acquisition
         self.camera.arm_scan()
@@ -1470,144 +1536,76 @@ class Controller_MainWindow(QMainWindow):
     def crop_buffer(self, buffer):
         '''Crops each frame of a buffer with 20% frame-to-frame overlap'''
 
-        image_xsize = buffer.shape[2]
-        image_ysize = buffer.shape[1]
-        tile_count = buffer.shape[0]
+        image_xsize = buffer[0].shape[1]
+        image_ysize = buffer[0].shape[0]
+        tile_count = len(buffer)
 
         if tile_count == 1:
-            cropped_buffer = buffer
+            cropped_buffer = buffer[0][np.newaxis]
         else:
             tile_width = int(image_xsize/tile_count)
             tile_width_overlap = int(tile_width*0.2)
 
-            #Initializing empty cropped buffer
-            cropped_buffer = np.zeros((tile_count, image_ysize, tile_width + (2*tile_width_overlap)), np.uint16)
-
-            # Crop with overlap
-            for frame in range(tile_count):
-                # NOTE - disabled intensity normalization
-                # # Uniformize frame intensities
-                # average = np.average(buffer[frame,0:100,:]) #Average the  first rows
-                # if frame == 0:
-                #     reference_average = average
-                # else:
-                #     average_ratio = reference_average/average
-                #     # buffer[frame,:,:] = buffer[frame,:,:] * average_ratio
-
-                first_column = int(frame * tile_width - tile_width_overlap)
-                next_first_column = int(first_column + tile_width + (2*tile_width_overlap))
-                if frame == 0:  #For the first column step
-                    cropped_buffer[frame,:,tile_width_overlap:] = buffer[frame,:,0:tile_width + tile_width_overlap]
-                elif frame == tile_count-1:  #For the last column step (may be different than the others...)
-                    last_column_step = int(image_xsize - first_column)
-                    cropped_buffer[frame,:,0:last_column_step] = buffer[frame,:,first_column:]
-                else:
-                    cropped_buffer[frame,:,:] = buffer[frame,:,first_column:next_first_column]
+            # Crop with overlap into a reusable buffer
+            # NOTE - disabled intensity normalization (see git history)
+            cropped_buffer = self.crop_ring.next((tile_count, image_ysize, tile_width + (2*tile_width_overlap)))
+            crop_tiles(buffer, 0.2, cropped_buffer)
         return cropped_buffer
 
 
+    def acquire_frame(self, frame):
+        '''Holds a reusable frame (reconstructed frame or cropped buffer) until release_frame, other arrays are ignored'''
+        self.frame_ring.acquire(frame)
+        self.crop_ring.acquire(frame)
+
+    def release_frame(self, frame):
+        '''Releases a hold on a reusable frame, it is reused once all its holders released it'''
+        self.frame_ring.release(frame)
+        self.crop_ring.release(frame)
+
+
     def reconstruct_frame(self, buffer):
         '''Reconstructs frame from buffer'''
 
-        image_xsize = buffer.shape[2]
-        image_ysize = buffer.shape[1]
-        tile_count = buffer.shape[0]
-
-        #Initializing empty frame
-        reconstructed_frame = np.zeros((image_ysize, image_xsize), np.uint16)
+        image_xsize = buffer[0].shape[1]
+        image_ysize = buffer[0].shape[0]
+        tile_count = len(buffer)
 
         # Crops each frame of a buffer with no overlap and merge
         if tile_count == 1:
-            reconstructed_frame = buffer[0,:,:]
+            reconstructed_frame = buffer[0]
         else:
-            tile_width = int(image_xsize/tile_count)
-
-            for frame in range(tile_count):
-                # NOTE - disabled intensity normalization
-                # # Uniformize frame intensities
-                # average = np.average(buffer[frame,0:100,:]) #Average the  first rows
-                # if frame == 0:
-                #     reference_average = average
-                # else:
-                #     average_ratio = reference_average/average
-                #     #print('average_ratio:'+str(average_ratio))
-                #     # buffer[frame,:,:] = buffer[frame,:,:] * average_ratio
-
-                # Reconstruct frame
-                first_column = frame * tile_width
-                next_first_column = first_column + tile_width
-                if frame == tile_count-1:  #For the last column step (may be different than the others...)
-                    reconstructed_frame[:,first_column:] = buffer[frame,:,first_column:]
-                else:
-                    reconstructed_frame[:,first_column:next_first_column] = buffer[frame,:,first_column:next_first_column]
+            # Only the column band of each tile is copied into a reusable frame
+            # NOTE - disabled intensity normalization (see git history)
+            reconstructed_frame = stitch_tiles(buffer, self.frame_ring.next((image_ysize, image_xsize)))
         return reconstructed_frame
 
 
     def reconstruct_frame_linear_blend(self, buffer):
         '''Reconstructs frame from buffer using linear blend over 20% overlap'''
+        # Weight masks are cached per (tile_count, xsize, overlap) by the stitcher
+        return self.stitcher.stitch(buffer, out=self.frame_ring.next(buffer[0].shape))
 
-        image_xsize = buffer.shape[2]
-        image_ysize = buffer.shape[1]
-        tile_count = buffer.shape[0]
-
-        # Initializing empty output frame
-        reconstructed_frame = np.zeros((image_ysize, image_xsize), np.uint16)
 
-        if tile_count == 1:
-            reconstructed_frame = buffer[0,:,:]
-        else:
-            # Crops each frame of a buffer with 20% overlap for futher frame reconstruction
-            tile_width = int(image_xsize/tile_count)
-            tile_width_overlap = int(tile_width*0.2)
+    def acquire_scan(self):
+        """
+        Generate scan tasks using previously computed waveforms and acquire a single reconstructed frame
+        """
 
-            # Initializing empty cropped buffer
-            cropped_buffer = np.zeros((tile_count, image_ysize, tile_width + (2*tile_width_overlap)), np.uint16)
-
-            # Crop with overlap
-            for frame in range(tile_count):
-                first_column = int(frame * tile_width - tile_width_overlap)
-                next_first_column = int(first_column + tile_width + (2*tile_width_overlap))
-                if frame == 0:  #For the first column step
-                    cropped_buffer[frame,:,tile_width_overlap:] = buffer[frame,:,0:tile_width + tile_width_overlap]
-                elif frame == tile_count-1:  #For the last column step (may be different than the others...)
-                    last_column_step = int(image_xsize - first_column)
-                    cropped_buffer[frame,:,0:last_column_step] = buffer[frame,:,first_column:]
-                else:
-                    cropped_buffer[frame,:,:] = buffer[frame,:,first_column:next_first_column]
+        # TODO - thread lock siggen and camera while we acquire
 
-            # Reconstruct frame with linear blend for overlapping region
-            weight_step = 1/(2*tile_width_overlap)
+        self.store_buffer_metadata()
 
-            for frame in range(tile_count):
-                first_center_column = int(frame * tile_width + tile_width_overlap)
-                last_center_column = int((frame+1) * tile_width - tile_width_overlap)
-                previous_last_center_column = int(frame * tile_width - tile_width_overlap)
+        # One image per ETL step (scan tasks of an open scan session are kept)
+        recorded_images = acquire_scan(self.camera, self.siggen)
 
-                if frame == 0:  #For the first column step
-                    reconstructed_frame[:,0:last_center_column] = cropped_buffer[frame,:,tile_width_overlap:tile_width]
-                else:
-                    for column in range(2*tile_width_overlap):
-                        frame_column = column + previous_last_center_column
-                        last_buffer_column = column + tile_width
-                        buffer_weight = column * weight_step
-                        last_buffer_weight = 1 - column * weight_step
-                        reconstructed_frame[:,frame_column] = buffer_weight*cropped_buffer[frame,:,column] + last_buffer_weight*cropped_buffer[(frame-1),:,last_buffer_column]
-                    if frame == tile_count-1:  #For the last column step (may be different than the others...)
-                        last_column_step = int(image_xsize - first_center_column)
-                        reconstructed_frame[:,first_center_column:] = cropped_buffer[frame,:,(2*tile_width_overlap):(2*tile_width_overlap)+last_column_step]
-                    else:
-                        reconstructed_frame[:,first_center_column:last_center_column] = cropped_buffer[frame,:,(2*tile_width_overlap):tile_width]
-        return reconstructed_frame
+        self.process_scan(recorded_images)
 
 
-    def acquire_scan(self):
+    def store_buffer_metadata(self):
         """
-        Generate scan tasks using previously computed waveforms and acquire a single reconstructed frame
+        Store metadata about buffer to be acquired
         """
-
-        # TODO - thread lock siggen and camera while we acquire
-
-        # Store metadata about buffer to be acquired
         self.buffer_metadata_general = {}
         self.buffer_metadata_general['Date']  = str(datetime.date.today())
         self.buffer_metadata_general['Sample Name']  = str(self.ui.lineEdit_saveDescription.text())
@@ -1624,32 +1622,16 @@ class Controller_MainWindow(QMainWindow):
         # self.buffer_metadata['Vertical Position']  = self.motors.vertical.get_position('mm')
         # self.buffer_metadata['Camera Position']  = self.motors.camera.get_position('mm')
 
-        # Number of images to be acquired from the camera
-        number_of_images = self.siggen.waveform_cycles
-
-        # Creating acquisition tasks
-        self.siggen.create_scanner()
-
-        # Prime the camera recorder before we start the acquisition taks
-        self.camera.start_recorder(number_of_images)
-        self.siggen.start_scanner()
 
-        # Monitor completion of acquisition tasks and camera recorder
-        self.camera.monitor_recorder(number_of_images)
-        self.siggen.monitor_scanner()
-
-        # Stop tasks and recorder
-        self.camera.stop_recorder()
-        self.siggen.stop_scanner()
-
-        # Recover images from the recorder
-        # Note: Images must be recovered before deleting the recorder
-        recorded_images = self.camera.copy_recorder_images(number_of_images)
-        self.buffer = np.asarray(recorded_images)
+    def process_scan(self, recorded_images):
+        """
+        Reconstruct a frame from the images of a scan (one per ETL step) and display it
+        """
+        # Images are kept as recorded (one 2D image per ETL step), no (etl_steps, ysize, xsize) copy is made
+        self.buffer = recorded_images
 
-        # Delete tasks and recorder
-        self.camera.delete_recorder()
-        self.siggen.delete_scanner()
+        # Previous frame is released, display and saving queues hold the frames they still need
+        self.release_frame(self.reconstructed_frame)
 
         # Frame reconstruction options
         if self.ui.checkBox_saveStitchBlend.isChecked():
@@ -1731,10 +1713,11 @@ class Controller_MainWindow(QMainWindow):
                 self.frame_saver.set_files(1,self.save_filename,'singleImage',1,'ETLscan')
                 cropped_buffer = self.crop_buffer(self.buffer)
                 self.frame_saver.enqueue_buffer(cropped_buffer)
+                self.release_frame(cropped_buffer)
                 self.updateUi_message_printer('Saving Images (one for each ETL scan, cropped)')
             elif self.ui.checkBox_saveAllFull.isChecked():
                 self.frame_saver.set_files(1,self.save_filename,'singleImage',1,'FullETLscan')
-                self.frame_saver.enqueue_buffer(self.buffer)
+                self.frame_saver.enqueue_buffer(np.asarray(self.buffer))
                 self.updateUi_message_printer('Saving Images (one for each ETL scan, full)')
             else:
                 self.frame_saver.set_files(1,self.save_filename,'singleImage',1,'reconstructed_frame')
@@ -1742,7 +1725,8 @@ class Controller_MainWindow(QMainWindow):
                 self.updateUi_message_printer('Saving Reconstructed Image')
 
             self.frame_saver.start_saving()
-            self.frame_saver.stop_saving()
+            # GUI thread, write errors are reported by the frame saver status messages
+            self.frame_saver.stop_saving(wait=False)
         else:
             self.sig_beep.emit()
             QMessageBox.warning(self, "Save Warning", "Select a directory and enter a valid filename before saving", QMessageBox.Ok, QMessageBox.Ok)
@@ -1774,6 +1758,8 @@ class Controller_MainWindow(QMainWindow):
         '''Start or stop stack mode, depending on the button status'''
         if self.stack_mode_started:
             self.stack_mode_started = False
+            if self.stack_pipeline is not None:
+                self.stack_pipeline.stop()
             self.stack_mode_thread.join()
         else:
             self.close_modes()
@@ -1835,10 +1821,11 @@ class Controller_MainWindow(QMainWindow):
             # Setting frame saver
             self.frame_saver.reinit(3)
             self.frame_saver.add_sample_name(self.save_description)
+            # Whole stack is saved as a single volume dataset
             if self.ui.checkBox_saveAllCrop.isChecked():
-                self.frame_saver.set_files(self.number_of_planes, self.save_filename, 'stack', 1, 'ETLscan')
+                self.frame_saver.set_files(1, self.save_filename, 'stack', self.number_of_planes, 'ETLscan')
             elif self.ui.checkBox_saveAllFull.isChecked():
-                self.frame_saver.set_files(self.number_of_planes, self.save_filename, 'stack', 1, 'FullETLscan')
+                self.frame_saver.set_files(1, self.save_filename, 'stack', self.number_of_planes, 'FullETLscan')
             else:
                 self.frame_saver.set_files(1, self.save_filename, 'stack', self.number_of_planes, 'reconstructed_frame')
             # Starting frame saver
@@ -1851,59 +1838,44 @@ class Controller_MainWindow(QMainWindow):
         self.both_lasers_activated = True
         self.start_lasers()
 
-        # Set progress bar
-        progress_value = 0
-        progress_increment = 100/self.number_of_planes
+        # Set progress bar (updated by the saving stage)
+        self.stack_progress_value = 0
+        self.stack_progress_increment = 100/self.number_of_planes
         self.sig_progress_update.emit(0) #To reset progress bar
 
         # Compute scan waveforms only once before we start the stack acquisition
         # Changes to settings won't be effective until we stop/restart mode
         self.siggen.compute_scan_waveforms()
 
-        for plane in range(int(self.number_of_planes)):
-            if self.stack_mode_started == False:
-                self.sig_message.emit('Stack Acquisition Interrupted')
-                break
-            else:
-                # Moving sample position
-                position = self.stack_starting_plane + (plane * self.stack_step)
-                self.motors.horizontal.move_absolute_position(position,'\u03BCm')  #Position in micro-meters
-                #FIXME - updating ui within secondary thread
-                self.updateUi_position_horizontal()
+        # Whole volume is acquired with one scan session and one camera recording session
+        # Stage motion, acquisition, reconstruction and saving are pipelined in separate threads
+        self.stack_engine = StackEngine(self.camera, self.siggen, self.motors.horizontal, motors = self.motors)
 
-                # Moving the camera to focus
-                #FIXME - Add focus adjustement to stack mode
-                #self.calculate_camera_focus()
-                #self.move_camera_to_focus()
+        # Vertical and camera motors don't move during the stack, their positions are read once for every plane
+        vertical_position_text = self.units_fixformat.format(self.motors.vertical.get_position(self.units), self.units)
+        camera_position_text = self.units_fixformat.format(self.motors.camera.get_position(self.units), self.units)
+        save_plane = lambda plane, position, data: self.stack_save_plane(plane, position, data, vertical_position_text, camera_position_text)
+        self.stack_pipeline = StackPipeline(self.stack_engine, self.stack_reconstruct_plane, save_plane)
+        positions = [self.stack_starting_plane + (plane * self.stack_step) for plane in range(int(self.number_of_planes))]
 
-                if self.saving_allowed:
-                    self.frame_saver.add_motor_parameters(self.current_horizontal_position_text, self.current_vertical_position_text, self.current_camera_position_text)
+        stack_timings = self.stack_pipeline.run(positions, '\u03BCm')  #Positions in micro-meters
+        self.sig_refresh_position_horizontal.emit()
 
-                # Getting image
-                self.acquire_scan()
+        # Report per-stage timings to spot the stack bottleneck
+        for stage in StackPipeline.stages:
+            self.sig_message.emit(f"Stack {stage}: {stack_timings[stage]['mean']*1e3:.1f} ms/plane (max {stack_timings[stage]['max']*1e3:.1f} ms)")
+        self.sig_message.emit(f"Stack bottleneck: {stack_timings['bottleneck']}")
 
-                # Saving frame
-                if self.saving_allowed:
-                    if self.ui.checkBox_saveAllCrop.isChecked():
-                        cropped_buffer = self.crop_buffer(self.buffer)
-                        self.frame_saver.enqueue_buffer(cropped_buffer)
-                        self.sig_message.emit('Saving All Images (one for each ETL step, cropped)')
-                    elif self.ui.checkBox_saveAllFull.isChecked():
-                        self.frame_saver.enqueue_buffer(self.buffer)
-                        self.sig_message.emit('Saving All Images (one for each ETL step, full)')
-                    else:
-                        self.frame_saver.enqueue_buffer(self.reconstructed_frame)
-                        self.sig_message.emit('Saving Reconstructed Image')
-
-                # Update progress bar
-                progress_value += progress_increment
-                self.sig_progress_update.emit(int(progress_value))
-
-        if self.stack_mode_started:
+        for stage, error in self.stack_pipeline.errors:
+            self.sig_message.emit(f"Stack {stage} error: {error}")
+        if self.stack_mode_started and not self.stack_pipeline.errors:
             self.sig_progress_update.emit(100) #In case the number of planes is not a multiple of 100
+        else:
+            self.sig_message.emit('Stack Acquisition Interrupted')
 
         if self.saving_allowed:
-            self.frame_saver.stop_saving()
+            if not self.frame_saver.stop_saving():
+                self.sig_message.emit('Stack Saving Failed: ' + self.frame_saver.error_message)
 
         # Put ETLs in standby mode: 2.5V corresponds no current through coil (mid 0-5V adjustable range)
         self.siggen.update_etls(left_etl=2.5, right_etl=2.5)
@@ -1919,6 +1891,53 @@ class Controller_MainWindow(QMainWindow):
         self.sig_stack_mode_finished.emit()
 
 
+    def stack_reconstruct_plane(self, plane, position, recorded_images):
+        '''Stack pipeline reconstruction stage, returns the data to be saved for a plane (held until saved)'''
+        if self.stack_mode_started == False:
+            self.stack_pipeline.stop()
+
+        self.process_scan(recorded_images)
+
+        if self.ui.checkBox_saveAllCrop.isChecked():
+            return self.crop_buffer(self.buffer)
+        elif self.ui.checkBox_saveAllFull.isChecked():
+            return np.asarray(self.buffer)
+        else:
+            # Next plane releases reconstructed_frame, possibly before this one is saved
+            self.acquire_frame(self.reconstructed_frame)
+            return self.reconstructed_frame
+
+    def stack_save_plane(self, plane, position, data, vertical_position_text:str, camera_position_text:str):
+        '''Stack pipeline saving stage, vertical and camera positions are those read before the stack'''
+        # Moving the camera to focus
+        #FIXME - Add focus adjustement to stack mode
+        #self.calculate_camera_focus()
+        #self.move_camera_to_focus()
+
+        if self.saving_allowed:
+            # Horizontal position is the one reported by the stage at the end of the plane move (in micro-meters)
+            if self.units == 'mm':
+                position = position * 1e-3
+            horizontal_position_text = self.units_fixformat.format(position, self.units)
+            self.frame_saver.add_motor_parameters(horizontal_position_text, vertical_position_text, camera_position_text)
+            try:
+                self.frame_saver.enqueue_buffer(data)
+            finally:
+                self.release_frame(data)
+            if self.ui.checkBox_saveAllCrop.isChecked():
+                self.sig_message.emit('Saving All Images (one for each ETL step, cropped)')
+            elif self.ui.checkBox_saveAllFull.isChecked():
+                self.sig_message.emit('Saving All Images (one for each ETL step, full)')
+            else:
+                self.sig_message.emit('Saving Reconstructed Image')
+        else:
+            self.release_frame(data)
+
+        # Update progress bar
+        self.stack_progress_value += self.stack_progress_increment
+        self.sig_progress_update.emit(int(self.stack_progress_value))
+
+
     '''Calibration Methods'''
 
     def camera_calibration_button(self):
@@ -2022,25 +2041,26 @@ class Controller_MainWindow(QMainWindow):
                 self.sig_message.emit('Camera calibration interrupted')
                 break
             else:
-                # Moving sample position
+                # Moving sample position, camera moves back to its first position at the same time
                 position = self.motors.horizontal.get_limit_low(self.units) + (sample_plane * sample_increment_length)    #Increments of +sample_increment_length
-                self.motors.horizontal.move_absolute_position(position, self.units)
+                self.motors.move_many({'horizontal': position, 'camera': (self.focus_forward_boundary, 'mm')}, self.units)
                 self.updateUi_position_horizontal()
 
                 for camera_plane in range(int(self.number_of_camera_positions)): #For each camera position
                     if self.camera_calibration_started == False:
                         break
                     else:
-                        # Moving camera position
+                        # Moving camera position (first position already reached with the sample move)
                         position_camera = self.focus_forward_boundary + (camera_plane * camera_increment_length) #Increments of +camera_increment_length
                         #print('position_camera:'+str(position_camera))
-                        self.motors.camera.move_absolute_position(position_camera, 'mm')
+                        if camera_plane > 0:
+                            self.motors.camera.move_absolute_position(position_camera, 'mm')
                         time.sleep(0.5) #To make sure the camera is at the right position
                         self.updateUi_position_camera()
 
                         # Retrieving filename set by the user #debugging
                         if self.saving_allowed:
-                            self.frame_saver.add_motor_parameters(self.current_horizontal_position_text, self.current_vertical_position_text, self.current_camera_position_text)
+                            self.frame_saver.add_motor_parameters(*self.read_positions_text())
 
                         # Getting image
                         self.acquire_scan()
@@ -2100,13 +2120,14 @@ class Controller_MainWindow(QMainWindow):
         print(self.camera_focus_relation)#debugging
 
         if self.saving_allowed: #debugging
-            self.frame_saver.stop_saving()
-            self.sig_message.emit('Images saved')
+            if self.frame_saver.stop_saving():
+                self.sig_message.emit('Images saved')
+            else:
+                self.sig_message.emit('Saving Failed: ' + self.frame_saver.error_message)
 
-        # Returning sample and camera at initial positions
-        self.motors.horizontal.move_absolute_position(position_depart_sample,'\u03BCStep')
+        # Returning sample and camera at initial positions (simultaneous moves)
+        self.motors.move_many({'horizontal': (position_depart_sample, '\u03BCStep'), 'camera': self.motors.camera.get_origin(self.units)}, self.units)
         self.updateUi_position_horizontal()
-        self.motors.camera.move_absolute_position(self.motors.camera.get_origin(self.units), self.units)
         self.updateUi_position_camera()
 
         # Put ETLs in standby mode: 2.5V corresponds no current through coil (mid 0-5V adjustable range)
@@ -2280,7 +2301,7 @@ class Controller_MainWindow(QMainWindow):
 
                         # Retrieving filename set by the user #debugging
                         if self.saving_allowed:
-                            self.frame_saver.add_motor_parameters(self.current_horizontal_position_text,self.current_vertical_position_text,self.current_camera_position_text)
+                            self.frame_saver.add_motor_parameters(*self.read_positions_text())
 
                         # Saving frame #debugging
                         if self.saving_allowed:
@@ -2363,8 +2384,10 @@ class Controller_MainWindow(QMainWindow):
             self.right_laser_activated = False
 
         if self.saving_allowed: #debugging
-            self.frame_saver.stop_saving()
-            self.sig_message.emit('Images saved')
+            if self.frame_saver.stop_saving():
+                self.sig_message.emit('Images saved')
+            else:
+                self.sig_message.emit('Saving Failed: ' + self.frame_saver.error_message)
 
 
         print(self.etl_l_relation) #debugging
@@ -2475,6 +2498,7 @@ class FrameViewer(QObject):
         QObject.__init__(self, parent)
         self.parent = parent
         self.queue = queue.Queue(3)
+        self.displayed_frame = None
 
         # Default frame size is 2000x2000 if no valid size provided
         if rows is not None:
@@ -2496,10 +2520,12 @@ class FrameViewer(QObject):
         self.parent.ui.imageView.setImage(frame_init)
 
     def enqueue_frame(self, frame:np.uint16):
+        # Reusable frames are held until they are replaced on display
+        self.parent.acquire_frame(frame)
         try:
             self.queue.put(frame, block=False)
         except queue.Full:
-            pass
+            self.parent.release_frame(frame)
 
     def updateUi_refresh_view(self):
         try:
@@ -2507,13 +2533,20 @@ class FrameViewer(QObject):
         except queue.Empty:
             pass
         else:
+            self.parent.release_frame(self.displayed_frame)
+            self.displayed_frame = frame
             # setImage is column-major
             frame = np.transpose(frame)
             self.parent.ui.imageView.setImage(frame, autoRange=False, autoLevels=False, autoHistogramRange=False)
 
 class FrameSaver(QObject):
     '''Class for storing buffers (images) in its queue and saving them
-       afterwards in a specified directory in a HDF5 format'''
+       afterwards in a specified directory in a HDF5, OME-TIFF or OME-Zarr format
+
+       Planes are compressed and downsampled (pyramid levels) by a pool of worker threads and written in order by a single
+       writer thread. When the queue is full, enqueue_buffer either waits ('block' backpressure)
+       or drops the plane ('drop' backpressure, the plane is left empty in the volume).
+       Write errors are recorded (error, error_message), enqueue_buffer then raises and stop_saving returns False'''
 
     sig_status_message = pyqtSignal(str)
 
@@ -2522,10 +2555,27 @@ class FrameSaver(QObject):
         self.parent = parent
         self.sig_status_message.connect(self.parent.updateUi_message_printer)
         self.file_format = self.parent.save_format
+        if self.file_format == 'tiff':
+            self.volume_writer = TiffVolumeWriter
+            self.file_extension = '.ome.tif'
+        elif self.file_format == 'zarr':
+            self.volume_writer = ZarrVolumeWriter
+            self.file_extension = '.ome.zarr'
+        else:
+            self.volume_writer = HDF5VolumeWriter
+            self.file_extension = '.hdf5'
+        self.compression = self.parent.save_compression
+        self.compression_level = self.parent.save_compression_level
+        self.pyramid = self.parent.save_pyramid
+        self.threads = self.parent.saver_threads
+        self.queue_size = self.parent.saver_queue_size
+        self.backpressure = self.parent.saver_backpressure
 
         self.saving_started = False
+        self.frame_saver_thread = None
         self.block_size = block_size
-        self.queue = queue.Queue(2*block_size)
+        self.queue = queue.Queue(self.queue_size)
+        self.reset_metrics()
 
         self.sample_name = ''
         self.number_of_files = int(1)
@@ -2539,7 +2589,8 @@ class FrameSaver(QObject):
             self.saving_started = False
 
         self.block_size = block_size
-        self.queue = queue.Queue(2*block_size) #Set up queue of maxsize 2*block_size (frames)
+        self.queue = queue.Queue(self.queue_size) #Set up queue of maxsize queue_size (planes)
+        self.reset_metrics()
 
         self.sample_name = ''
         self.number_of_files = int(1)
@@ -2572,71 +2623,184 @@ class FrameSaver(QObject):
         for _ in range(self.number_of_files):
             while True:
                 counter += 1
-                new_filename = self.files_name + '_' + scan_type + '_plane_' + u'%05d'%counter + '.hdf5'
-                if os.path.isfile(new_filename) == False: #Check for existing files
+                new_filename = self.files_name + '_' + scan_type + '_plane_' + u'%05d'%counter + self.file_extension
+                if os.path.exists(new_filename) == False: #Check for existing files (or zarr directories)
                     self.filenames_list.append(new_filename)
                     break
 
     '''Saving methods'''
 
     def enqueue_buffer(self, buffer):
-        '''Put an image in the save queue'''
-        self.queue.put(item=buffer, block=True)
+        '''Put an image in the save queue, returns False if the image was dropped'''
+        if self.error:
+            raise RuntimeError('FrameSaver - ' + self.error_message)
+        sequence = self.enqueued_planes
+        self.enqueued_planes += 1
+        # Reusable frames are held until they are written
+        self.parent.acquire_frame(buffer)
+        if self.backpressure == 'drop':
+            try:
+                self.queue.put(item=(sequence, buffer), block=False)
+            except queue.Full:
+                self.parent.release_frame(buffer)
+                self.dropped_planes += 1
+                return False
+        else:
+            self.queue.put(item=(sequence, buffer), block=True)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    def reset_metrics(self):
+        '''Resets the saving metrics (queue depth, bytes written, dropped planes and write errors)'''
+        self.enqueued_planes = 0
+        self.dropped_planes = 0
+        self.max_queue_depth = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.saving_start_time = None
+        self.error = False
+        self.error_message = ''
+
+    def metrics(self):
+        '''Returns the current and maximum queue depth, the saving throughput (bytes/s), the number of dropped planes and write errors'''
+        elapsed = time.perf_counter() - self.saving_start_time if self.saving_start_time is not None else 0.0
+        return {'queue depth':      self.queue.qsize(),
+                'max queue depth':  self.max_queue_depth,
+                'bytes/s':          self.bytes_written / elapsed if elapsed else 0.0,
+                'dropped':          self.dropped_planes,
+                'write errors':     self.write_errors }
 
     def start_saving(self):
-        '''Initiates saving thread'''
+        '''Initiates saving threads'''
         self.saving_started = True
+        self.saving_start_time = time.perf_counter()
         self.frame_saver_thread = threading.Thread(target = self.frame_saver_worker)
         self.frame_saver_thread.start()
 
     def frame_saver_worker(self):
-        '''Thread for saving 3D arrays (or 2D arrays).
-            The number of datasets per file is the number of 2D arrays'''
-        for idx in range(len(self.filenames_list)):
-            print('File created:'+str(self.filenames_list[idx])) #debugging
-            # Create file
-            outfile = h5py.File(self.filenames_list[idx],'a')
-
-            counter = 1
-            for dataset in range(int(self.number_of_datasets)):
-                while True:
-                    try:
-                        # Retrieve buffer
-                        buffer:np.ndarray = self.queue.get(True, 1)
-                        if buffer.ndim == 2:
-                            buffer = np.expand_dims(buffer, axis=0) #To consider 2D arrays as a 3D array
-                        for frame in range(buffer.shape[0]): #For each 2D frame
-                            # Create dataset
-                            path_root = self.datasets_name+u'%03d'%counter
-                            self.dataset = outfile.create_dataset(path_root, data=buffer[frame,:,:])
-                            print('Dataset '+str(dataset)+'/'+str(int(self.number_of_datasets))+' created:'+str(path_root)) #debugging
-
-                            # Add attributes
-                            self.dataset.attrs['Sample Name']   = self.sample_name
-                            self.dataset.attrs['Date']          = str(datetime.date.today())
-
-                            if buffer.shape[0] == 1:
-                                pos_index = dataset + idx * int(self.number_of_datasets)
-                            else:
-                                pos_index = idx
-
-                            self.dataset.attrs['Horizontal Position']   = self.horizontal_positions_list[pos_index]
-                            self.dataset.attrs['Vertical Position']     = self.vertical_positions_list[pos_index]
-                            self.dataset.attrs['Camera Position']       = self.camera_positions_list[pos_index]
-
-                            counter += 1
-                        break
-                    except:
-                        if self.saving_started == False:
-                            break
+        '''Thread dispatching 3D arrays (or 2D arrays) to the compression pool and the ordered writer.
+            Each file holds a single volume dataset of number_of_datasets planes (2D frames or 3D ETL images)'''
+        compression_pool = ThreadPoolExecutor(self.threads)
+        # Bounded, so that no more than a few planes are held by compression
+        self.write_queue = queue.Queue(2*self.threads)
+        frame_writer_thread = threading.Thread(target = self.frame_writer_worker)
+        frame_writer_thread.start()
+
+        total_planes = len(self.filenames_list) * int(self.number_of_datasets)
+        writer = None
+        file_index = None
+        while True:
+            try:
+                # Retrieve buffer
+                sequence, buffer = self.queue.get(True, 1)
+            except queue.Empty:
                 if self.saving_started == False:
                     break
-            outfile.close()
-            self.sig_status_message.emit('File ' + self.filenames_list[idx] + ' saved')
-            if self.saving_started == False:
+                continue
+            if sequence >= total_planes:
+                self.parent.release_frame(buffer)
+                continue
+
+            # Dropped planes keep their place in the volume
+            idx, plane = divmod(sequence, int(self.number_of_datasets))
+            if idx != file_index:
+                if writer is not None:
+                    self.write_queue.put((writer, None, None, None, None))
+                writer = None
+                file_index = idx
+                # Create file (volume dataset is created with the first plane)
+                attributes = {  'Sample Name':  self.sample_name,
+                                'Date':         str(datetime.date.today()) }
+                try:
+                    writer = self.volume_writer(self.filenames_list[idx], self.number_of_datasets, self.datasets_name, attributes,
+                                                self.compression, self.compression_level, self.pyramid)
+                except Exception as error:
+                    self.write_failed('file error (' + self.filenames_list[idx] + '): ' + str(error))
+
+            if writer is None:
+                # File could not be created, planes are drained so that the producer never blocks and sees the error
+                self.parent.release_frame(buffer)
+                if sequence == total_planes - 1:
+                    break
+                continue
+
+            # Compression and pyramid levels are computed by the pool
+            prepared_plane = compression_pool.submit(writer.prepare_plane, buffer, plane)
+            self.write_queue.put((writer, plane, buffer, prepared_plane, self.plane_coordinates(sequence)))
+            if sequence == total_planes - 1:
                 break
 
-    def stop_saving(self):
-        '''Changes the flag status to end the saving thread'''
+        if writer is not None:
+            self.write_queue.put((writer, None, None, None, None))
+        self.write_queue.put(None)
+        frame_writer_thread.join()
+        compression_pool.shutdown()
+
+        metrics = self.metrics()
+        self.sig_status_message.emit(f"Saving: {metrics['bytes/s']/1e6:.1f} MB/s, max queue depth {metrics['max queue depth']}/{self.queue_size}, {metrics['dropped']} dropped planes, {metrics['write errors']} write errors")
+
+    def frame_writer_worker(self):
+        '''Thread writing planes in acquisition order, once their compression is done'''
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            writer, plane, buffer, prepared_plane, coordinates = item
+            if plane is None:
+                # End of file
+                try:
+                    writer.close()
+                except Exception as error:
+                    self.write_failed('close error (' + writer.filename + '): ' + str(error))
+                    continue
+                self.sig_status_message.emit('File ' + writer.filename + ' saved')
+
+                # Report codec performance, it must keep up with the camera frame rate
+                statistics = writer.statistics()
+                self.sig_status_message.emit(f"Compression {statistics['codec']}: {statistics['throughput']:.1f} MB/s, ratio {statistics['ratio']:.2f}")
+                if statistics['pyramid stored']:
+                    self.sig_status_message.emit(f"Pyramid levels: {statistics['pyramid raw']/1e6:.1f} MB raw, {statistics['pyramid stored']/1e6:.1f} MB stored")
+                continue
+            try:
+                writer.write_plane(plane, buffer, coordinates, prepared_plane.result())
+                self.bytes_written += buffer.nbytes
+            except Exception as error:
+                self.write_failed('write error (plane ' + str(plane+1) + ', ' + writer.filename + '): ' + str(error))
+            finally:
+                self.parent.release_frame(buffer)
+
+    def write_failed(self, message:str):
+        '''Records a write error, reported to the user and to the acquisition (see enqueue_buffer, stop_saving)'''
+        self.write_errors += 1
+        self.error = True
+        self.error_message = message
+        print('FrameSaver - ' + message)
+        self.sig_status_message.emit('FrameSaver - ' + message)
+
+    def plane_coordinates(self, pos_index:int):
+        '''Returns the motor positions of a plane as {name: (value, units)}'''
+        coordinates = {}
+        positions = {   'Horizontal Position':  self.horizontal_positions_list,
+                        'Vertical Position':    self.vertical_positions_list,
+                        'Camera Position':      self.camera_positions_list }
+        for name, positions_list in positions.items():
+            if pos_index < len(positions_list):
+                # Position texts are formatted as 'value units'
+                try:
+                    value, units = str(positions_list[pos_index]).split()
+                    coordinates[name] = (float(value), units)
+                except ValueError:
+                    pass
+        return coordinates
+
+    def stop_saving(self, wait:bool=True):
+        '''Changes the flag status to end the saving thread, returns False if a write error occurred
+
+        With wait, returns once every queued plane is written (or failed), otherwise only errors
+        that already occurred are reported (later ones are still sent as status messages)
+        '''
         self.saving_started = False
+        if wait and self.frame_saver_thread is not None and self.frame_saver_thread is not threading.current_thread():
+            self.frame_saver_thread.join()
+        return not self.error
         #self.frame_saver_thread.join()
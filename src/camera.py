@@ -8,8 +8,12 @@ sys.path.append(".")
 import time
 from datetime import datetime, timedelta
 import numpy as np
-import pco
+try:
+    import pco
+except ImportError:
+    pco = None
 
+from src import pcosim
 from src.config import cfg_read, cfg_write, cfg_str2bool
 
 
@@ -25,6 +29,8 @@ class Camera:
     _cfg_defaults['Lightsheet Exposed Lines']   = '16'
     _cfg_defaults['Lightsheet Delay Lines']     = '0'
     _cfg_defaults['Recorder Timeout']           = '5'
+    _cfg_defaults['Simulated']                  = 'False'
+    _cfg_defaults['Simulated Sensor Size']      = '2048, 2048'
 
 
     def __init__(self, verbose=False):
@@ -34,13 +40,16 @@ class Camera:
         self.is_recording = False
         self.new_data_ready = False
         self.recorder_timeout_status = False
+        self.ring_overwritten = False
 
         # Other variables
+        self.ring_image_numbers = []
         self.camera = None
         self.xsize = None
         self.ysize = None
         self.bytes_per_image = None
         self.line_time = None
+        self.recorder_images = None
 
         # read configurable settings from config.ini file
         self._cfg_filename = 'config.ini'
@@ -61,6 +70,8 @@ class Camera:
         self.lightsheet_exposed_lines       = int(      self._cfg['Lightsheet Exposed Lines']   )
         self.lightsheet_delay_lines         = int(      self._cfg['Lightsheet Delay Lines']     )
         self.recorder_timeout_interval      = int(      self._cfg['Recorder Timeout']           )
+        self.simulated                      = cfg_str2bool( self._cfg['Simulated']              )
+        self.simulated_sensor_size          = tuple(int(size) for size in str(self._cfg['Simulated Sensor Size']).split(','))
 
 
     def cfg_save_ini(self):
@@ -72,6 +83,8 @@ class Camera:
         self._cfg['Lightsheet Exposed Lines']   = str( self.lightsheet_exposed_lines            )
         self._cfg['Lightsheet Delay Lines']     = str( self.lightsheet_delay_lines              )
         self._cfg['Recorder Timeout']           = str( self.recorder_timeout_interval           )
+        self._cfg['Simulated']                  = str( self.simulated                           )
+        self._cfg['Simulated Sensor Size']      = ', '.join(str(size) for size in self.simulated_sensor_size)
         # write configuration to ini file
         self._cfg = cfg_write(self._cfg_filename, self._cfg_section, self._cfg)
 
@@ -82,7 +95,13 @@ class Camera:
             print("Opening camera...")
         if self.camera is None:
             try:
-                self.camera = pco.Camera()
+                if self.simulated:
+                    # Synthetic frames with the camera timing, to run without hardware
+                    self.camera = pcosim.Camera(*self.simulated_sensor_size)
+                elif pco is not None:
+                    self.camera = pco.Camera()
+                else:
+                    raise ValueError('pco package not installed')
             except ValueError:
                 if self.verbose:
                     print(" Failed to open camera.")
@@ -230,13 +249,18 @@ class Camera:
 
     # Managing recording sessions
 
-    def start_recorder(self, number_of_images):
-        '''docstring'''
+    def start_recorder(self, number_of_images, mode:str='sequence non blocking'):
+        '''Starts a recording session
+
+        'sequence non blocking':    Records number_of_images images, then stops
+        'ring buffer':              Records continuously into number_of_images buffers, oldest images being overwritten
+        '''
         if self.camera is not None:
             try:
                 if self.verbose:
                     print("Starting camera recording session...")
-                self.camera.record(int(number_of_images), mode='sequence non blocking')
+                self.camera.record(int(number_of_images), mode=mode)
+                self.recorder_images = int(number_of_images)
             except ValueError:
                 if self.verbose:
                     print(" Exception while starting recorder.")
@@ -272,6 +296,12 @@ class Camera:
                     time.sleep(0.01)
         return None
 
+    def recorded_images(self):
+        '''Number of images recorded since the start of the recording session'''
+        if self.is_recording:
+            return self.camera.rec.get_status()['dwProcImgCount']
+        return 0
+
     def stop_recorder(self):
         '''docstring'''
         if self.is_recording:
@@ -288,6 +318,30 @@ class Camera:
             images = np.zeros((number_of_images,self.ysize,self.xsize), dtype=np.uint16)
         return images
 
+    def copy_ring_images(self, first_image:int, number_of_images:int):
+        '''Copies images from a ring buffer recording session (first_image is the count of images recorded before them)
+
+        Returns a list of 2D images, they are not stacked into a single array. The recorder keeps the
+        n-th image in buffer n % recorder_images: the 'recorder image number' of each copied image is
+        read back (ring_image_numbers) and ring_overwritten is set if one was already overwritten.
+        '''
+        self.ring_image_numbers = []
+        self.ring_overwritten = False
+        if self.new_data_ready:
+            images = []
+            for index in range(number_of_images):
+                image, metadata = self.camera.image(image_number=(first_image + index) % self.recorder_images)
+                images.append(image)
+                # Recorder image numbers start at 1
+                image_number = metadata.get('recorder image number')
+                self.ring_image_numbers.append(image_number)
+                if image_number is not None and image_number != first_image + index + 1:
+                    self.ring_overwritten = True
+            self.new_data_ready = False
+        else:
+            images = np.zeros((number_of_images,self.ysize,self.xsize), dtype=np.uint16)
+        return images
+
     def delete_recorder(self):
         '''docstring'''
         if self.camera is not None:
@@ -0,0 +1,419 @@
+'''
+Created on October 17, 2026
+'''
+
+import re
+import time
+import threading
+from collections import deque
+import numpy as np
+
+try:
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType, LineGrouping, Edge, WriteRelativeTo
+    from nidaqmx.stream_writers import AnalogUnscaledWriter
+except ImportError:
+    nidaqmx = None
+
+    class AcquisitionType:
+        FINITE = 10178
+        CONTINUOUS = 10123
+
+    class LineGrouping:
+        CHAN_FOR_ALL_LINES = 1
+        CHAN_PER_LINE = 0
+
+    class Edge:
+        RISING = 10280
+        FALLING = 10171
+
+    class WriteRelativeTo:
+        FIRST_SAMPLE = 10424
+        CURRENT_WRITE_POSITION = 10430
+
+
+def Task(new_task_name:str='', simulated:bool=False):
+    '''Returns a nidaqmx.Task, or a SimulatedTask if simulated'''
+    if simulated:
+        return SimulatedTask(new_task_name)
+    if nidaqmx is None:
+        raise ImportError('nidaqmx package not installed')
+    return nidaqmx.Task(new_task_name = new_task_name)
+
+
+def ao_scaling_coefficients(physical_channel:str, simulated:bool=False):
+    '''
+    DAC scaling coefficients of analog output channels (default voltage range), one list per channel
+
+    Coefficients c0, c1, ... of each channel convert volts to DAC counts: c0 + c1*V + c2*V**2 + ...
+    '''
+    with Task(new_task_name = 'ao_scaling', simulated = simulated) as task:
+        task.ao_channels.add_ao_voltage_chan(physical_channel)
+        return [list(channel.ao_dev_scaling_coeff) for channel in task.ao_channels]
+
+
+def write_raw(task, data, auto_start:bool=False):
+    '''Writes unscaled int16 samples (DAC counts, one row per channel) to an analog output task'''
+    if isinstance(task, SimulatedTask):
+        return task.write_raw(data, auto_start = auto_start)
+    writer = AnalogUnscaledWriter(task.out_stream, auto_start = auto_start)
+    return writer.write_int16(np.ascontiguousarray(data))
+
+
+class SimulatedDaqError(Exception):
+    '''Error raised by simulated tasks where the DAQ driver would report one'''
+
+
+# Waveforms written to simulated tasks, as (task name, channels, data)
+written_waveforms = deque(maxlen=64)
+
+# Digital output generations of simulated tasks (camera trigger pulses), see trigger_edges
+generations = deque(maxlen=1024)
+
+# Simulated tasks waiting for an edge, by trigger terminal
+_trigger_lock = threading.Lock()
+_trigger_tasks = {}
+
+
+def send_trigger(terminal:str):
+    '''Simulates a rising edge on a terminal (e.g. a 'stage settled' line), starting the tasks armed on it'''
+    with _trigger_lock:
+        tasks = list(_trigger_tasks.get(terminal, ()))
+    for task in tasks:
+        task._triggered()
+
+
+def trigger_edges(start:float, end:float):
+    '''Number of rising edges generated on digital outputs between two perf_counter times (simulated camera triggers)'''
+    return sum(generation.edges_between(start, end) for generation in list(generations))
+
+
+class SimulatedGeneration:
+    '''
+    Rising edges generated by a simulated digital output task, from one start (or trigger) until it stops
+
+    Edges are taken from the first line of the task buffer when the generation starts. Finite
+    generations end after their samples, continuous generations repeat the buffer until stopped.
+    '''
+
+    def __init__(self, data:np.ndarray, rate:float, samples:int, continuous:bool):
+        line = np.asarray(data[0]).astype(bool)
+        self.edges = np.flatnonzero(line & ~np.concatenate(([False], line[:-1])))
+        self.buffer_samples = line.size
+        self.rate = rate
+        self.samples = samples
+        self.continuous = continuous
+        self.start_time = time.perf_counter()
+        self.stop_time = None
+
+    def stop(self):
+        if self.stop_time is None:
+            self.stop_time = time.perf_counter()
+
+    def edges_before(self, samples:float):
+        '''Number of edges in the first samples of the generation'''
+        samples = int(np.ceil(max(samples, 0)))
+        if self.continuous:
+            cycles, samples = divmod(samples, self.buffer_samples)
+            return cycles * self.edges.size + int(np.searchsorted(self.edges, samples))
+        return int(np.searchsorted(self.edges, min(samples, self.samples)))
+
+    def edges_between(self, start:float, end:float):
+        '''Number of edges generated between two perf_counter times'''
+        if self.stop_time is not None:
+            end = min(end, self.stop_time)
+        if end <= self.start_time or end <= start:
+            return 0
+        return self.edges_before((end - self.start_time) * self.rate) - self.edges_before((start - self.start_time) * self.rate)
+
+
+def physical_channels(names:str):
+    '''Expands physical channel names ('/Dev1/ao0:3', '/Dev1/port0/line1, /Dev1/port0/line3') into a list'''
+    channels = []
+    for name in names.split(','):
+        name = name.strip()
+        match = re.match(r'^(.*?)(\d+):(\d+)$', name)
+        if match:
+            prefix, first, last = match.group(1), int(match.group(2)), int(match.group(3))
+            step = 1 if last >= first else -1
+            channels += [prefix + str(index) for index in range(first, last + step, step)]
+        elif name:
+            channels.append(name)
+    return channels
+
+
+class SimulatedChannel:
+    '''Simulated channel of a task, analog outputs have 16 bit DACs over their voltage range'''
+
+    def __init__(self, name:str, value_range):
+        self.name = name
+        self.ao_dev_scaling_coeff = [0.0, 32768 / max(abs(value_range[0]), abs(value_range[1]))]
+
+
+class SimulatedChannels:
+    '''Simulated ao_channels / do_channels collection of a task'''
+
+    def __init__(self, task, channel_type:str):
+        self.task = task
+        self.channel_type = channel_type
+
+    def _channels(self):
+        if self.task.channel_type != self.channel_type:
+            return []
+        return [SimulatedChannel(name, value_range) for name, value_range in zip(self.task.channel_names, self.task.channel_ranges)]
+
+    def __len__(self):
+        return len(self._channels())
+
+    def __iter__(self):
+        return iter(self._channels())
+
+    def __getitem__(self, index):
+        return self._channels()[index]
+
+    def add_ao_voltage_chan(self, physical_channel:str, min_val:float=-10.0, max_val:float=10.0, **kwargs):
+        self.task._add_channels('ao', physical_channel, (min_val, max_val))
+
+    def add_do_chan(self, lines:str, line_grouping=LineGrouping.CHAN_FOR_ALL_LINES, **kwargs):
+        if line_grouping == LineGrouping.CHAN_PER_LINE:
+            self.task._add_channels('do', lines, (0, 1))
+        else:
+            self.task._add_channels('do', lines.split(',')[0], (0, 1))
+
+
+class SimulatedTiming:
+    '''Simulated sample clock timing of a task'''
+
+    def __init__(self):
+        self.samp_clk_rate = None
+        self.samp_quant_samp_mode = None
+        self.samp_quant_samp_per_chan = None
+
+    def cfg_samp_clk_timing(self, rate:float, source:str='', active_edge=Edge.RISING, sample_mode=AcquisitionType.FINITE, samps_per_chan:int=1000):
+        self.samp_clk_rate = float(rate)
+        self.samp_quant_samp_mode = sample_mode
+        self.samp_quant_samp_per_chan = int(samps_per_chan)
+
+
+class SimulatedStartTrigger:
+    '''Simulated start trigger of a task'''
+
+    def __init__(self):
+        self.source = None
+        self.edge = None
+        self.retriggerable = False
+
+    def cfg_dig_edge_start_trig(self, trigger_source:str, trigger_edge=Edge.RISING):
+        self.source = trigger_source
+        self.edge = trigger_edge
+
+    def disable_start_trig(self):
+        self.source = None
+
+
+class SimulatedTriggers:
+    def __init__(self):
+        self.start_trigger = SimulatedStartTrigger()
+
+
+class SimulatedOutStream:
+    '''Simulated output stream of a task (buffer size and write position)'''
+
+    def __init__(self):
+        self.output_buf_size = None
+        self.relative_to = WriteRelativeTo.CURRENT_WRITE_POSITION
+        self.offset = 0
+
+
+class SimulatedTask:
+    '''
+    Simulated nidaqmx.Task for analog and digital outputs
+
+    Written waveforms are kept (see written_waveforms). A task with a sample clock generates
+    its samples in real time: wait_until_done() returns samples per channel / sample rate
+    after the start (or after the start trigger edge), continuous tasks run until stopped. Starting a task with analog outputs
+    sends an edge on its device '<device>/ao/StartTrigger' terminal. Generations of digital
+    output tasks are kept (see generations), they trigger the simulated camera.
+
+    Without an output buffer size (out_stream.output_buf_size), a write replaces the buffer
+    as the DAQ driver does for the first write. With one, writes fill the buffer at the
+    out_stream write position, and the waveforms are kept once the buffer is complete.
+    '''
+
+    def __init__(self, new_task_name:str=''):
+        self.name = new_task_name
+        self.ao_channels = SimulatedChannels(self, 'ao')
+        self.do_channels = SimulatedChannels(self, 'do')
+        self.timing = SimulatedTiming()
+        self.triggers = SimulatedTriggers()
+        self.out_stream = SimulatedOutStream()
+
+        self.channel_type = None
+        self.channel_names = []
+        self.channel_ranges = []
+        self.data = None
+        self.write_position = 0
+        self.condition = threading.Condition()
+        self.armed = False
+        self.start_time = None
+        self.generation = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add_channels(self, channel_type:str, names:str, value_range):
+        if self.channel_type not in (None, channel_type):
+            raise SimulatedDaqError('Task ' + self.name + ' cannot mix ' + self.channel_type + ' and ' + channel_type + ' channels')
+        channels = physical_channels(names)
+        if not channels:
+            raise SimulatedDaqError('Invalid physical channel: ' + str(names))
+        self.channel_type = channel_type
+        self.channel_names += channels
+        self.channel_ranges += [value_range] * len(channels)
+
+    def device_start_trigger(self):
+        '''Terminal of the start trigger sent when this task starts'''
+        if self.channel_type != 'ao' or not self.channel_names:
+            return None
+        return self.channel_names[0].rsplit('/', 1)[0] + '/ao/StartTrigger'
+
+    def write(self, data, auto_start=True, timeout:float=10.0):
+        '''Writes samples to the task buffer, returns the number of samples written per channel'''
+        if self.closed:
+            raise SimulatedDaqError('Task ' + self.name + ' is closed')
+        data = np.array(data, copy=True)
+        samples = data.reshape((len(self.channel_names), -1)) if data.ndim < 2 else data
+        if samples.shape[0] != len(self.channel_names):
+            raise SimulatedDaqError('Write data has ' + str(samples.shape[0]) + ' channels, task ' + self.name + ' has ' + str(len(self.channel_names)))
+        if self.channel_type == 'ao':
+            for values, (min_val, max_val) in zip(samples, self.channel_ranges):
+                if values.size and (values.min() < min_val or values.max() > max_val):
+                    raise SimulatedDaqError('Analog output value out of range in task ' + self.name)
+        buffer_size = self.out_stream.output_buf_size
+        if buffer_size is None:
+            self.data = samples
+            written_waveforms.append((self.name, list(self.channel_names), samples))
+        else:
+            if self.out_stream.relative_to == WriteRelativeTo.FIRST_SAMPLE:
+                position = self.out_stream.offset
+            else:
+                position = self.write_position + self.out_stream.offset
+            if self.timing.samp_quant_samp_mode == AcquisitionType.CONTINUOUS:
+                # Continuous generations regenerate the buffer, write positions wrap around it
+                position %= buffer_size
+            if position < 0 or position + samples.shape[1] > buffer_size:
+                raise SimulatedDaqError('Write of ' + str(samples.shape[1]) + ' samples at sample ' + str(position) + ' exceeds the buffer of task ' + self.name)
+            if self.data is None or self.data.shape != (samples.shape[0], buffer_size) or self.data.dtype != samples.dtype:
+                self.data = np.zeros((samples.shape[0], buffer_size), dtype=samples.dtype)
+            self.data[:, position:position + samples.shape[1]] = samples
+            self.write_position = position + samples.shape[1]
+            if self.write_position == buffer_size:
+                written_waveforms.append((self.name, list(self.channel_names), self.data.copy()))
+        if auto_start is True:
+            self.start()
+        return samples.shape[1]
+
+    def write_raw(self, data, auto_start:bool=False):
+        '''Writes unscaled int16 samples (DAC counts) to analog output channels, returns the number of samples written per channel'''
+        data = np.asarray(data)
+        if self.channel_type != 'ao':
+            raise SimulatedDaqError('Task ' + self.name + ' has no analog output channels')
+        if data.dtype != np.int16 or data.ndim != 2 or not data.flags.c_contiguous:
+            raise SimulatedDaqError('Raw data must be a C contiguous 2D int16 array')
+        volts = np.empty(data.shape)
+        for channel, (counts, value_range) in enumerate(zip(data, self.channel_ranges)):
+            c0, c1 = SimulatedChannel('', value_range).ao_dev_scaling_coeff
+            volts[channel] = (counts - c0) / c1
+        return self.write(volts, auto_start = auto_start)
+
+    def start(self):
+        '''Starts the task, or arms it if it has a start trigger'''
+        if self.closed:
+            raise SimulatedDaqError('Task ' + self.name + ' is closed')
+        source = self.triggers.start_trigger.source
+        if source:
+            with _trigger_lock:
+                _trigger_tasks.setdefault(source, set()).add(self)
+            with self.condition:
+                self.armed = True
+                self.start_time = None
+        else:
+            self._triggered(force=True)
+
+    def _triggered(self, force:bool=False):
+        '''Starts the generation (on a trigger edge, or at start if there is no start trigger)'''
+        with self.condition:
+            if not force:
+                if not self.armed:
+                    return
+                # A non retriggerable task only starts on its first edge
+                if self.start_time is not None and not self.triggers.start_trigger.retriggerable:
+                    return
+            self.start_time = time.perf_counter()
+            self._start_generation()
+            self.condition.notify_all()
+        terminal = self.device_start_trigger()
+        if terminal is not None:
+            send_trigger(terminal)
+
+    def _start_generation(self):
+        '''Keeps the edges of a digital output generation (a retriggered task starts a new one)'''
+        if self.generation is not None:
+            self.generation.stop()
+            self.generation = None
+        if self.channel_type != 'do' or self.data is None or self.timing.samp_clk_rate is None:
+            return
+        continuous = self.timing.samp_quant_samp_mode == AcquisitionType.CONTINUOUS
+        self.generation = SimulatedGeneration(self.data, self.timing.samp_clk_rate, self.timing.samp_quant_samp_per_chan, continuous)
+        generations.append(self.generation)
+
+    def generation_time(self):
+        '''Time (in seconds) needed to generate the samples of a finite task (continuous tasks never complete)'''
+        if self.timing.samp_clk_rate is None:
+            return 0.0
+        if self.timing.samp_quant_samp_mode == AcquisitionType.CONTINUOUS:
+            return float('inf')
+        return self.timing.samp_quant_samp_per_chan / self.timing.samp_clk_rate
+
+    def is_task_done(self):
+        with self.condition:
+            if self.start_time is None:
+                return False
+            return time.perf_counter() - self.start_time >= self.generation_time()
+
+    def wait_until_done(self, timeout:float=10.0):
+        '''Waits until all the samples are generated'''
+        deadline = time.perf_counter() + timeout
+        with self.condition:
+            while self.start_time is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    raise SimulatedDaqError('Task ' + self.name + ' was never started')
+            done = self.start_time + self.generation_time()
+        if done > deadline:
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+            raise SimulatedDaqError('Task ' + self.name + ' did not complete before timeout')
+        time.sleep(max(0.0, done - time.perf_counter()))
+
+    def stop(self):
+        with self.condition:
+            self.armed = False
+            self.start_time = None
+            if self.generation is not None:
+                self.generation.stop()
+                self.generation = None
+        self._disarm()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def _disarm(self):
+        source = self.triggers.start_trigger.source
+        if source:
+            with _trigger_lock:
+                _trigger_tasks.get(source, set()).discard(self)
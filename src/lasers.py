@@ -8,10 +8,8 @@ sys.path.append(".")
 import copy
 import numpy as np
 
-import nidaqmx
-#from nidaqmx.constants import AcquisitionType, LineGrouping, Edge
-
-from src.config import cfg_read, cfg_write
+from src import daq
+from src.config import cfg_read, cfg_write, cfg_str2bool
 
 class Lasers:
     '''Class for generating and sending AO signals to modulate lasers'''
@@ -23,6 +21,7 @@ class Lasers:
     _cfg_settings['Laser1 Power'] = 0.0            # In Volts
     _cfg_settings['Laser2 Wavelength'] = 405       # in nm
     _cfg_settings['Laser2 Power'] = 0.0            # In Volts
+    _cfg_settings['Simulated'] = False             # Simulated DAQ task (no hardware)
 
     def __init__(self):
         # Error status
@@ -50,6 +49,7 @@ class Lasers:
         self.laser2_wavelength     = int(self.cfg_settings['Laser2 Wavelength'])
         self.laser2_power          = float(self.cfg_settings['Laser2 Power'])
         self.laser2_active         = False
+        self.simulated             = cfg_str2bool(str(self.cfg_settings['Simulated']))
 
         self._laser1_setpoint = 0
         self._laser2_setpoint = 0
@@ -94,7 +94,7 @@ class Lasers:
                                         np.array([self._laser2_setpoint])     ))
         # Run task
         try:
-            with nidaqmx.Task(new_task_name = 'lasers_setpoint') as lasers_task:
+            with daq.Task(new_task_name = 'lasers_setpoint', simulated = self.simulated) as lasers_task:
                 lasers_task.ao_channels.add_ao_voltage_chan(self.ao_terminals)
                 lasers_task.write(lasers_setpoints, auto_start = True)
         except:
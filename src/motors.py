@@ -6,7 +6,16 @@ Created on February 10, 2022
 import sys
 sys.path.append(".")
 
-import serial
+import threading
+import itertools
+from collections import deque
+from concurrent.futures import Future, TimeoutError, wait
+
+try:
+    import serial
+except ImportError:
+    serial = None
+from src import zaber
 from src.config import cfg_read, cfg_write, cfg_str2bool
 
 class Motors:
@@ -16,6 +25,7 @@ class Motors:
     # Used as base dictionnary for .ini file allowable keys
     _cfg_defaults = {}
     _cfg_defaults['Port']                       = 'COM3'
+    _cfg_defaults['Simulated']                  = 'False'
     _cfg_defaults['Device Number Vertical']     = '1'
     _cfg_defaults['Device Number Horizontal']   = '2'
     _cfg_defaults['Device Number Camera']       = '3'
@@ -34,6 +44,7 @@ class Motors:
     _cfg_defaults['Camera Origin']              = '0.0'
     _cfg_defaults['Camera Limit Low']           = '0.0'
     _cfg_defaults['Camera Limit High']          = '50.0'
+    _cfg_defaults['Position Poll Interval']     = '0.5'
 
 
     def __init__(self):
@@ -46,9 +57,18 @@ class Motors:
         self._cfg_section = 'Motors'
         self.cfg_load_ini()
 
+        # All the motors share a single connection to the serial port
+        # (or to simulated stages, to run without hardware)
+        transport = None
+        if self.simulated:
+            transport = zaber.SimulatedPort([   zaber.SimulatedStage(self.device_no_vertical, 6210),
+                                                zaber.SimulatedStage(self.device_no_horizontal, 6320),
+                                                zaber.SimulatedStage(self.device_no_camera, 4152) ])
+        self.connection = ZaberConnection(self.port, transport=transport)
+
         # check existance of vertical, horizontal and camera motors
         # and apply initial configuration
-        self.vertical = ZaberMotor(self.port, self.device_no_vertical)
+        self.vertical = ZaberMotor(self.port, self.device_no_vertical, self.connection)
         if self.vertical.is_supported:
             self.vertical.set_inverted(self.vertical_inverted)
             self.vertical.set_units(self.vertical_units)
@@ -56,7 +76,7 @@ class Motors:
             self.vertical.set_limit_low(self.vertical_limit_low, self.vertical_units)
             self.vertical.set_limit_high(self.vertical_limit_high, self.vertical_units)
 
-        self.horizontal = ZaberMotor(self.port, self.device_no_horizontal)
+        self.horizontal = ZaberMotor(self.port, self.device_no_horizontal, self.connection)
         if self.horizontal.is_supported:
             self.horizontal.set_inverted(self.horizontal_inverted)
             self.horizontal.set_units(self.horizontal_units)
@@ -64,7 +84,7 @@ class Motors:
             self.horizontal.set_limit_low(self.horizontal_limit_low, self.horizontal_units)
             self.horizontal.set_limit_high(self.horizontal_limit_high, self.horizontal_units)
 
-        self.camera = ZaberMotor(self.port, self.device_no_camera)
+        self.camera = ZaberMotor(self.port, self.device_no_camera, self.connection)
         if self.camera.is_supported:
             self.camera.set_inverted(self.camera_inverted)
             self.camera.set_units(self.camera_units)
@@ -72,11 +92,21 @@ class Motors:
             self.camera.set_limit_low(self.camera_limit_low, self.camera_units)
             self.camera.set_limit_high(self.camera_limit_high, self.camera_units)
 
+        # Background refresh of the cached positions (disabled if the interval is 0)
+        # Acquisitions pause it, so that it doesn't compete with their moves for the serial line
+        self.poller_stop = threading.Event()
+        self.poller_lock = threading.Lock()
+        self.poller_pauses = 0
+        self.poller = None
+        if self.position_poll_interval > 0:
+            self.poller = threading.Thread(target=self.position_poller, daemon=True)
+            self.poller.start()
 
     def cfg_load_ini(self):
         self._cfg = cfg_read(self._cfg_filename, self._cfg_section, self._cfg_defaults)
         # set instance variables from configuration dictionary values
         self.port                   = str(          self._cfg['Port']                       )
+        self.simulated              = cfg_str2bool( self._cfg['Simulated']                  )
         self.device_no_vertical     = int(          self._cfg['Device Number Vertical']     )
         self.device_no_horizontal   = int(          self._cfg['Device Number Horizontal']   )
         self.device_no_camera       = int(          self._cfg['Device Number Camera']       )
@@ -95,11 +125,13 @@ class Motors:
         self.camera_origin          = float(        self._cfg['Camera Origin']              )
         self.camera_limit_low       = float(        self._cfg['Camera Limit Low']           )
         self.camera_limit_high      = float(        self._cfg['Camera Limit High']          )
+        self.position_poll_interval = float(        self._cfg['Position Poll Interval']     )
 
     def cfg_save_ini(self):
         # pack current instance variables into configuration dictionary
         self._cfg = {}
         self._cfg['Port']                       = str( self.port                    )
+        self._cfg['Simulated']                  = str( self.simulated               )
         self._cfg['Device Number Vertical']     = str( self.device_no_vertical      )
         self._cfg['Device Number Horizontal']   = str( self.device_no_horizontal    )
         self._cfg['Device Number Camera']       = str( self.device_no_camera        )
@@ -115,6 +147,7 @@ class Motors:
         self._cfg['Camera Origin']              = str( self.camera_origin           )
         self._cfg['Camera Limit Low']           = str( self.camera_limit_low        )
         self._cfg['Camera Limit High']          = str( self.camera_limit_high       )
+        self._cfg['Position Poll Interval']     = str( self.position_poll_interval  )
         self._cfg = cfg_write(self._cfg_filename, self._cfg_section, self._cfg)
 
 
@@ -133,11 +166,230 @@ class Motors:
         motors_positions.update({'camera position': self.camera.get_position('mm')})
         return motors_positions
 
+    def move_many(self, positions:dict, units:str, timeout:float=None):
+        '''Moves several motors at once and waits until all the moves are completed
+
+        Parameters:
+            positions: A dictionary of {motor name: absolute position}, names are 'vertical', 'horizontal' and 'camera'
+                       A position can also be a (position, units) tuple, for positions in other units
+            units: Units of the positions (see ZaberMotor.move_absolute_position)
+            timeout: Maximum waiting time (in seconds), default is the motors move timeout
+
+        Returns a dictionary of {motor name: final position} of the moves completed
+        '''
+        if timeout is None:
+            timeout = ZaberMotor.move_timeout
+        # All the move instructions are sent with a single write
+        moves = {}
+        instructions = []
+        for name, position in positions.items():
+            motor = getattr(self, name)
+            position, position_units = position if isinstance(position, tuple) else (position, units)
+            if motor.id != 0:
+                instructions.append((name, position_units, (motor.device_number, zaber.COMMANDS['move absolute'], motor.position_to_microsteps(position, position_units))))
+            else:
+                moves[name] = motor._position_future(None, position_units)
+        try:
+            replies = self.connection.submit_batch(zaber.encode_batch(instruction for _, _, instruction in instructions)) if instructions else []
+        except:
+            self.error = 1
+            self.error_message = "Serial port error"
+            print('Motors - move error')
+            replies = [None] * len(instructions)
+        for (name, position_units, _), reply_bytes in zip(instructions, replies):
+            motor = getattr(self, name)
+            moves[name] = motor._position_future(motor._reply_future(zaber.COMMANDS['move absolute'], reply_bytes), position_units)
+        done, not_done = wait(moves.values(), timeout)
+        for move in not_done:
+            move.cancel()
+        # Moves failed by a serial port error are not completed
+        return {name: move.result() for name, move in moves.items() if move in done and move.exception() is None}
+
+    def position_poller(self):
+        '''Refreshes the cached position of each motor every position_poll_interval seconds, unless paused'''
+        while not self.poller_stop.wait(self.position_poll_interval):
+            with self.poller_lock:
+                if self.poller_pauses > 0:
+                    continue
+                for motor in (self.vertical, self.horizontal, self.camera):
+                    if motor.id != 0:
+                        motor.get_position('\u03BCStep')
+
+    def pause_poller(self):
+        '''Pauses the position poller (e.g. during acquisitions), returns once a refresh in progress is done
+
+        Pauses are counted, the poller runs again once each pause_poller is matched by a resume_poller
+        '''
+        with self.poller_lock:
+            self.poller_pauses += 1
+
+    def resume_poller(self):
+        '''Resumes the position poller after pause_poller'''
+        with self.poller_lock:
+            self.poller_pauses = max(self.poller_pauses - 1, 0)
+
+    def close(self):
+        '''Stops the position poller and closes the serial connection to the motors'''
+        self.poller_stop.set()
+        if self.poller is not None:
+            self.poller.join()
+        self.connection.close()
+
+
+class ZaberConnection:
+    '''
+    Shared serial connection to the Zaber devices daisy-chained on a port
+
+    The port stays open between commands. A reader thread matches each 6-byte reply to the
+    pending command with the same device number and command number (error replies match the
+    oldest pending command of the device), so commands to different devices can be in flight
+    at once (e.g. a move on one axis while reading the position of another).
+    '''
+
+    def __init__(self, port:str, baudrate:int=9600, transport=None):
+        # Error status
+        self.error = 0
+        self.error_message = ""
+
+        self.port = port
+        self.baudrate = baudrate
+        # Object with the serial.Serial read/write interface used instead of the port (e.g. zaber.SimulatedPort)
+        self.transport = transport
+        self.serial = None
+        self.connected = False
+        self.reader_thread = None
+
+        # Pending commands, by (device number, command number)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.sequence = itertools.count()
+
+    def open(self):
+        '''Opens the serial port (if not already opened) and starts the reply reader'''
+        with self.lock:
+            if self.serial is None:
+                # Reader stopped by a read error (see fail)
+                if self.reader_thread is not None and self.reader_thread is not threading.current_thread():
+                    self.reader_thread.join()
+                    self.reader_thread = None
+                if self.transport is not None:
+                    self.serial = self.transport
+                    if not self.serial.is_open:
+                        self.serial.open()
+                else:
+                    self.serial = serial.Serial(port = self.port, baudrate = self.baudrate, bytesize = serial.EIGHTBITS, parity = serial.PARITY_NONE, stopbits = serial.STOPBITS_ONE, timeout = 0.1)
+                # Clear I/O buffers
+                self.serial.reset_input_buffer()
+                self.serial.reset_output_buffer()
+                self.connected = True
+                self.reader_thread = threading.Thread(target = self.reader_worker, daemon = True)
+                self.reader_thread.start()
+
+    def close(self):
+        '''Stops the reply reader and closes the serial port'''
+        self.connected = False
+        if self.reader_thread is not None:
+            self.reader_thread.join()
+            self.reader_thread = None
+        with self.lock:
+            if self.serial is not None:
+                self.serial.close()
+                self.serial = None
+
+    def submit(self, instruction:bytes):
+        '''Writes a 6-byte instruction, returns a Future of the 6-byte reply (cancel it to stop waiting)'''
+        return self.submit_batch(instruction)[0]
+
+    def submit_batch(self, instructions:bytes):
+        '''Writes consecutive 6-byte instructions at once (see zaber.encode_batch), returns a list of Futures of their replies'''
+        self.open()
+        commands = []
+        with self.lock:
+            for offset in range(0, len(instructions), zaber.FRAME_SIZE):
+                command = Future()
+                command.sequence = next(self.sequence)
+                key = (instructions[offset], instructions[offset + 1])
+                self.pending.setdefault(key, deque()).append(command)
+                commands.append((key, command))
+            try:
+                self.serial.write(instructions)
+            except:
+                for key, command in commands:
+                    self.pending[key].remove(command)
+                raise
+        return [command for key, command in commands]
+
+    def request(self, instruction:bytes, timeout:float=2.0):
+        '''Writes a 6-byte instruction and returns the 6-byte reply (None if no reply within timeout)'''
+        command = self.submit(instruction)
+        try:
+            return command.result(timeout)
+        except TimeoutError:
+            command.cancel()
+            return None
+
+    def reader_worker(self):
+        '''Thread reading replies and handing them to the pending commands'''
+        reply = b''
+        while self.connected:
+            try:
+                reply += self.serial.read(zaber.FRAME_SIZE - len(reply))
+            except Exception as error:
+                self.error = 1
+                self.error_message = "Serial port error"
+                print('ZaberConnection - read error')
+                self.fail(error)
+                break
+            if len(reply) == zaber.FRAME_SIZE:
+                self.dispatch(reply)
+                reply = b''
+
+    def fail(self, error:Exception):
+        '''Closes the serial port after a read error and fails the pending commands with it, the next submit reopens the port'''
+        with self.lock:
+            self.connected = False
+            if self.serial is not None:
+                try:
+                    self.serial.close()
+                except:
+                    pass
+                self.serial = None
+            commands = [command for commands in self.pending.values() for command in commands]
+            self.pending.clear()
+        for command in commands:
+            if command.set_running_or_notify_cancel():
+                command.set_exception(error)
+
+    def dispatch(self, reply:bytes):
+        '''Hands a reply to its pending command, unsolicited replies are ignored'''
+        device_number, cmd_no = reply[0], reply[1]
+        with self.lock:
+            # Cancelled commands no longer wait for their reply
+            for commands in self.pending.values():
+                while commands and commands[0].cancelled():
+                    commands.popleft()
+            commands = self.pending.get((device_number, cmd_no))
+            if not commands and cmd_no == 255:
+                # Error reply, for the oldest pending command of the device
+                device_commands = [commands for (device, _), commands in self.pending.items() if device == device_number and commands]
+                if device_commands:
+                    commands = min(device_commands, key = lambda commands: commands[0].sequence)
+            command = commands.popleft() if commands else None
+        if command is not None and command.set_running_or_notify_cancel():
+            command.set_result(reply)
+
 
 class ZaberMotor:
     '''Class for Zaber's T-LS series linear stage motor control'''
 
-    def __init__(self, port:str, device_number:int):
+    # Moves only reply once completed
+    reply_timeout = 2.0
+    move_timeout = 60.0
+
+    # Commands replying with the device position (home, move absolute, move relative, return current position)
+    position_commands = (1, 20, 21, 60)
+
+    def __init__(self, port:str, device_number:int, connection:ZaberConnection=None):
         # Error status
         self.error = 0
         self.error_message = ""
@@ -157,71 +409,93 @@ class ZaberMotor:
         self.limit_low_microsteps = 0
         self.origin_microsteps = 0
 
+        # Last position reported by the device (None until the first reply)
+        self.position_microsteps = None
+
         self.port = port
         self.device_number = device_number
+        self.connection = connection if connection is not None else ZaberConnection(port)
         self.ask_id()
 
-    def _motorIO(self, cmd_no, cmd_param):
+    def _instruction(self, cmd_no, cmd_param):
+        '''Generates the 6-byte instruction from cmd_no and cmd_param'''
+        return zaber.encode(self.device_number, cmd_no, cmd_param)
+
+    def _reply_data(self, cmd_no, reply_bytes):
+        '''Returns the data value of a 6-byte reply (0 and error status set if the reply is invalid)'''
         # Default return
         reply_data = 0
 
-        # Generate 6-byte instruction from cmd_no and cmd_param
-        # Taking into account negative data (such as a relative motion)
-        if cmd_param < 0:
-            cmd_param = pow(256,4) + cmd_param
-        # Generates bytes 3 to 6
-        byte_6 = int(cmd_param // pow(256,3))
-        cmd_param = cmd_param % pow(256,3)
-        byte_5 = int(cmd_param // pow(256,2))
-        cmd_param = cmd_param % pow(256,2)
-        byte_4 = int(cmd_param // pow(256,1))
-        cmd_param = cmd_param % pow(256,1)
-        byte_3 = int(cmd_param // pow(256,0))
-        # Assemble instruction
-        instruction = []
-        instruction.append(int(self.device_number))
-        instruction.append(int(cmd_no))
-        instruction.append(byte_3)
-        instruction.append(byte_4)
-        instruction.append(byte_5)
-        instruction.append(byte_6)
+        # Checks if reply is valid length
+        if reply_bytes is not None and len(reply_bytes) == zaber.FRAME_SIZE:
+            device_number, reply_cmd_no, data = zaber.decode(reply_bytes)
+            if device_number == self.device_number and reply_cmd_no == cmd_no:
+                # Reply has a valid length and fits expected format
+                reply_data = data
+                if cmd_no in self.position_commands:
+                    self.position_microsteps = reply_data
+            elif device_number == self.device_number and reply_cmd_no == zaber.COMMANDS['error']:
+                self.error = 1
+                self.error_message = "Motor reports an error as occured"
+            else:
+                self.error = 1
+                self.error_message = "Reply does not fit expected format"
+        else:
+            self.error = 1
+            self.error_message = "No valid reply received"
+        return reply_data
 
+    def _motorIO(self, cmd_no, cmd_param, timeout:float=None):
+        '''Sends a command and waits for its reply, returns the reply data'''
+        if timeout is None:
+            timeout = self.reply_timeout
         try:
-            # Try to open a serial connection
-            motor = serial.Serial(port = self.port, baudrate = 9600, bytesize = serial.EIGHTBITS, parity = serial.PARITY_NONE, stopbits = serial.STOPBITS_ONE, timeout = 2)
-            # Clear I/O buffers
-            motor.reset_input_buffer()
-            motor.reset_output_buffer()
-            # Write instruction bytes to motor
-            motor.write(bytes(instruction))
-            # Read 6-bytes reply
-            reply_bytes = motor.read(6)
-            # Close serial connection to motor
-            motor.close()
+            # Write instruction bytes to motor and wait for its 6-bytes reply (shared connection)
+            reply_bytes = self.connection.request(self._instruction(cmd_no, cmd_param), timeout)
         except:
             self.error = 1
             self.error_message = "Serial port error"
             print('Serial port error!')
-        else:
-            # Checks if reply is valid length
-            if len(reply_bytes) == 6:
-                if reply_bytes[0] == self.device_number and reply_bytes[1] == cmd_no:
-                    # Reply has a valid length and fits expected format
-                    # Convert returned bytes into data value (handling negative values)
-                    if reply_bytes[5] > 127:
-                        reply_data = (pow(256,3) * reply_bytes[5] + pow(256,2) * reply_bytes[4] + pow(256,1) * reply_bytes[3] + pow(256,0) * reply_bytes[2]) - pow(256,4)
-                    else:
-                        reply_data = (pow(256,3) * reply_bytes[5] + pow(256,2) * reply_bytes[4] + pow(256,1) * reply_bytes[3] + pow(256,0) * reply_bytes[2])
-                elif reply_bytes[0] == self.device_number and reply_bytes[1] == 255:
+            return 0
+        return self._reply_data(cmd_no, reply_bytes)
+
+    def _motorIO_async(self, cmd_no, cmd_param):
+        '''Sends a command without waiting, returns a Future of the reply data'''
+        try:
+            reply_bytes = self.connection.submit(self._instruction(cmd_no, cmd_param))
+        except:
+            self.error = 1
+            self.error_message = "Serial port error"
+            print('Serial port error!')
+            reply_bytes = None
+        return self._reply_future(cmd_no, reply_bytes)
+
+    def _reply_future(self, cmd_no, reply_bytes:Future):
+        '''Future of the reply data from a Future of the 6-byte reply (0 if no command was sent)'''
+        reply = Future()
+        if reply_bytes is None:
+            reply.set_result(0)
+            return reply
+
+        def decode_reply(reply_bytes:Future):
+            if reply_bytes.cancelled():
+                reply.cancel()
+            elif reply.set_running_or_notify_cancel():
+                if reply_bytes.exception() is not None:
                     self.error = 1
-                    self.error_message = "Motor reports an error as occured"
+                    self.error_message = "Serial port error"
+                    reply.set_exception(reply_bytes.exception())
                 else:
-                    self.error = 1
-                    self.error_message = "Reply does not fit expected format"
-            else:
-                self.error = 1
-                self.error_message = "No valid reply received"
-        return reply_data
+                    reply.set_result(self._reply_data(cmd_no, reply_bytes.result()))
+
+        def cancel_command(reply:Future):
+            # A cancelled command no longer waits for its reply
+            if reply.cancelled():
+                reply_bytes.cancel()
+
+        reply.add_done_callback(cancel_command)
+        reply_bytes.add_done_callback(decode_reply)
+        return reply
 
 
     def ask_id(self):
@@ -303,13 +577,17 @@ class ZaberMotor:
     def get_name(self):
         return self.name
 
-    def get_position(self, units):
+    def get_position(self, units, cached:bool=False):
         '''Returns the current position of the device. The position is converted into the unit specified.
 
         Parameter:
             unit: A string. The options are: 'm', 'cm', 'mm', '\u03BCm' (micrometers) and '\u03BCStep' (microsteps)
+            cached: If True, returns the last position reported by the device (move replies and
+                    position poller) without a serial round trip
         '''
-        if self.id != 0:
+        if cached and self.position_microsteps is not None:
+            position = self.microsteps_to_position(self.position_microsteps, units)
+        elif self.id != 0:
             cmd_no = 60
             cmd_param = 0
             reply_data = self._motorIO(cmd_no, cmd_param)
@@ -323,7 +601,7 @@ class ZaberMotor:
         if self.id != 0:
             cmd_no = 1
             cmd_param = 0
-            self._motorIO(cmd_no, cmd_param)
+            self._motorIO(cmd_no, cmd_param, self.move_timeout)
 
     def move_absolute_position(self, absolute_position, units):
         '''Moves the device to a specified absolute position.
@@ -336,8 +614,50 @@ class ZaberMotor:
         if self.id != 0:
             cmd_no = 20
             cmd_param = self.position_to_microsteps(absolute_position, units)
-            self._motorIO(cmd_no, cmd_param)
+            # Cached position is the one reported by the move reply, unknown if there is no valid reply
+            self.position_microsteps = None
+            self._motorIO(cmd_no, cmd_param, self.move_timeout)
+
+
+    def move_absolute_position_async(self, absolute_position, units):
+        '''Starts a move to a specified absolute position and returns without waiting
 
+        Returns a concurrent.futures.Future, done once the move is completed, with the final
+        position (in the units specified) as result. Cancel it to stop waiting for the reply.
+        '''
+        if self.id != 0:
+            cmd_no = 20
+            cmd_param = self.position_to_microsteps(absolute_position, units)
+            return self._position_future(self._motorIO_async(cmd_no, cmd_param), units)
+        return self._position_future(None, units)
+
+    def move_relative_position_async(self, relative_position, units):
+        '''Starts a relative move and returns without waiting (see move_absolute_position_async)'''
+        if self.id != 0:
+            cmd_no = 21
+            cmd_param = self.position_to_microsteps(relative_position, units)
+            return self._position_future(self._motorIO_async(cmd_no, cmd_param), units)
+        return self._position_future(None, units)
+
+    def _position_future(self, reply:Future, units):
+        '''Future of the position (in units) from a Future of the reply data (in microsteps)'''
+        position = Future()
+        if reply is None:
+            position.set_result(0)
+            return position
+
+        def convert_reply(reply:Future):
+            if reply.cancelled():
+                position.cancel()
+            elif position.set_running_or_notify_cancel():
+                if reply.exception() is not None:
+                    position.set_exception(reply.exception())
+                else:
+                    position.set_result(self.microsteps_to_position(reply.result(), units))
+
+        position.add_done_callback(lambda position: reply.cancel() if position.cancelled() else None)
+        reply.add_done_callback(convert_reply)
+        return position
 
     def move_relative_position(self, relative_position, units):
         '''Moves the device to a specified relative position
@@ -350,7 +670,7 @@ class ZaberMotor:
         if self.id != 0:
             cmd_no = 21
             cmd_param = self.position_to_microsteps(relative_position, units)
-            self._motorIO(cmd_no, cmd_param)
+            self._motorIO(cmd_no, cmd_param, self.move_timeout)
 
 
     def move_maximum_position(self):
@@ -358,7 +678,7 @@ class ZaberMotor:
         if self.id != 0:
             cmd_no = 20
             cmd_param = self.microsteps_max
-            self._motorIO(cmd_no, cmd_param)
+            self._motorIO(cmd_no, cmd_param, self.move_timeout)
 
 
     def microsteps_to_position(self, microsteps, units:str='mm'):
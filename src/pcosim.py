@@ -0,0 +1,266 @@
+'''
+Created on October 17, 2026
+'''
+
+import time
+import threading
+import numpy as np
+
+from src import daq
+
+
+class Camera:
+    '''
+    Simulated pco.Camera (subset of the pco package used by src.camera.Camera)
+
+    With the 'auto sequence' trigger mode, frames are produced at the camera frame rate from
+    the moment a recording session starts: line time x (ysize + exposed lines) in lightsheet
+    mode, exposure time plus rolling readout otherwise. With external trigger modes, one frame
+    is recorded for each rising edge generated by a simulated digital output task (src.daq
+    trigger_edges) during the session, i.e. only while the camera scan task runs. Exposure
+    times and missed triggers (edges faster than the frame rate) are not simulated.
+    Images are synthetic light-sheet frames, a fixed sample texture lit by a sheet whose focus
+    moves across the frame from one image to the next (as for ETL steps).
+    '''
+
+    def __init__(self, xsize:int=2048, ysize:int=2048, focus_steps:int=8, seed:int=0):
+        self.sdk = SimulatedSdk(self, xsize, ysize)
+        self.rec = SimulatedRecorder(self)
+        self.focus_steps = focus_steps
+        self.seed = seed
+        self._frames = {}
+        self._texture_cache = None
+
+    def frame_time(self):
+        '''Time (in seconds) between two images'''
+        sdk = self.sdk
+        if sdk.line_timing == 'on':
+            return sdk.line_time * (sdk.ysize + sdk.lines_exposure)
+        # Rolling readout from the center, two lines at a time
+        return sdk.exposure + sdk.default_line_time * sdk.ysize / 2
+
+    def record(self, number_of_images:int=1, mode:str='sequence'):
+        '''Starts a recording session'''
+        if number_of_images < 1:
+            raise ValueError('Number of images must be at least 1')
+        if mode not in ('sequence', 'sequence non blocking', 'ring buffer', 'fifo'):
+            raise ValueError('Unsupported recording mode: ' + str(mode))
+        # Synthetic frames are computed before the session starts, so they do not slow down the copies
+        for step in range(self.focus_steps):
+            self.synthetic_frame(step)
+        self.rec.start(int(number_of_images), mode)
+        if mode == 'sequence':
+            # Blocking mode returns once all the images are recorded
+            time.sleep(number_of_images * self.frame_time())
+
+    def stop(self):
+        '''Stops the recording session (recorded images are kept)'''
+        self.rec.stop()
+
+    def close(self):
+        self.rec.delete()
+
+    def image(self, image_number:int=0, roi=None):
+        '''Returns (image, metadata) of a recorded image'''
+        recorded = self.rec.recorded_images()
+        if recorded == 0:
+            raise ValueError('No image recorded')
+        if self.rec.mode in ('ring buffer', 'fifo'):
+            # image_number is a buffer index, buffers hold the latest images
+            buffers = self.rec.number_of_images
+            latest = recorded - 1
+            count = latest - ((latest - image_number) % buffers)
+        else:
+            count = min(image_number, recorded - 1)
+        image = self.synthetic_frame(count).copy()
+        if roi is not None:
+            image = image[roi[1]-1:roi[3], roi[0]-1:roi[2]].copy()
+        return image, {'data format': 'Mono16', 'recorder image number': count + 1}
+
+    def images(self, roi=None, blocksize:int=None):
+        '''Returns (list of images, list of metadata) of the recorded images'''
+        recorded = min(self.rec.recorded_images(), self.rec.number_of_images)
+        if blocksize is not None:
+            recorded = min(recorded, blocksize)
+        images = []
+        metadatas = []
+        for index in range(recorded):
+            image, metadata = self.image(index, roi)
+            images.append(image)
+            metadatas.append(metadata)
+        return images, metadatas
+
+    def synthetic_frame(self, count:int):
+        '''Synthetic frame of the count-th image (frames are computed once per focus step)'''
+        step = count % self.focus_steps
+        shape = (self.sdk.ysize, self.sdk.xsize)
+        key = (shape, step)
+        if key not in self._frames:
+            if any(frame_shape != shape for frame_shape, _ in self._frames):
+                self._frames = {}
+            self._frames[key] = self._light_sheet_frame(shape, step)
+        return self._frames[key]
+
+    def _texture(self, shape):
+        '''Sample texture (blurred random beads), identical for every focus step'''
+        if self._texture_cache is None or self._texture_cache.shape != shape:
+            rng = np.random.default_rng(self.seed)
+            texture = rng.random(shape, dtype=np.float32) ** 8
+            for axis in (0, 1):
+                texture = (texture + np.roll(texture, 1, axis) + np.roll(texture, -1, axis)) / 3
+            self._texture_cache = texture
+        return self._texture_cache
+
+    def _light_sheet_frame(self, shape, step:int):
+        ysize, xsize = shape
+        rng = np.random.default_rng(self.seed + step + 1)
+        texture = self._texture(shape)
+
+        # Light sheet focused on one column band per step, thicker (dimmer) away from the waist
+        focus = (step + 0.5) * xsize / self.focus_steps
+        rayleigh = xsize / (2 * self.focus_steps)
+        thickness = np.sqrt(1 + ((np.arange(xsize, dtype=np.float32) - focus) / rayleigh) ** 2)
+        sheet = 1 / thickness
+
+        frame = 100 + 4000 * texture * sheet
+        frame += rng.normal(0, 5, shape).astype(np.float32)
+        return np.clip(frame, 0, 65535).astype(np.uint16)
+
+
+class SimulatedSdk:
+    '''Simulated pco.Camera.sdk'''
+
+    def __init__(self, camera:Camera, xsize:int, ysize:int):
+        self.camera = camera
+        self.xsize = xsize
+        self.ysize = ysize
+        self.recording_state = 'off'
+        self.trigger_mode = 'auto sequence'
+        self.delay = 0.0
+        self.exposure = 0.01
+        # pco.edge line time (in seconds)
+        self.default_line_time = 9.76e-6
+        self.line_timing = 'off'
+        self.line_time = self.default_line_time
+        self.lines_exposure = 1
+        self.lines_delay = 0
+
+    def get_sizes(self):
+        return {'x': self.xsize, 'y': self.ysize, 'x max': self.xsize, 'y max': self.ysize}
+
+    def set_image_parameters(self, image_width:int, image_height:int):
+        pass
+
+    def arm_camera(self):
+        pass
+
+    def get_recording_state(self):
+        return {'recording state': self.recording_state}
+
+    def set_recording_state(self, state:str):
+        self.recording_state = state
+        if state == 'off':
+            self.camera.rec.stop()
+
+    def get_trigger_mode(self):
+        return {'trigger mode': self.trigger_mode}
+
+    def set_trigger_mode(self, mode:str):
+        self.trigger_mode = mode
+
+    def get_delay_exposure_time(self):
+        return {'delay': int(self.delay * 1e3), 'delay timebase': 'ms', 'exposure': int(self.exposure * 1e3), 'exposure timebase': 'ms'}
+
+    def set_delay_exposure_time(self, delay, delay_timebase:str, exposure, exposure_timebase:str):
+        timebases = {'ns': 1e-9, 'us': 1e-6, 'ms': 1e-3}
+        self.delay = delay * timebases[delay_timebase]
+        self.exposure = exposure * timebases[exposure_timebase]
+
+    def get_cmos_line_timing(self):
+        return {'parameter': self.line_timing, 'line time': self.line_time}
+
+    def set_cmos_line_timing(self, parameter:str, line_time:float):
+        self.line_timing = parameter
+        self.line_time = line_time if parameter == 'on' else self.default_line_time
+
+    def get_cmos_line_exposure_delay(self):
+        return {'lines exposure': self.lines_exposure, 'lines delay': self.lines_delay}
+
+    def set_cmos_line_exposure_delay(self, lines_exposure:int, lines_delay:int):
+        self.lines_exposure = lines_exposure
+        self.lines_delay = lines_delay
+
+    def get_camera_name(self):
+        return {'camera name': 'pco.edge simulated'}
+
+    def get_temperature(self):
+        return {'sensor temperature': 7.0, 'camera temperature': 30.0, 'power temperature': 35.0}
+
+    def get_acquire_mode(self):
+        return {'acquire mode': 'auto'}
+
+    def get_storage_mode(self):
+        return {'storage mode': 'recorder'}
+
+    def get_recorder_submode(self):
+        return {'recorder submode': 'ring buffer' if self.camera.rec.mode in ('ring buffer', 'fifo') else 'sequence'}
+
+    def get_camera_description(self):
+        return {'pixel rate': [95333333, 272250000]}
+
+    def get_pixel_rate(self):
+        return {'pixel rate': 272250000}
+
+    def get_interface_output_format(self, interface:str):
+        return {'format': 0}
+
+
+class SimulatedRecorder:
+    '''Simulated pco.Camera.rec, images are counted from the recording start time (or trigger edges, see Camera)'''
+
+    def __init__(self, camera:Camera):
+        self.camera = camera
+        self.lock = threading.Lock()
+        self.mode = None
+        self.number_of_images = 0
+        self.start_time = None
+        self.stop_time = None
+
+    def start(self, number_of_images:int, mode:str):
+        with self.lock:
+            self.mode = mode
+            self.number_of_images = number_of_images
+            self.start_time = time.perf_counter()
+            self.stop_time = None
+        self.camera.sdk.recording_state = 'on'
+
+    def stop(self):
+        with self.lock:
+            if self.start_time is not None and self.stop_time is None:
+                self.stop_time = time.perf_counter()
+        self.camera.sdk.recording_state = 'off'
+
+    def delete(self):
+        with self.lock:
+            self.mode = None
+            self.number_of_images = 0
+            self.start_time = None
+            self.stop_time = None
+        self.camera.sdk.recording_state = 'off'
+
+    def recorded_images(self):
+        '''Number of images recorded since the start of the session'''
+        with self.lock:
+            if self.start_time is None:
+                return 0
+            now = self.stop_time if self.stop_time is not None else time.perf_counter()
+            if self.camera.sdk.trigger_mode == 'auto sequence':
+                count = int((now - self.start_time) / self.camera.frame_time())
+            else:
+                count = daq.trigger_edges(self.start_time, now)
+            if self.mode in ('sequence', 'sequence non blocking'):
+                count = min(count, self.number_of_images)
+            return count
+
+    def get_status(self):
+        return {'bIsRunning': int(self.stop_time is None and self.start_time is not None), 'dwProcImgCount': self.recorded_images()}
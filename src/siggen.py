@@ -6,16 +6,18 @@ Created on May 16, 2019
 import sys
 sys.path.append(".")
 
+from collections import OrderedDict
 import numpy as np
 
-# National Instruments Imports
-import nidaqmx
-from nidaqmx.constants import AcquisitionType, LineGrouping, Edge
+# National Instruments tasks (or simulated ones)
+from src import daq
+from src.daq import AcquisitionType, LineGrouping, Edge, WriteRelativeTo
 
 from src.camera import Camera
 
 from src.config import cfg_read, cfg_write, cfg_str2bool
 from src.waveforms import squarewave, sawtooth, staircase
+from src.waveforms import squarewave_period, sawtooth_period, staircase_levels, staircase_samples
 
 
 class SigGen:
@@ -45,6 +47,17 @@ class SigGen:
     _cfg_defaults['ETL Left Offset']          = '0.5'                 # In volts
     _cfg_defaults['ETL Right Amplitude']      = '1.0'                 # In volts
     _cfg_defaults['ETL Right Offset']         = '0.5'                 # In volts
+    _cfg_defaults['Stack Trigger Source']     = ''                    # DAQ terminal for 'stage settled' edge retriggering stack scans (empty for software start), the edge must come from external hardware
+    _cfg_defaults['Simulated']                = 'False'               # Boolean, simulated DAQ tasks (no hardware)
+    _cfg_defaults['Waveform Cache Size']      = '4'                   # Number of scan waveform sets kept for reuse (0 to disable)
+    _cfg_defaults['Compact Waveforms']        = 'False'               # Boolean, hold one waveform period and write scan buffers period by period
+    _cfg_defaults['Waveform Type']            = 'float64'             # Galvo + ETL waveforms data type: 'float64', 'float32' or 'int16' (raw DAC counts)
+
+    # Attributes set by _generate_scan_waveforms, restored from the waveform cache
+    _cached_attributes = (  'galvo_scan_time', 'waveform_metadata', 'waveform_cycles', 'total_samples', 'total_time', 'period_samples',
+                            'waveform_camera', 'waveform_galvo_etl', 'waveform_galvo_left', 'waveform_galvo_right', 'waveform_etl_left', 'waveform_etl_right',
+                            'waveform_camera_period', 'waveform_galvo_left_period', 'waveform_galvo_right_period',
+                            'waveform_etl_left_levels', 'waveform_etl_right_levels', 'waveform_etl_shift')
 
 
     def __init__(self, camera:Camera):
@@ -60,7 +73,10 @@ class SigGen:
 
         self.task_galvo_etl = None
         self.task_camera = None
+        self.scan_session = None
+        self.continuous_scan = None
 
+        self.waveform_version = 0
         self.waveform_metadata = None
         self.waveform_cycles = None
         self.waveform_camera = None
@@ -68,6 +84,23 @@ class SigGen:
         self.waveform_galvo_right = None
         self.waveform_etl_left = None
         self.waveform_etl_right = None
+        # Galvo + ETL waveforms in AO channels order (galvo left/right and etl left/right waveforms are its rows)
+        self.waveform_galvo_etl = None
+        self._ao_scaling_coefficients = None
+        # Compact waveforms (one period of the camera and galvo waveforms, ETL step levels)
+        self.period_samples = None
+        self.waveform_camera_period = None
+        self.waveform_galvo_left_period = None
+        self.waveform_galvo_right_period = None
+        self.waveform_etl_left_levels = None
+        self.waveform_etl_right_levels = None
+        self.waveform_etl_shift = None
+        self._previous_waveforms = None
+
+        # Scan waveforms of the last computed settings, least recently used first
+        self._waveform_cache = OrderedDict()
+        self.waveform_cache_hits = 0
+        self.waveform_cache_misses = 0
 
         # read configurable settings from config.ini file
         self._cfg_filename = 'config.ini'
@@ -98,6 +131,11 @@ class SigGen:
         self.etl_left_offset        = float(        self._cfg['ETL Left Offset']        )
         self.etl_right_amplitude    = float(        self._cfg['ETL Right Amplitude']    )
         self.etl_right_offset       = float(        self._cfg['ETL Right Offset']       )
+        self.stack_trigger_source   = str(          self._cfg['Stack Trigger Source']   )
+        self.simulated              = cfg_str2bool( self._cfg['Simulated']              )
+        self.waveform_cache_size    = int(          self._cfg['Waveform Cache Size']    )
+        self.compact_waveforms      = cfg_str2bool( self._cfg['Compact Waveforms']      )
+        self.waveform_type          = str(          self._cfg['Waveform Type']          )
 
         ao_device                   = self.ao_terminals.rsplit('/', 1)[0]
         ao_channels                 = self.ao_terminals.rsplit('/',1)[1][2:].rsplit(':')
@@ -129,6 +167,11 @@ class SigGen:
         self._cfg['ETL Left Offset']          = str( self.etl_left_offset               )
         self._cfg['ETL Right Amplitude']      = str( self.etl_right_amplitude           )
         self._cfg['ETL Right Offset']         = str( self.etl_right_offset              )
+        self._cfg['Stack Trigger Source']     = str( self.stack_trigger_source          )
+        self._cfg['Simulated']                = str( self.simulated                     )
+        self._cfg['Waveform Cache Size']      = str( self.waveform_cache_size           )
+        self._cfg['Compact Waveforms']        = str( self.compact_waveforms             )
+        self._cfg['Waveform Type']            = str( self.waveform_type                 )
 
         self._cfg = cfg_write(self._cfg_filename, self._cfg_section, self._cfg)
 
@@ -142,7 +185,7 @@ class SigGen:
                                                 np.array([right_etl])   ))
         # Running task
         try:
-            with nidaqmx.Task(new_task_name = 'galvo_etl_setpoint') as task_update_all:
+            with daq.Task(new_task_name = 'galvo_etl_setpoint', simulated = self.simulated) as task_update_all:
                 task_update_all.ao_channels.add_ao_voltage_chan(self.ao_terminals)
                 task_update_all.write(galvo_etl_setpoints, auto_start = True)
         except:
@@ -157,7 +200,7 @@ class SigGen:
                                             np.array([left_galvo])   ))
         # Running task
         try:
-            with nidaqmx.Task(new_task_name = 'galvo_single') as task_update_galvos:
+            with daq.Task(new_task_name = 'galvo_single', simulated = self.simulated) as task_update_galvos:
                 task_update_galvos.ao_channels.add_ao_voltage_chan(self.galvo_terminals)
                 task_update_galvos.write(galvo_setpoints, auto_start = True)
         except:
@@ -172,7 +215,7 @@ class SigGen:
                                         np.array([right_etl])   ))
         # Running task
         try:
-            with nidaqmx.Task(new_task_name = 'etl_single') as task_update_etls:
+            with daq.Task(new_task_name = 'etl_single', simulated = self.simulated) as task_update_etls:
                 task_update_etls.ao_channels.add_ao_voltage_chan(self.etl_terminals)
                 task_update_etls.write(etl_setpoints, auto_start = True)
         except:
@@ -181,21 +224,158 @@ class SigGen:
             print('SigGen - update_etls error')
 
 
+    def open_scan_session(self, mode:str, trigger_source:str=''):
+        '''Opens a persistent scan session, scan tasks are then re-armed rather than rebuilt for every scan
+
+        If a trigger source terminal is given, each rising edge on it retriggers a complete scan
+        '''
+        self.close_scan_session()
+        self.scan_session = ScanSession(self, mode, trigger_source)
+
+
+    def close_scan_session(self):
+        '''Closes the current scan session and its tasks'''
+        if self.scan_session is not None:
+            self.scan_session.close()
+            self.scan_session = None
+
+
+    def open_continuous_scan(self):
+        '''Builds continuous scan tasks with the current waveforms (see ContinuousScan), started by start_continuous_scan'''
+        self.close_continuous_scan()
+        self.continuous_scan = ContinuousScan(self)
+        self.continuous_scan.build()
+
+
+    def start_continuous_scan(self):
+        if self.continuous_scan is not None:
+            self.continuous_scan.start()
+
+
+    def update_continuous_scan(self):
+        '''Hot-swaps the current waveforms into the running continuous scan, returns False if it needs a restart'''
+        if self.continuous_scan is None:
+            return False
+        return self.continuous_scan.update()
+
+
+    def close_continuous_scan(self):
+        '''Stops the continuous scan and closes its tasks'''
+        if self.continuous_scan is not None:
+            self.continuous_scan.close()
+            self.continuous_scan = None
+
+
+    def ao_scaling_coefficients(self):
+        '''DAC scaling coefficients (volts to counts) of the AO channels, one tuple per channel, read once per AO terminals'''
+        terminals = (self.ao_terminals, self.simulated)
+        if self._ao_scaling_coefficients is None or self._ao_scaling_coefficients[0] != terminals:
+            coefficients = daq.ao_scaling_coefficients(self.ao_terminals, simulated = self.simulated)
+            self._ao_scaling_coefficients = (terminals, tuple(tuple(channel) for channel in coefficients))
+        return self._ao_scaling_coefficients[1]
+
+
+    def ao_samples(self, volts, channel:int, out):
+        '''
+        Stores AO channel voltages in out, converted to the waveform type
+
+        With the 'int16' waveform type, voltages are converted to DAC counts with the device
+        scaling coefficients of the channel (rounded and clipped to the int16 range).
+        '''
+        if out.dtype != np.int16:
+            out[:] = volts
+            return out
+        coefficients = self.ao_scaling_coefficients()[channel]
+        counts = np.full(volts.shape, coefficients[-1])
+        for coefficient in reversed(coefficients[:-1]):
+            counts *= volts
+            counts += coefficient
+        np.rint(counts, out = counts)
+        np.clip(counts, -32768, 32767, out = counts)
+        out[:] = counts
+        return out
+
+
+    def _write_galvo_etl(self, task_galvo_etl, galvo_etl_waveforms):
+        '''Writes galvo + ETL samples (volts, or DAC counts with the raw writer) to the AO task'''
+        if galvo_etl_waveforms.dtype == np.int16:
+            daq.write_raw(task_galvo_etl, galvo_etl_waveforms)
+        else:
+            task_galvo_etl.write(galvo_etl_waveforms, auto_start = False)
+
+
+    def galvo_etl_period(self, period:int, out=None):
+        '''Galvo + ETL scan samples (AO channels order) of one period of the compact waveforms'''
+        if out is None:
+            out = np.empty((4, self.period_samples))
+        # FIXME (HARDWARE) - LOOKS LIKE ETL OR GALVO ARE REVERSED (LEFT VS RIGHT)
+        out[0] = self.waveform_galvo_right_period
+        out[1] = self.waveform_galvo_left_period
+        staircase_samples(self.waveform_etl_left_levels, self.period_samples, self.waveform_etl_shift, first_sample = period * self.period_samples, samples = self.period_samples, out = out[2])
+        staircase_samples(self.waveform_etl_right_levels, self.period_samples, self.waveform_etl_shift, first_sample = period * self.period_samples, samples = self.period_samples, out = out[3])
+        return out
+
+
+    def write_scan_waveforms(self, task_camera, task_galvo_etl, running:bool=False):
+        '''
+        Writes the scan waveforms to the Camera Exposure Control (DO) and Galvo + ETL scan (AO) tasks
+
+        Compact waveforms are written one period (ETL step) at a time into task buffers sized
+        for the complete sequence, so the complete float64 waveforms are never built.
+
+        With running tasks (continuous scan), waveforms are written at the current write
+        position, which is at a scan boundary once complete scans have been written.
+        '''
+        if running:
+            for task in (task_camera, task_galvo_etl):
+                task.out_stream.relative_to = WriteRelativeTo.CURRENT_WRITE_POSITION
+                task.out_stream.offset = 0
+
+        if not self.compact_waveforms:
+            task_camera.write(self.waveform_camera, auto_start = False)
+            self._write_galvo_etl(task_galvo_etl, self.waveform_galvo_etl)
+            return
+
+        if not running:
+            for task in (task_camera, task_galvo_etl):
+                task.out_stream.output_buf_size = self.total_samples
+                task.out_stream.relative_to = WriteRelativeTo.FIRST_SAMPLE
+        galvo_etl_waveforms = np.empty((4, self.period_samples))
+        galvo_etl_counts = np.empty((4, self.period_samples), dtype = np.int16) if self.waveform_type == 'int16' else None
+        for period in range(self.waveform_cycles):
+            if not running:
+                for task in (task_camera, task_galvo_etl):
+                    task.out_stream.offset = period * self.period_samples
+            task_camera.write(self.waveform_camera_period, auto_start = False)
+            self.galvo_etl_period(period, out = galvo_etl_waveforms)
+            if galvo_etl_counts is not None:
+                for channel in range(4):
+                    self.ao_samples(galvo_etl_waveforms[channel], channel, out = galvo_etl_counts[channel])
+                self._write_galvo_etl(task_galvo_etl, galvo_etl_counts)
+            else:
+                self._write_galvo_etl(task_galvo_etl, galvo_etl_waveforms)
+        # Next writes start from the first sample again
+        if not running:
+            for task in (task_camera, task_galvo_etl):
+                task.out_stream.offset = 0
+
+
     def create_scanner(self):
         '''Creates Galvo + ETL scan task (AO) + Camera Exposure Control task (DO)'''
 
-        # Stack galvo and etl waveforms into single array
-        # FIXME (HARDWARE) - LOOKS LIKE ETL OR GALVO ARE REVERSED (LEFT VS RIGHT)
-        galvo_etl_waveforms = np.stack((self.waveform_galvo_right, self.waveform_galvo_left, self.waveform_etl_left, self.waveform_etl_right))
+        # With an open scan session, tasks persist and are only re-armed
+        if self.scan_session is not None:
+            self.scan_session.arm()
+            return
 
         try:
             # Creating and setting up the galvo + ETL scan task (AO)
-            self.task_galvo_etl = nidaqmx.Task(new_task_name = 'galvo_etl_scan')
+            self.task_galvo_etl = daq.Task(new_task_name = 'galvo_etl_scan', simulated = self.simulated)
             self.task_galvo_etl.ao_channels.add_ao_voltage_chan(self.ao_terminals)
             self.task_galvo_etl.timing.cfg_samp_clk_timing(rate = self.sample_rate, sample_mode = AcquisitionType.FINITE, samps_per_chan = self.total_samples)
 
             # Creating and setting up the camera exposure control task (DO)
-            self.task_camera = nidaqmx.Task(new_task_name = 'camera_scan')
+            self.task_camera = daq.Task(new_task_name = 'camera_scan', simulated = self.simulated)
             self.task_camera.do_channels.add_do_chan(self.do_terminals, line_grouping = LineGrouping.CHAN_PER_LINE)
             self.task_camera.timing.cfg_samp_clk_timing(rate = self.sample_rate, sample_mode = AcquisitionType.FINITE, samps_per_chan = self.total_samples)
 
@@ -203,8 +383,7 @@ class SigGen:
             self.task_camera.triggers.start_trigger.cfg_dig_edge_start_trig(self.do_start_trigger, trigger_edge = Edge.RISING)
 
             # Write waveforms to AO and DO tasks (to be started later)
-            self.task_camera.write(self.waveform_camera, auto_start = False)
-            self.task_galvo_etl.write(galvo_etl_waveforms, auto_start = False)
+            self.write_scan_waveforms(self.task_camera, self.task_galvo_etl)
         except:
             self.task_galvo_etl = None
             self.task_camera = None
@@ -237,6 +416,9 @@ class SigGen:
 
     def delete_scanner(self):
         '''Delete AO and DO tasks'''
+        # Tasks owned by an open scan session are kept for the next scan
+        if self.scan_session is not None:
+            return
         if self.task_galvo_etl is not None and self.task_camera is not None:
             self.task_camera.close()
             self.task_camera = None
@@ -244,8 +426,70 @@ class SigGen:
             self.task_galvo_etl = None
 
 
+    def waveform_cache_key(self):
+        '''Settings the scan waveforms are computed from (SigGen settings and camera timing)
+
+        int16 waveforms also depend on the DAC scaling coefficients of the AO channels
+        '''
+        camera = self.camera
+        coefficients = self.ao_scaling_coefficients() if self.waveform_type == 'int16' else None
+        return (coefficients, camera.shutter_mode, camera.line_time, camera.ysize, camera.exposure_time, camera.lightsheet_exposed_lines, self.test,
+                self.compact_waveforms, self.waveform_type, self.sample_rate, self.galvo_pre_time, self.galvo_reset_time, self.galvo_post_time,
+                self.galvo_activated, self.galvo_inverted,
+                self.galvo_left_amplitude, self.galvo_left_offset, self.galvo_right_amplitude, self.galvo_right_offset,
+                self.etl_activated, self.etl_steps,
+                self.etl_left_amplitude, self.etl_left_offset, self.etl_right_amplitude, self.etl_right_offset)
+
+
+    def clear_waveform_cache(self):
+        self._waveform_cache.clear()
+
+
     def compute_scan_waveforms(self):
-        '''Compute Galvo + ETL scan ramps and Camera Exposure waveforms based on instance variables'''
+        '''
+        Compute Galvo + ETL scan ramps and Camera Exposure waveforms based on instance variables
+
+        Waveforms of the last waveform_cache_size settings are cached: if nothing changed
+        since they were computed, the cached waveforms (read-only arrays) are used again.
+        '''
+        key = self.waveform_cache_key()
+        cached = self._waveform_cache.get(key)
+        if cached is not None:
+            self._waveform_cache.move_to_end(key)
+            self.waveform_cache_hits += 1
+        else:
+            self.waveform_cache_misses += 1
+            self._generate_scan_waveforms()
+            cached = {}
+            for name in self._cached_attributes:
+                value = getattr(self, name)
+                if isinstance(value, np.ndarray):
+                    value.flags.writeable = False
+                cached[name] = value
+            if self.waveform_cache_size > 0:
+                self._waveform_cache[key] = cached
+                while len(self._waveform_cache) > self.waveform_cache_size:
+                    self._waveform_cache.popitem(last=False)
+
+        for name, value in cached.items():
+            setattr(self, name, value)
+        # Metadata is handed over to the frame savers, every scan gets its own copy
+        self.waveform_metadata = dict(cached['waveform_metadata'])
+
+        # Only bump the waveform version if the output actually changed (scan sessions rewrite buffers on version change)
+        if self.compact_waveforms:
+            waveforms = (self.waveform_camera_period, self.waveform_galvo_left_period, self.waveform_galvo_right_period,
+                         self.waveform_etl_left_levels, self.waveform_etl_right_levels, self.waveform_etl_shift)
+        else:
+            waveforms = (self.waveform_camera, self.waveform_galvo_left, self.waveform_galvo_right, self.waveform_etl_left, self.waveform_etl_right)
+        if self._previous_waveforms is None or len(waveforms) != len(self._previous_waveforms) or \
+                not all(new is old or np.array_equal(new, old) for new, old in zip(waveforms, self._previous_waveforms)):
+            self.waveform_version += 1
+        self._previous_waveforms = waveforms
+
+
+    def _generate_scan_waveforms(self):
+        '''Generates the scan waveforms for the current settings'''
 
         if self.camera.shutter_mode == 'Lightsheet':
             # Assuming vertical scan amplitude exactly matching camera FOV, galvo line speed must match camera line speed
@@ -337,6 +581,59 @@ class SigGen:
 
         # Time required for an acquisition sequence
         self.total_time = self.total_samples / self.sample_rate
+        self.period_samples = galvo_period_samples
+
+        if self.compact_waveforms:
+            # One period of the camera and galvo waveforms (identical for every ETL step) and the ETL step levels,
+            # complete waveforms are only generated one period at a time when written (see write_scan_waveforms)
+            self.waveform_camera = None
+            self.waveform_galvo_etl = None
+            self.waveform_galvo_left = None
+            self.waveform_galvo_right = None
+            self.waveform_etl_left = None
+            self.waveform_etl_right = None
+            self.waveform_camera_period = squarewave_period(    pre_samples = camera_pre_samples,
+                                                                active_samples = camera_active_samples,
+                                                                post_samples = camera_post_samples,
+                                                                shift = camera_shift,
+                                                                inverted = camera_inverted)
+            self.waveform_galvo_left_period = sawtooth_period(  activated = galvo_activated,
+                                                                pre_samples = galvo_pre_samples,
+                                                                trace_samples = galvo_scan_samples,
+                                                                retrace_samples = galvo_reset_samples,
+                                                                post_samples = galvo_post_samples,
+                                                                shift = galvo_shift,
+                                                                amplitude = self.galvo_left_amplitude,
+                                                                offset = self.galvo_left_offset,
+                                                                inverted = galvo_inverted)
+            self.waveform_galvo_right_period = sawtooth_period( activated = galvo_activated,
+                                                                pre_samples = galvo_pre_samples,
+                                                                trace_samples = galvo_scan_samples,
+                                                                retrace_samples = galvo_reset_samples,
+                                                                post_samples = galvo_post_samples,
+                                                                shift = galvo_shift,
+                                                                amplitude = self.galvo_right_amplitude,
+                                                                offset = self.galvo_right_offset,
+                                                                inverted = galvo_inverted)
+            self.waveform_etl_left_levels = staircase_levels(   activated = etl_activated,
+                                                                nbr_steps = etl_steps,
+                                                                amplitude = self.etl_left_amplitude,
+                                                                offset = self.etl_left_offset,
+                                                                direction = 'down')
+            self.waveform_etl_right_levels = staircase_levels(  activated = etl_activated,
+                                                                nbr_steps = etl_steps,
+                                                                amplitude = self.etl_right_amplitude,
+                                                                offset = self.etl_right_offset,
+                                                                direction = 'up')
+            self.waveform_etl_shift = etl_shift
+            return
+
+        self.waveform_camera_period = None
+        self.waveform_galvo_left_period = None
+        self.waveform_galvo_right_period = None
+        self.waveform_etl_left_levels = None
+        self.waveform_etl_right_levels = None
+        self.waveform_etl_shift = None
 
         # Compute camera waveform
         self.waveform_camera = squarewave(      pre_samples = camera_pre_samples,
@@ -345,8 +642,19 @@ class SigGen:
                                                 shift = camera_shift,
                                                 repeat = camera_repeat,
                                                 inverted = camera_inverted)
+        # Galvo + ETL waveforms are computed into one array in AO channels order (written to the AO task without copy)
+        # FIXME (HARDWARE) - LOOKS LIKE ETL OR GALVO ARE REVERSED (LEFT VS RIGHT)
+        dtypes = {'float64': np.float64, 'float32': np.float32, 'int16': np.int16}
+        if self.waveform_type not in dtypes:
+            raise ValueError('waveform type not supported: ' + str(self.waveform_type))
+        self.waveform_galvo_etl = np.empty((4, self.total_samples), dtype = dtypes[self.waveform_type])
+        self.waveform_galvo_right = self.waveform_galvo_etl[0]
+        self.waveform_galvo_left = self.waveform_galvo_etl[1]
+        self.waveform_etl_left = self.waveform_galvo_etl[2]
+        self.waveform_etl_right = self.waveform_galvo_etl[3]
+
         # Compute galvos waveforms
-        self.waveform_galvo_left = sawtooth(    activated = galvo_activated,
+        self.ao_samples(sawtooth(               activated = galvo_activated,
                                                 pre_samples = galvo_pre_samples,
                                                 trace_samples = galvo_scan_samples,
                                                 retrace_samples = galvo_reset_samples,
@@ -355,9 +663,9 @@ class SigGen:
                                                 repeat = galvo_repeat,
                                                 amplitude = self.galvo_left_amplitude,
                                                 offset = self.galvo_left_offset,
-                                                inverted = galvo_inverted)
+                                                inverted = galvo_inverted), 1, out = self.waveform_galvo_left)
 
-        self.waveform_galvo_right = sawtooth(   activated = galvo_activated,
+        self.ao_samples(sawtooth(               activated = galvo_activated,
                                                 pre_samples = galvo_pre_samples,
                                                 trace_samples = galvo_scan_samples,
                                                 retrace_samples = galvo_reset_samples,
@@ -366,23 +674,194 @@ class SigGen:
                                                 repeat = galvo_repeat,
                                                 amplitude = self.galvo_right_amplitude,
                                                 offset = self.galvo_right_offset,
-                                                inverted = galvo_inverted)
-        # Compute etls waveforms
-        self.waveform_etl_left = staircase(     activated = etl_activated,
+                                                inverted = galvo_inverted), 0, out = self.waveform_galvo_right)
+        # Compute etls waveforms (float64 staircases are generated in place)
+        for channel, amplitude, offset, direction in ((2, self.etl_left_amplitude, self.etl_left_offset, 'down'),
+                                                      (3, self.etl_right_amplitude, self.etl_right_offset, 'up')):
+            out = self.waveform_galvo_etl[channel]
+            waveform_etl = staircase(           activated = etl_activated,
                                                 step_samples = etl_step_samples,
                                                 nbr_steps = etl_steps,
                                                 shift = etl_shift,
-                                                amplitude = self.etl_left_amplitude,
-                                                offset = self.etl_left_offset,
-                                                direction = 'down')
+                                                amplitude = amplitude,
+                                                offset = offset,
+                                                direction = direction,
+                                                out = out if out.dtype == np.float64 else None)
+            if waveform_etl is not out:
+                self.ao_samples(waveform_etl, channel, out = out)
 
-        self.waveform_etl_right = staircase(    activated = etl_activated,
-                                                step_samples = etl_step_samples,
-                                                nbr_steps = etl_steps,
-                                                shift = etl_shift,
-                                                amplitude = self.etl_right_amplitude,
-                                                offset = self.etl_right_offset,
-                                                direction = 'up')
+
+class ScanSession:
+    '''
+    Persistent Galvo + ETL scan task (AO) + Camera Exposure Control task (DO)
+
+    Tasks are built once for an acquisition mode (e.g. 'live', 'stack') and re-armed for every scan.
+    Sample clocks are only reconfigured when the scan length changes, and waveform buffers
+    are only rewritten when SigGen reports a new waveform version.
+
+    With a trigger source, tasks are started once and every rising edge on the trigger source
+    generates a complete scan (retriggerable start trigger).
+    '''
+
+    def __init__(self, siggen:SigGen, mode:str, trigger_source:str=''):
+        self.siggen = siggen
+        self.mode = mode
+        self.trigger_source = trigger_source
+
+        self.task_galvo_etl = None
+        self.task_camera = None
+        self.samples_per_channel = None
+        self.waveform_version = None
+
+
+    def build(self):
+        '''Creates the AO and DO tasks, DO task being triggered by the AO start trigger'''
+        siggen = self.siggen
+        try:
+            self.task_galvo_etl = daq.Task(new_task_name = 'galvo_etl_scan_' + self.mode, simulated = siggen.simulated)
+            self.task_galvo_etl.ao_channels.add_ao_voltage_chan(siggen.ao_terminals)
+
+            self.task_camera = daq.Task(new_task_name = 'camera_scan_' + self.mode, simulated = siggen.simulated)
+            self.task_camera.do_channels.add_do_chan(siggen.do_terminals, line_grouping = LineGrouping.CHAN_PER_LINE)
+            self.task_camera.triggers.start_trigger.cfg_dig_edge_start_trig(siggen.do_start_trigger, trigger_edge = Edge.RISING)
+
+            if self.trigger_source:
+                # Every edge on the trigger source starts the AO task, which in turn starts the DO task
+                self.task_galvo_etl.triggers.start_trigger.cfg_dig_edge_start_trig(self.trigger_source, trigger_edge = Edge.RISING)
+                self.task_galvo_etl.triggers.start_trigger.retriggerable = True
+                self.task_camera.triggers.start_trigger.retriggerable = True
+        except:
+            self.close()
+            siggen.error = 1
+            siggen.error_message = 'scan session build error'
+            print('SigGen - scan session build error')
+
+
+    def arm(self):
+        '''Makes the session tasks ready for the next scan, rewriting buffers only if needed'''
+        siggen = self.siggen
+        if self.task_galvo_etl is None or self.task_camera is None:
+            self.build()
+            if self.task_galvo_etl is None:
+                siggen.task_galvo_etl = None
+                siggen.task_camera = None
+                return
+
+        try:
+            # Reconfigure sample clocks only if the scan length changed
+            if self.samples_per_channel != siggen.total_samples:
+                self.task_galvo_etl.timing.cfg_samp_clk_timing(rate = siggen.sample_rate, sample_mode = AcquisitionType.FINITE, samps_per_chan = siggen.total_samples)
+                self.task_camera.timing.cfg_samp_clk_timing(rate = siggen.sample_rate, sample_mode = AcquisitionType.FINITE, samps_per_chan = siggen.total_samples)
+                self.samples_per_channel = siggen.total_samples
+                self.waveform_version = None
+
+            # Rewrite buffers only if the waveforms changed
+            if self.waveform_version != siggen.waveform_version:
+                siggen.write_scan_waveforms(self.task_camera, self.task_galvo_etl)
+                self.waveform_version = siggen.waveform_version
+        except:
+            self.close()
+            siggen.error = 1
+            siggen.error_message = 'scan session arm error'
+            print('SigGen - scan session arm error')
+
+        # SigGen start/monitor/stop methods operate on the session tasks
+        siggen.task_galvo_etl = self.task_galvo_etl
+        siggen.task_camera = self.task_camera
+
+
+    def close(self):
+        '''Closes the session tasks'''
+        if self.task_camera is not None:
+            self.task_camera.close()
+            self.task_camera = None
+        if self.task_galvo_etl is not None:
+            self.task_galvo_etl.close()
+            self.task_galvo_etl = None
+        self.samples_per_channel = None
+        self.waveform_version = None
+        self.siggen.task_galvo_etl = None
+        self.siggen.task_camera = None
+
+
+class ContinuousScan:
+    '''
+    Continuous Galvo + ETL scan task (AO) + Camera Exposure Control task (DO)
+
+    The waveforms of a complete scan (every ETL step) are written once and regenerated by the
+    DAQ board until the tasks are stopped: there is no re-arming between scans. New waveforms
+    of the same length are written while the tasks run, at the current write position (a scan
+    boundary), so they take over from a following scan (hot swap). A different scan length
+    needs new tasks.
+    '''
+
+    def __init__(self, siggen:SigGen):
+        self.siggen = siggen
+
+        self.task_galvo_etl = None
+        self.task_camera = None
+        self.samples_per_channel = None
+        self.waveform_version = None
+
+
+    def build(self):
+        '''Creates the AO and DO tasks with the current waveforms, DO task being triggered by the AO start trigger'''
+        siggen = self.siggen
+        try:
+            self.task_galvo_etl = daq.Task(new_task_name = 'galvo_etl_scan_continuous', simulated = siggen.simulated)
+            self.task_galvo_etl.ao_channels.add_ao_voltage_chan(siggen.ao_terminals)
+            self.task_galvo_etl.timing.cfg_samp_clk_timing(rate = siggen.sample_rate, sample_mode = AcquisitionType.CONTINUOUS, samps_per_chan = siggen.total_samples)
+
+            self.task_camera = daq.Task(new_task_name = 'camera_scan_continuous', simulated = siggen.simulated)
+            self.task_camera.do_channels.add_do_chan(siggen.do_terminals, line_grouping = LineGrouping.CHAN_PER_LINE)
+            self.task_camera.timing.cfg_samp_clk_timing(rate = siggen.sample_rate, sample_mode = AcquisitionType.CONTINUOUS, samps_per_chan = siggen.total_samples)
+            self.task_camera.triggers.start_trigger.cfg_dig_edge_start_trig(siggen.do_start_trigger, trigger_edge = Edge.RISING)
+
+            siggen.write_scan_waveforms(self.task_camera, self.task_galvo_etl)
+            self.samples_per_channel = siggen.total_samples
+            self.waveform_version = siggen.waveform_version
+        except:
+            self.close()
+            siggen.error = 1
+            siggen.error_message = 'continuous scan build error'
+            print('SigGen - continuous scan build error')
+
+
+    def start(self):
+        '''Starts both tasks (master AO task last)'''
+        if self.task_galvo_etl is not None and self.task_camera is not None:
+            self.task_camera.start()
+            self.task_galvo_etl.start()
+
+
+    def update(self):
+        '''Writes new waveforms into the running tasks if they changed, returns False if the scan length changed'''
+        siggen = self.siggen
+        if self.task_galvo_etl is None or self.samples_per_channel != siggen.total_samples:
+            return False
+        if self.waveform_version != siggen.waveform_version:
+            try:
+                siggen.write_scan_waveforms(self.task_camera, self.task_galvo_etl, running = True)
+                self.waveform_version = siggen.waveform_version
+            except:
+                self.close()
+                siggen.error = 1
+                siggen.error_message = 'continuous scan update error'
+                print('SigGen - continuous scan update error')
+                return False
+        return True
+
+
+    def close(self):
+        '''Stops and closes the tasks'''
+        for task in (self.task_camera, self.task_galvo_etl):
+            if task is not None:
+                task.stop()
+                task.close()
+        self.task_camera = None
+        self.task_galvo_etl = None
+        self.samples_per_channel = None
+        self.waveform_version = None
 
 
 if __name__ == '__main__':
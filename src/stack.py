@@ -0,0 +1,389 @@
+'''
+Created on October 17, 2026
+'''
+
+import sys
+sys.path.append(".")
+
+import queue
+import threading
+import time
+
+from src import daq
+from src.camera import Camera
+from src.siggen import SigGen
+from src.motors import Motors, ZaberMotor
+
+
+def acquire_scan(camera:Camera, siggen:SigGen):
+    '''
+    Acquires the images of a single scan (one per ETL step) with the current scan waveforms
+
+    Scan tasks are created (or re-armed if a scan session is open) and the camera records
+    the scan in a sequence recording session. Returns the recorded images.
+    '''
+    # Number of images to be acquired from the camera
+    number_of_images = siggen.waveform_cycles
+
+    # Creating acquisition tasks (or re-arming them if a scan session is open)
+    siggen.create_scanner()
+
+    # Prime the camera recorder before we start the acquisition taks
+    camera.start_recorder(number_of_images)
+    siggen.start_scanner()
+
+    # Monitor completion of acquisition tasks and camera recorder
+    camera.monitor_recorder(number_of_images)
+    siggen.monitor_scanner()
+
+    # Stop tasks and recorder
+    camera.stop_recorder()
+    siggen.stop_scanner()
+
+    # Recover images from the recorder
+    # Note: Images must be recovered before deleting the recorder
+    recorded_images = camera.copy_recorder_images(number_of_images)
+
+    # Delete tasks and recorder (tasks of an open scan session are kept)
+    camera.delete_recorder()
+    siggen.delete_scanner()
+    return recorded_images
+
+
+class LiveEngine:
+    '''
+    Continuous live mode
+
+    Scans are generated continuously by the DAQ board (see SigGen continuous scan) while the
+    camera records into a ring buffer, so there is no arming or task creation between frames.
+    next_scan() returns the images of the latest complete scan: frames come at the camera rate
+    and scans the caller could not keep up with are skipped. update() applies new settings:
+    waveforms of the same scan length are hot-swapped into the running scan, other changes
+    (scan length, camera settings) restart the scan. The motors position poller (if motors
+    are given) is paused while live mode runs.
+    '''
+
+    def __init__(self, camera:Camera, siggen:SigGen, ring_scans:int=4, verbose:bool=False, motors:Motors=None):
+        self.verbose = verbose
+        self.camera = camera
+        self.siggen = siggen
+        self.motors = motors
+
+        # Number of scans the camera ring buffer can hold before images are overwritten
+        self.ring_scans = ring_scans
+
+        self.live_started = False
+        self.images_per_scan = None
+        self.scans_acquired = 0
+        self.camera_settings = None
+        self.restarts = 0
+
+    def _camera_settings(self):
+        '''Camera settings applied by arming the camera (a change needs a restart)'''
+        camera = self.camera
+        return (camera.shutter_mode, camera.exposure_time, camera.lightsheet_line_time, camera.lightsheet_exposed_lines, camera.lightsheet_delay_lines)
+
+    def start(self):
+        '''Arms the camera, starts the ring buffer recording session and the continuous scan'''
+        self.camera.arm_scan()
+        self.camera_settings = self._camera_settings()
+        self.siggen.compute_scan_waveforms()
+        self.images_per_scan = self.siggen.waveform_cycles
+        self.scans_acquired = 0
+
+        if self.motors is not None:
+            self.motors.pause_poller()
+        self.siggen.open_continuous_scan()
+        # Prime the camera recorder before we start the scan tasks
+        self.camera.start_recorder(self.ring_scans * self.images_per_scan, mode='ring buffer')
+        self.siggen.start_continuous_scan()
+        self.live_started = True
+
+    def update(self):
+        '''Applies the current settings, returns True if the scan had to be restarted'''
+        if self._camera_settings() == self.camera_settings:
+            # Cached waveforms are returned as long as nothing changed
+            self.siggen.compute_scan_waveforms()
+            if self.siggen.update_continuous_scan():
+                return False
+        if self.verbose:
+            print('Live scan settings changed, restarting')
+        self.stop()
+        self.start()
+        self.restarts += 1
+        return True
+
+    def next_scan(self):
+        '''Waits for the next complete scan, returns the images (one per ETL step) of the latest complete scan'''
+        self.camera.monitor_recorder((self.scans_acquired + 1) * self.images_per_scan)
+        latest_scan = max(self.camera.recorded_images() // self.images_per_scan, self.scans_acquired + 1) - 1
+        images = self.camera.copy_ring_images(latest_scan * self.images_per_scan, self.images_per_scan)
+        self.scans_acquired = latest_scan + 1
+        return images
+
+    def stop(self):
+        '''Stops the continuous scan and closes the camera recording session'''
+        self.siggen.close_continuous_scan()
+        self.camera.stop_recorder()
+        self.camera.delete_recorder()
+        if self.motors is not None:
+            self.motors.resume_poller()
+        self.live_started = False
+
+
+class StackEngine:
+    '''
+    Hardware-timed stack acquisition
+
+    The whole volume is acquired with a single scan session and a single camera recording
+    session (ring buffer). Between planes, only the motor move remains: scans are software
+    started by re-arming the persistent scan tasks (default), or retriggered by a 'stage
+    settled' edge on the SigGen 'Stack Trigger Source' terminal.
+
+    The 'stage settled' edge is an external requirement: nothing in this program generates it,
+    a stage controller output pulsing at the end of each move must be wired to that terminal
+    (with simulated devices, move_to sends the edge). Planes whose images are not all recorded
+    in time, or were overwritten in the ring buffer before being copied, raise a RuntimeError.
+    The motors position poller (if motors are given) is paused from start to finish, so that
+    it doesn't delay the plane moves.
+    '''
+
+    def __init__(self, camera:Camera, siggen:SigGen, motor:ZaberMotor, ring_planes:int=4, verbose:bool=False, motors:Motors=None):
+        self.verbose = verbose
+        self.camera = camera
+        self.siggen = siggen
+        self.motor = motor
+        self.motors = motors
+
+        # Number of planes the camera ring buffer can hold before images are overwritten
+        self.ring_planes = ring_planes
+
+        self.stack_started = False
+        self.hardware_triggered = False
+        self.images_per_plane = None
+        self.planes_acquired = 0
+
+    def start(self):
+        '''Opens the scan session and the camera recording session for the whole volume
+
+        Scan waveforms must be computed before starting
+        '''
+        self.images_per_plane = self.siggen.waveform_cycles
+        self.planes_acquired = 0
+        self.stack_started = True
+        if self.motors is not None:
+            self.motors.pause_poller()
+
+        self.hardware_triggered = self.siggen.stack_trigger_source != ''
+        self.siggen.open_scan_session('stack', self.siggen.stack_trigger_source)
+        self.siggen.create_scanner()
+        self.camera.start_recorder(self.ring_planes * self.images_per_plane, mode='ring buffer')
+        if self.hardware_triggered:
+            # Tasks are started once, each 'stage settled' edge then generates a complete scan
+            self.siggen.start_scanner()
+
+    def move_to(self, position, units:str):
+        '''Moves the motor to a plane position (blocks until the move is completed)
+
+        Returns the position reported by the stage at the end of the move (read again if the move reply was not valid)
+        '''
+        self.motor.move_absolute_position(position, units)
+        if self.hardware_triggered and self.siggen.simulated:
+            # Stands in for the stage controller output wired to the stack trigger source
+            daq.send_trigger(self.siggen.stack_trigger_source)
+        return self.motor.get_position(units, cached=True)
+
+    def trigger_plane(self):
+        '''Starts the scan of the current plane (hardware-triggered scans start on their own)'''
+        if not self.hardware_triggered:
+            self.siggen.create_scanner()
+            self.siggen.start_scanner()
+
+    def wait_plane(self, plane:int):
+        '''Waits until all the images of a plane are recorded'''
+        self.camera.monitor_recorder((plane + 1) * self.images_per_plane)
+        if not self.hardware_triggered:
+            self.siggen.monitor_scanner()
+            self.siggen.stop_scanner()
+        if self.camera.recorder_timeout_status:
+            message = 'plane ' + str(plane + 1) + ' images not recorded'
+            if self.hardware_triggered:
+                message += ' (no edge on stack trigger source ' + self.siggen.stack_trigger_source + '?)'
+            raise RuntimeError(message)
+
+    def copy_plane(self, plane:int):
+        '''Copies the images of a plane out of the camera ring buffer'''
+        images = self.camera.copy_ring_images(plane * self.images_per_plane, self.images_per_plane)
+        if self.camera.ring_overwritten:
+            raise RuntimeError('plane ' + str(plane + 1) + ' images overwritten in the camera ring buffer (recorder image numbers ' + str(self.camera.ring_image_numbers) + ')')
+        self.planes_acquired += 1
+        if self.verbose:
+            print('Stack plane ' + str(plane + 1) + ' acquired')
+        return images
+
+    def finish(self):
+        '''Closes the camera recording session and the scan session'''
+        self.camera.stop_recorder()
+        self.camera.delete_recorder()
+        self.siggen.stop_scanner()
+        self.siggen.close_scan_session()
+        if self.motors is not None:
+            self.motors.resume_poller()
+        self.stack_started = False
+
+    def planes(self, positions, units:str):
+        '''
+        Generator acquiring one plane per position, yields (plane, position, images) with the position reported by the stage
+
+        The next motor move only starts once the caller asks for the next plane.
+        '''
+        self.start()
+        try:
+            for plane, position in enumerate(positions):
+                if not self.stack_started:
+                    break
+                position = self.move_to(position, units)
+                self.trigger_plane()
+                self.wait_plane(plane)
+                yield plane, position, self.copy_plane(plane)
+        finally:
+            self.finish()
+
+    def stop(self):
+        '''Interrupts the stack acquisition after the current plane'''
+        self.stack_started = False
+
+
+class StackPipeline:
+    '''
+    Pipelined stack acquisition
+
+    Stage motion, acquisition, reconstruction and saving each run in their own thread,
+    connected by bounded queues. The move to plane k+1 starts as soon as the images of
+    plane k are recorded, while plane k is still being reconstructed and saved.
+
+    reconstruct(plane, position, images) returns the data handed to save(plane, position, data),
+    position being the one reported by the stage at the end of the plane move
+    '''
+
+    stages = ('motion', 'acquisition', 'reconstruction', 'saving')
+
+    def __init__(self, engine:StackEngine, reconstruct, save, queue_size:int=2):
+        self.engine = engine
+        self.reconstruct = reconstruct
+        self.save = save
+        self.queue_size = queue_size
+
+        self.pipeline_started = False
+        self.errors = []
+        self.timings = {stage: [] for stage in self.stages}
+
+    def run(self, positions, units:str):
+        '''Acquires, reconstructs and saves one plane per position, returns once every stage is done'''
+        self.pipeline_started = True
+        self.errors = []
+        self.timings = {stage: [] for stage in self.stages}
+
+        # Motion waits for the previous plane to be recorded before moving the stage
+        self._plane_recorded = threading.Event()
+        self._plane_recorded.set()
+        self._acquisition_queue = queue.Queue(1)
+        self._reconstruction_queue = queue.Queue(self.queue_size)
+        self._saving_queue = queue.Queue(self.queue_size)
+
+        self.engine.start()
+        workers = [ threading.Thread(target = self._motion_worker, args = (positions, units)),
+                    threading.Thread(target = self._acquisition_worker),
+                    threading.Thread(target = self._reconstruction_worker),
+                    threading.Thread(target = self._saving_worker) ]
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            self.engine.finish()
+            self.pipeline_started = False
+        return self.stage_timings()
+
+    def stop(self):
+        '''Interrupts the pipeline, planes already acquired are still reconstructed and saved'''
+        self.pipeline_started = False
+        self.engine.stop()
+
+    def stage_timings(self):
+        '''Returns per-stage timings (in seconds) and the bottleneck stage'''
+        report = {}
+        for stage, durations in self.timings.items():
+            count = len(durations)
+            report[stage] = {   'planes':   count,
+                                'total':    sum(durations),
+                                'mean':     sum(durations) / count if count else 0.0,
+                                'max':      max(durations) if count else 0.0 }
+        report['bottleneck'] = max(self.stages, key = lambda stage: report[stage]['mean'])
+        return report
+
+    def _fail(self, stage:str, error:Exception):
+        self.errors.append((stage, error))
+        self.stop()
+        print('StackPipeline - ' + stage + ' error: ' + str(error))
+
+    def _run_stage(self, stage:str, input_queue:queue.Queue, process, output_queue:queue.Queue=None):
+        '''Processes items until the end of stack (None), keeps draining its input after a failure'''
+        failed = False
+        while True:
+            item = input_queue.get()
+            if item is None:
+                break
+            if failed:
+                # Upstream stages must never block on a full queue
+                continue
+            try:
+                start = time.perf_counter()
+                result = process(*item)
+                self.timings[stage].append(time.perf_counter() - start)
+                if output_queue is not None:
+                    output_queue.put(result)
+            except Exception as error:
+                failed = True
+                self._fail(stage, error)
+        if output_queue is not None:
+            output_queue.put(None)
+
+    def _motion_worker(self, positions, units:str):
+        try:
+            for plane, position in enumerate(positions):
+                # Sample must not move before the current plane is recorded
+                while not self._plane_recorded.wait(0.1):
+                    if not self.pipeline_started:
+                        break
+                if not self.pipeline_started:
+                    break
+                self._plane_recorded.clear()
+                start = time.perf_counter()
+                position = self.engine.move_to(position, units)
+                self.timings['motion'].append(time.perf_counter() - start)
+                self._acquisition_queue.put((plane, position))
+        except Exception as error:
+            self._fail('motion', error)
+        finally:
+            self._acquisition_queue.put(None)
+
+    def _acquire(self, plane:int, position):
+        self.engine.trigger_plane()
+        self.engine.wait_plane(plane)
+        # Next move can start, images are safe in the camera ring buffer
+        self._plane_recorded.set()
+        return plane, position, self.engine.copy_plane(plane)
+
+    def _reconstruct(self, plane:int, position, images):
+        return plane, position, self.reconstruct(plane, position, images)
+
+    def _acquisition_worker(self):
+        self._run_stage('acquisition', self._acquisition_queue, self._acquire, self._reconstruction_queue)
+
+    def _reconstruction_worker(self):
+        self._run_stage('reconstruction', self._reconstruction_queue, self._reconstruct, self._saving_queue)
+
+    def _saving_worker(self):
+        self._run_stage('saving', self._saving_queue, self.save)
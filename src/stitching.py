@@ -0,0 +1,208 @@
+'''
+Created on October 17, 2026
+'''
+
+import threading
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=16)
+def linear_blend_weights(tile_count:int, xsize:int, overlap:int, dtype=np.float64):
+    """
+    Precomputed weight masks for linear blend stitching of ETL tiles
+
+    Tiles are tile_width = xsize//tile_count wide, and neighbouring tiles are blended over
+    2*overlap columns centered on their common edge. Returns:
+        solo        List of (tile, first_column, last_column) regions taken from a single tile
+        blends      List of (tile, first_column, last_column) regions blended with the previous tile
+        ramp_in     Weights of the tile over a blend region
+        ramp_out    Weights of the previous tile over a blend region
+    """
+    tile_width = int(xsize/tile_count)
+    weight_step = 1/(2*overlap) if overlap > 0 else 0.0
+    column = np.arange(2*overlap)
+    ramp_in = (column * weight_step).astype(dtype)
+    ramp_out = (1 - column * weight_step).astype(dtype)
+    ramp_in.flags.writeable = False
+    ramp_out.flags.writeable = False
+
+    solo = []
+    blends = []
+    for tile in range(tile_count):
+        first_column = 0 if tile == 0 else tile * tile_width + overlap
+        last_column = xsize if tile == tile_count-1 else (tile+1) * tile_width - overlap
+        solo.append((tile, first_column, last_column))
+        if tile != 0:
+            blends.append((tile, tile * tile_width - overlap, tile * tile_width + overlap))
+    return tuple(solo), tuple(blends), ramp_in, ramp_out
+
+
+def stitch_tiles(images, out:np.ndarray):
+    '''
+    Stitches images (one per ETL step) side by side without overlap into the out frame
+
+    Only the column band of each tile is copied, images can be a sequence of 2D frames
+    '''
+    tile_count = len(images)
+    image_xsize = images[0].shape[1]
+    tile_width = int(image_xsize/tile_count)
+    for tile in range(tile_count):
+        first_column = tile * tile_width
+        # Last tile also covers the remaining columns
+        last_column = image_xsize if tile == tile_count-1 else first_column + tile_width
+        out[:, first_column:last_column] = images[tile][:, first_column:last_column]
+    return out
+
+
+def crop_tiles(images, overlap_ratio:float, out:np.ndarray):
+    '''
+    Crops the column band of each image (one per ETL step) with overlap on both sides into out
+
+    out has shape (tile_count, ysize, tile_width + 2*overlap), columns outside the image are zeroed
+    '''
+    tile_count = len(images)
+    image_xsize = images[0].shape[1]
+    tile_width = int(image_xsize/tile_count)
+    overlap = int(tile_width*overlap_ratio)
+    for tile in range(tile_count):
+        first_column = tile * tile_width - overlap
+        if tile == 0:  #For the first column step
+            out[tile,:,:overlap] = 0
+            out[tile,:,overlap:] = images[tile][:,0:tile_width + overlap]
+        elif tile == tile_count-1:  #For the last column step (may be different than the others...)
+            last_column_step = min(image_xsize - first_column, out.shape[2])
+            out[tile,:,0:last_column_step] = images[tile][:,first_column:first_column + last_column_step]
+            out[tile,:,last_column_step:] = 0
+        else:
+            out[tile,:,:] = images[tile][:,first_column:first_column + tile_width + 2*overlap]
+    return out
+
+
+class FrameRing:
+    '''
+    Ring of reusable output frames, with explicit acquire and release
+
+    next() hands out a frame held by the caller. Consumers keeping a frame (display and save
+    queues, writers) acquire it, and every holder releases it once done with it: a frame is only
+    handed out again once all its holds are released, so frames still waiting to be displayed or
+    saved are never overwritten. Frames which are not released are not reused, once max_frames
+    are held new frames are allocated without being kept in the ring.
+
+    acquire and release accept any array, arrays which are not ring frames (or views of ring
+    frames) are ignored.
+    '''
+
+    def __init__(self, dtype=np.uint16, max_frames:int=32):
+        self.dtype = dtype
+        self.max_frames = max_frames
+        self.shape = None
+        self.frames = []
+        self.holds = []
+        self.lock = threading.Lock()
+
+    def next(self, shape):
+        '''Returns a frame of the given shape, held by the caller until it is released'''
+        shape = tuple(shape)
+        with self.lock:
+            if shape != self.shape:
+                self.shape = shape
+                self.frames = []
+                self.holds = []
+
+            for index, holds in enumerate(self.holds):
+                if holds == 0:
+                    self.holds[index] = 1
+                    return self.frames[index]
+
+            frame = np.zeros(shape, self.dtype)
+            if len(self.frames) < self.max_frames:
+                self.frames.append(frame)
+                self.holds.append(1)
+            return frame
+
+    def _index(self, frame):
+        '''Index of a ring frame (or of the ring frame a view is taken from), None for other arrays'''
+        if not isinstance(frame, np.ndarray):
+            return None
+        owner = frame if frame.base is None else frame.base
+        for index, ring_frame in enumerate(self.frames):
+            if ring_frame is owner:
+                return index
+        return None
+
+    def acquire(self, frame):
+        '''Adds a hold on a frame, it will not be handed out before a matching release'''
+        with self.lock:
+            index = self._index(frame)
+            if index is not None:
+                self.holds[index] += 1
+
+    def release(self, frame):
+        '''Releases a hold on a frame, the frame is reused once all its holds are released'''
+        with self.lock:
+            index = self._index(frame)
+            if index is not None:
+                self.holds[index] = max(self.holds[index] - 1, 0)
+
+    def in_use(self):
+        '''Number of ring frames currently held'''
+        with self.lock:
+            return sum(holds > 0 for holds in self.holds)
+
+
+class LinearBlendStitcher:
+    '''
+    Stitches ETL tiles into a single frame using linear blend over the tiles overlap
+
+    Columns seen by a single tile are copied straight into the output frame, blend regions
+    are computed as a broadcast multiply-accumulate of the cached weight masks. Output is
+    identical to the column by column blend with float64 accumulation, float32 accumulation
+    is faster but may differ by one count on some pixels.
+    '''
+
+    def __init__(self, overlap_ratio:float=0.2, accumulation=np.float64):
+        self.overlap_ratio = overlap_ratio
+        self.accumulation = np.dtype(accumulation)
+        self._scratch = {}
+
+    def overlap(self, tile_count:int, xsize:int):
+        '''Number of overlapping columns on each side of a tile edge'''
+        return int(int(xsize/tile_count) * self.overlap_ratio)
+
+    def stitch(self, images, out:np.ndarray=None):
+        '''
+        Stitches images (3D array or sequence of 2D frames, one per ETL step) into a uint16 frame
+
+        If provided, out is used as the output frame instead of allocating a new one
+        '''
+        tile_count = len(images)
+        image_ysize, image_xsize = images[0].shape
+        if out is None:
+            out = np.empty((image_ysize, image_xsize), np.uint16)
+
+        if tile_count == 1:
+            np.copyto(out, images[0])
+            return out
+
+        overlap = self.overlap(tile_count, image_xsize)
+        solo, blends, ramp_in, ramp_out = linear_blend_weights(tile_count, image_xsize, overlap, self.accumulation)
+
+        for tile, first_column, last_column in solo:
+            out[:, first_column:last_column] = images[tile][:, first_column:last_column]
+
+        if overlap > 0:
+            blend, blend_previous = self._scratch_buffers(image_ysize, 2*overlap)
+            for tile, first_column, last_column in blends:
+                np.multiply(images[tile][:, first_column:last_column], ramp_in, out=blend)
+                np.multiply(images[tile-1][:, first_column:last_column], ramp_out, out=blend_previous)
+                blend += blend_previous
+                np.copyto(out[:, first_column:last_column], blend, casting='unsafe')
+        return out
+
+    def _scratch_buffers(self, rows:int, columns:int):
+        '''Preallocated accumulation buffers for blend regions'''
+        key = (rows, columns)
+        if key not in self._scratch:
+            self._scratch = {key: (np.empty(key, self.accumulation), np.empty(key, self.accumulation))}
+        return self._scratch[key]
@@ -4,12 +4,13 @@ Module for creating waveforms and analog output signals
 Rewrite on April 8th 2022
 """
 
+from functools import lru_cache
 import numpy as np
 
 
-def squarewave(pre_samples:int, active_samples:int, post_samples:int, shift:int, repeat:int, inverted:bool=False):
+def squarewave_period(pre_samples:int, active_samples:int, post_samples:int, shift:int, inverted:bool=False):
     """
-    Camera squarewave function generator for external exposure start or control
+    One period of the camera squarewave (see squarewave)
     """
     pre_vector = np.full(pre_samples, False)
     active_vector = np.full(active_samples, True)
@@ -20,13 +21,21 @@ def squarewave(pre_samples:int, active_samples:int, post_samples:int, shift:int,
         period_vector = np.concatenate((period_vector[-shift:], period_vector[:-shift]))
     if inverted:
         period_vector = ~period_vector
+    return period_vector
+
+
+def squarewave(pre_samples:int, active_samples:int, post_samples:int, shift:int, repeat:int, inverted:bool=False):
+    """
+    Camera squarewave function generator for external exposure start or control
+    """
+    period_vector = squarewave_period(pre_samples, active_samples, post_samples, shift, inverted)
     output_vector = np.tile(period_vector, repeat)
     return output_vector
 
 
-def sawtooth(activated:bool, pre_samples:int, trace_samples:int, retrace_samples:int, post_samples:int, shift:int, repeat:int, amplitude:float, offset:float, inverted:bool, filtered:bool=True):
+def sawtooth_period(activated:bool, pre_samples:int, trace_samples:int, retrace_samples:int, post_samples:int, shift:int, amplitude:float, offset:float, inverted:bool, filtered:bool=True):
     """
-    Galvo sawtooth function generator for one-way scanning
+    One period of the galvo sawtooth (see sawtooth)
     """
     period_samples = pre_samples + trace_samples + retrace_samples + post_samples
     if activated:
@@ -53,11 +62,144 @@ def sawtooth(activated:bool, pre_samples:int, trace_samples:int, retrace_samples
             period_vector = (cusum[win:] - cusum[:-win]) / win
     else:
         period_vector = np.ones((period_samples)) * offset
+    return period_vector
+
+
+def sawtooth(activated:bool, pre_samples:int, trace_samples:int, retrace_samples:int, post_samples:int, shift:int, repeat:int, amplitude:float, offset:float, inverted:bool, filtered:bool=True):
+    """
+    Galvo sawtooth function generator for one-way scanning
+    """
+    period_vector = sawtooth_period(activated, pre_samples, trace_samples, retrace_samples, post_samples, shift, amplitude, offset, inverted, filtered)
     output_vector = np.tile(period_vector, repeat)
     return output_vector
 
 
-def staircase(activated:bool, step_samples:int, nbr_steps:int, shift:int, amplitude:float, offset:float, direction:str='up', filtered:bool=True):
+@lru_cache(maxsize=16)
+def staircase_step_correction(pad:int):
+    """
+    Precomputed FIR correction of a unit step for the staircase filter
+
+    The two centered sliding averages (window 2*pad+1) of the staircase filter are one
+    triangular FIR kernel. Filtering a unit step at sample t gives its cumulated kernel
+    (step response); returns step response - unit step over samples t-2*pad to t+2*pad-1,
+    the only samples the filter changes around a transition.
+    """
+    win = 2*pad + 1
+    kernel = np.convolve(np.ones(win), np.ones(win)) / (win*win)
+    correction = np.cumsum(kernel)[:4*pad]
+    correction[2*pad:] -= 1
+    correction.flags.writeable = False
+    return correction
+
+
+def _sliding_average_twice(vector, pad:int):
+    """
+    Two centered sliding average passes (window 2*pad+1), vector being padded with its first
+    and last pad samples
+    """
+    win = 2*pad + 1
+    for _ in range(2):
+        tmpvec = np.concatenate((vector[:pad], vector, vector[-pad:]))
+        cusum = np.cumsum(np.insert(tmpvec, 0, 0))
+        vector = (cusum[win:] - cusum[:-win]) / win
+    return vector
+
+
+def staircase_levels(activated:bool, nbr_steps:int, amplitude:float, offset:float, direction:str='up'):
+    """
+    Step levels of the ETL staircase (see staircase)
+    """
+    if not activated:
+        return np.full(nbr_steps, float(offset))
+    if nbr_steps == 1:
+        return np.full(1, offset + amplitude/2)
+    step_rise = amplitude/(nbr_steps-1)
+    if direction == 'down':
+        return (offset + amplitude) - np.arange(nbr_steps) * step_rise
+    return offset + np.arange(nbr_steps) * step_rise
+
+
+def _fill_range(out, first_sample:int, start:int, stop:int, value):
+    """Sets samples start to stop (staircase indices) of out, holding samples from first_sample on"""
+    start = max(start, first_sample)
+    stop = min(stop, first_sample + out.size)
+    if start < stop:
+        out[start - first_sample:stop - first_sample] = value
+
+
+def staircase_samples(levels, step_samples:int, shift:int, filtered:bool=True, first_sample:int=0, samples:int=None, out=None):
+    """
+    Samples of a staircase of step levels, from first_sample to first_sample + samples
+
+    levels              Step levels (see staircase_levels)
+    step_samples        Number of samples per step
+    shift               Circular shift of the complete sequence (in samples)
+    filtered            Smooth step transitions with two centered sliding averages (window step_samples//25*2 + 1)
+    out                 Optional float64 output buffer of samples samples (reused instead of allocated)
+
+    Any range of the sequence can be generated on its own, e.g. one step period at a time
+    for chunked writes. Step levels are written directly at their (shifted) positions, and the
+    sliding average filter is applied as a precomputed FIR correction over the samples around
+    each step transition only (see staircase_step_correction).
+    """
+    nbr_steps = len(levels)
+    total_samples = step_samples * nbr_steps
+    if samples is None:
+        samples = total_samples - first_sample
+    if out is None:
+        out = np.empty(samples)
+    elif out.shape != (samples,):
+        raise ValueError('Output buffer has ' + str(out.shape) + ' samples, expected ' + str(samples))
+
+    # A constant staircase (ETL deactivated or single step) is not filtered
+    if np.all(levels == levels[0]):
+        out.fill(levels[0])
+        return out
+
+    # Step k starts at sample k * step_samples + shift (circular shift of the whole sequence)
+    shift = shift % total_samples
+    starts = (np.arange(nbr_steps) * step_samples + shift) % total_samples
+    for start, level in zip(starts, levels):
+        end = start + step_samples
+        _fill_range(out, first_sample, start, min(end, total_samples), level)
+        if end > total_samples:
+            _fill_range(out, first_sample, 0, end - total_samples, level)
+
+    pad = step_samples//25
+    if filtered and pad > 0:
+        # Filter edges are padded with the first and last samples (not the step levels), they are filtered as a whole
+        edge = 4*pad
+        last_sample = first_sample + samples
+        if first_sample < 2*pad:
+            head_levels = levels[((np.arange(edge) - shift) % total_samples) // step_samples]
+            head = _sliding_average_twice(head_levels, pad)[:2*pad]
+        if last_sample > total_samples - 2*pad:
+            tail_levels = levels[((np.arange(total_samples - edge, total_samples) - shift) % total_samples) // step_samples]
+            tail = _sliding_average_twice(tail_levels, pad)[2*pad:]
+
+        correction = staircase_step_correction(pad)
+        # Transitions: between steps k-1 and k, and from the last to the first step where the sequence wraps around
+        if shift == 0:
+            transitions = zip(starts[1:], levels[1:] - levels[:-1])
+        else:
+            transitions = zip(starts, levels - np.roll(levels, 1))
+        for transition, rise in transitions:
+            first = max(transition - 2*pad, first_sample, 0)
+            last = min(transition + 2*pad, last_sample, total_samples)
+            if first < last:
+                kernel_first = first - (transition - 2*pad)
+                out[first - first_sample:last - first_sample] += rise * correction[kernel_first:kernel_first + last - first]
+
+        if first_sample < 2*pad:
+            head_last = min(2*pad, last_sample)
+            _fill_range(out, first_sample, first_sample, head_last, head[first_sample:head_last])
+        if last_sample > total_samples - 2*pad:
+            tail_first = max(first_sample, total_samples - 2*pad)
+            _fill_range(out, first_sample, tail_first, last_sample, tail[tail_first - (total_samples - 2*pad):last_sample - (total_samples - 2*pad)])
+    return out
+
+
+def staircase(activated:bool, step_samples:int, nbr_steps:int, shift:int, amplitude:float, offset:float, direction:str='up', filtered:bool=True, out=None):
     """
     Staircase function generator for ETL
 
@@ -66,41 +208,9 @@ def staircase(activated:bool, step_samples:int, nbr_steps:int, shift:int, amplit
     amplitude           Height of the staircase (above floor level) -> Signal maximum amplitude = floor + rise
     offset              Floor level of the staircase
     direction           Either 'up' (ascending) or down (descending)
+    out                 Optional float64 output buffer of step_samples * nbr_steps samples (reused instead of allocated)
 
     Special case : For a staircase consisting of a single step, level is equal to (floor + 0.5 * rise)
     """
-    total_samples = step_samples * nbr_steps
-    if activated:
-        if nbr_steps != 1:
-            step_run = step_samples
-            step_rise = amplitude/(nbr_steps-1)
-            if direction == 'down':
-                output_vector = np.ones(total_samples) * (offset + amplitude)
-                for step in range(nbr_steps):
-                    step_level = (offset + amplitude) - step * step_rise * np.ones(step_run)
-                    output_vector[step*step_run:(step+1)*step_run] = step_level
-            else:
-                output_vector = np.ones(total_samples) * offset
-                for step in range(nbr_steps):
-                    step_level = offset + step * step_rise * np.ones(step_run)
-                    output_vector[step*step_run:(step+1)*step_run] = step_level
-            if shift!=0:
-                output_vector = np.concatenate((output_vector[-shift:], output_vector[:-shift]))
-            if filtered:
-                # Filtering using sliding average
-                # Compute padding and window width
-                pad = step_run//25
-                win = 2*(step_run//25) + 1
-                # First pass (centered)
-                tmpvec = np.concatenate((output_vector[:pad], output_vector, output_vector[-pad:]))
-                cusum = np.cumsum(np.insert(tmpvec, 0, 0))
-                output_vector = (cusum[win:] - cusum[:-win]) / win
-                # Second pass (centered)
-                tmpvec = np.concatenate((output_vector[:pad], output_vector, output_vector[-pad:]))
-                cusum = np.cumsum(np.insert(tmpvec, 0, 0))
-                output_vector = (cusum[win:] - cusum[:-win]) / win
-        else:
-            output_vector = np.ones(total_samples) * (offset + amplitude/2)
-    else:
-        output_vector = np.ones((total_samples)) * offset
-    return output_vector
+    levels = staircase_levels(activated, nbr_steps, amplitude, offset, direction)
+    return staircase_samples(levels, step_samples, shift, filtered, out=out)
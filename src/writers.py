@@ -0,0 +1,517 @@
+'''
+Created on October 17, 2026
+'''
+
+import os
+import csv
+import json
+import time
+import zlib
+import queue
+import threading
+import numpy as np
+import h5py
+import tifffile
+
+try:
+    # Registers bitshuffle (and other) HDF5 filters when installed
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+
+def hdf5_compression(codec:str='none', level:int=4):
+    '''
+    Returns the h5py filter keywords for a compression codec
+
+    codec is one of 'none', 'gzip' (with level 0-9), 'lzf' or 'bitshuffle' (needs hdf5plugin,
+    falls back to lzf). gzip and lzf are preceded by the byte shuffle filter, which groups the
+    high and low bytes of uint16 pixels and compresses dark background much better.
+    '''
+    codec = str.lower(codec)
+    if codec == 'bitshuffle':
+        if hdf5plugin is not None:
+            return dict(hdf5plugin.Bitshuffle())
+        print('HDF5VolumeWriter - bitshuffle filter not available, using lzf')
+        codec = 'lzf'
+    if codec == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': int(level), 'shuffle': True}
+    elif codec == 'lzf':
+        return {'compression': 'lzf', 'shuffle': True}
+    else: # no compression
+        return {}
+
+
+def deflate_chunk(chunk:np.ndarray, level:int=4):
+    '''Compresses a chunk the way the HDF5 shuffle and gzip filters do (releases the GIL)'''
+    chunk = np.ascontiguousarray(chunk)
+    # Byte shuffle: all first bytes of the pixels, then all second bytes...
+    shuffled = np.ascontiguousarray(chunk.view(np.uint8).reshape(-1, chunk.itemsize).T)
+    return zlib.compress(shuffled, level)
+
+
+def block_mean(image:np.ndarray, factor:int):
+    '''Block-mean downsampling of the last two axes of an image (float32, incomplete blocks are dropped)'''
+    ysize = image.shape[-2] // factor
+    xsize = image.shape[-1] // factor
+    blocks = image[..., :ysize*factor, :xsize*factor].reshape(image.shape[:-2] + (ysize, factor, xsize, factor))
+    return blocks.mean(axis=(-3, -1), dtype=np.float32)
+
+
+def pyramid_levels(image:np.ndarray, factors):
+    '''
+    Returns the block-mean downsampled levels of an image for increasing factors (e.g. 2, 4, 8)
+
+    Each level is reduced from the previous one when possible, levels have the dtype of the image
+    '''
+    levels = []
+    previous_level = image
+    previous_factor = 1
+    for factor in sorted(factors):
+        if factor % previous_factor == 0:
+            level = block_mean(previous_level, factor // previous_factor)
+        else:
+            level = block_mean(image, factor)
+        levels.append(level)
+        previous_level = level
+        previous_factor = factor
+    return [np.rint(level).astype(image.dtype) for level in levels]
+
+
+class VolumeWriter:
+    '''
+    Base class of the volume writers used by FrameSaver
+
+    A volume holds number_of_planes planes (2D frames or 3D ETL images) written in increasing
+    plane order with write_plane, and is finalized with close. prepare_plane may be called from
+    worker threads before write_plane, to compress a plane and compute its pyramid levels
+    (block-mean downsampled by each factor of pyramid, for quick overviews of large volumes).
+    '''
+
+    def __init__(self, filename:str, number_of_planes:int, dataset_name:str='stack', attributes:dict=None,
+                 compression:str='none', compression_level:int=4, pyramid:tuple=()):
+        self.filename = filename
+        self.number_of_planes = int(number_of_planes)
+        self.dataset_name = dataset_name
+        self.attributes = {} if attributes is None else attributes
+        self.compression = str.lower(compression)
+        self.compression_level = int(compression_level)
+        self.pyramid = tuple(sorted(int(factor) for factor in pyramid if int(factor) > 1))
+        self.planes_written = 0
+
+        # Write statistics, full resolution and pyramid levels are counted separately
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.pyramid_raw_bytes = 0
+        self.pyramid_stored_bytes = 0
+        self.write_time = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    def prepare_plane(self, data:np.ndarray, plane:int=None):
+        '''Prepares a plane ahead of write_plane (None if everything is done on write)'''
+        return None
+
+    def write_plane(self, plane:int, data:np.ndarray, coordinates:dict=None, prepared=None):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def statistics(self):
+        '''Returns the codec, raw and stored sizes (bytes), compression ratio and write throughput (MB/s)
+
+        Sizes, ratio and throughput are those of the full resolution volume, the raw and stored sizes of
+        the pyramid levels are reported separately. Throughput is measured from the first plane prepared
+        or written until the file is closed
+        '''
+        elapsed = self.end_time - self.start_time if (self.start_time is not None and self.end_time is not None) else 0.0
+        return {'codec':        self.compression if self.compression != 'gzip' else 'gzip ' + str(self.compression_level),
+                'raw':          self.raw_bytes,
+                'stored':       self.stored_bytes,
+                'ratio':        self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0,
+                'throughput':   self.raw_bytes / elapsed / 1e6 if elapsed else 0.0,
+                'pyramid raw':      self.pyramid_raw_bytes,
+                'pyramid stored':   self.pyramid_stored_bytes }
+
+
+class HDF5VolumeWriter(VolumeWriter):
+    '''
+    Writes a stack of frames (or ETL images) into a single chunked HDF5 dataset
+
+    The dataset has shape (number_of_planes,) + frame shape, it is created with the first
+    plane and each plane is then written as a hyperslab (one chunk per 2D image). Per-plane
+    coordinates (motor positions) are stored as 1D datasets along the plane axis. If fewer
+    planes are written than expected (interrupted stack), datasets are trimmed on close.
+
+    Image chunks are compressed with the selected codec (see hdf5_compression), the write
+    throughput and compression ratio are measured for each file (see statistics).
+
+    prepare_plane computes the pyramid levels, stored next to the full resolution dataset as
+    dataset_name + '_2x' (...), and compresses gzip chunks. It is thread-safe and can run in
+    parallel for several planes. Other codecs are applied by HDF5 on write.
+    '''
+
+    def __init__(self, filename:str, number_of_planes:int, dataset_name:str='stack', attributes:dict=None,
+                 compression:str='none', compression_level:int=4, pyramid:tuple=()):
+        VolumeWriter.__init__(self, filename, number_of_planes, dataset_name, attributes, compression, compression_level, pyramid)
+        if self.compression == 'bitshuffle' and hdf5plugin is None:
+            print('HDF5VolumeWriter - bitshuffle filter not available, using lzf')
+            self.compression = 'lzf'
+
+        self.file = h5py.File(self.filename, 'a')
+        self.dataset = None
+        self.datasets = []
+        self.coordinates = {}
+
+    def create_dataset(self, name:str, frame_shape, dtype):
+        '''Creates a volume dataset for frames of a given shape'''
+        frame_shape = tuple(frame_shape)
+        shape = (self.number_of_planes,) + frame_shape
+        # One chunk per 2D image, planes are appended as whole chunks
+        chunks = (1,) * (len(shape) - 2) + frame_shape[-2:]
+        dataset = self.file.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks,
+                                           maxshape=(None,) + frame_shape,
+                                           **hdf5_compression(self.compression, self.compression_level))
+        for attribute, value in self.attributes.items():
+            dataset.attrs[attribute] = value
+        self.datasets.append(dataset)
+        return dataset
+
+    def create_coordinate(self, name:str, units:str):
+        '''Creates a 1D coordinate dataset along the plane axis'''
+        coordinate = self.file.create_dataset(name, shape=(self.number_of_planes,), dtype=np.float64,
+                                              maxshape=(None,), fillvalue=np.nan)
+        coordinate.attrs['Units'] = units
+        self.coordinates[name] = coordinate
+        return coordinate
+
+    def prepare_plane(self, data:np.ndarray, plane:int=None):
+        '''
+        Computes the pyramid levels of a plane and compresses its chunks (gzip only)
+
+        Returns {'levels': downsampled planes, 'chunks': (image index, compressed bytes) lists for each
+        resolution, or None if the codec can only be applied by HDF5 when the plane is written}
+        '''
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        levels = pyramid_levels(data, self.pyramid)
+        chunks = None
+        if self.compression == 'gzip':
+            chunks = [[(index, deflate_chunk(image[index], self.compression_level)) for index in np.ndindex(image.shape[:-2])]
+                      for image in [data] + levels]
+        return {'levels': levels, 'chunks': chunks}
+
+    def write_plane(self, plane:int, data:np.ndarray, coordinates:dict=None, prepared:dict=None):
+        '''
+        Writes a plane (2D frame or 3D ETL images) at a given index of the volume
+
+        coordinates is a dictionary of {name: (value, units)} for this plane
+        prepared is the plane returned by prepare_plane (prepared on write if None)
+        '''
+        if prepared is None:
+            prepared = self.prepare_plane(data, plane)
+        images = [data] + prepared['levels']
+        if self.dataset is None:
+            self.dataset = self.create_dataset(self.dataset_name, data.shape, data.dtype)
+            for factor, level in zip(self.pyramid, prepared['levels']):
+                self.create_dataset(self.dataset_name + '_' + str(factor) + 'x', level.shape, level.dtype).attrs['Downsampling'] = factor
+
+        start = time.perf_counter()
+        for resolution, (dataset, image) in enumerate(zip(self.datasets, images)):
+            if prepared['chunks'] is None:
+                dataset.write_direct(np.ascontiguousarray(image), dest_sel=np.s_[plane])
+            else:
+                for index, chunk in prepared['chunks'][resolution]:
+                    dataset.id.write_direct_chunk((plane,) + index + (0, 0), chunk)
+        self.write_time += time.perf_counter() - start
+        self.raw_bytes += data.nbytes
+        self.pyramid_raw_bytes += sum(level.nbytes for level in prepared['levels'])
+
+        if coordinates is not None:
+            for name, (value, units) in coordinates.items():
+                coordinate = self.coordinates.get(name)
+                if coordinate is None:
+                    coordinate = self.create_coordinate(name, units)
+                coordinate[plane] = value
+
+        self.planes_written = max(self.planes_written, plane + 1)
+
+    def close(self):
+        '''Trims datasets to the planes written and closes the file'''
+        if self.planes_written < self.number_of_planes:
+            for dataset in self.datasets + list(self.coordinates.values()):
+                dataset.resize(self.planes_written, axis=0)
+        if self.datasets:
+            self.stored_bytes = self.datasets[0].id.get_storage_size()
+            self.pyramid_stored_bytes = sum(dataset.id.get_storage_size() for dataset in self.datasets[1:])
+        self.file.close()
+        self.end_time = time.perf_counter()
+
+
+class TiffVolumeWriter(VolumeWriter):
+    '''
+    Streams a stack of frames (or ETL images) into an OME-TIFF file (BigTIFF)
+
+    The volume is a single OME series of shape (number_of_planes,) + frame shape (axes ZYX,
+    or ZCYX with ETL images along C). Pages are appended with contiguous writes as planes
+    arrive, by a thread feeding tifffile with a page generator. Missing planes (dropped or
+    interrupted stack) are written as empty frames so that the series keeps its shape.
+    Per-plane coordinates are saved in a CSV file next to the TIFF file.
+
+    TIFF pages are written uncompressed, so that they stay contiguous on disk. Pyramid levels are
+    not written (OME-TIFF pyramids are stored as SubIFDs of each page, which the streamed series
+    can't hold), TIFF volumes are full resolution only.
+    '''
+
+    def __init__(self, filename:str, number_of_planes:int, dataset_name:str='stack', attributes:dict=None,
+                 compression:str='none', compression_level:int=4, pyramid:tuple=()):
+        VolumeWriter.__init__(self, filename, number_of_planes, dataset_name, attributes, 'none', compression_level)
+        self.tiff = tifffile.TiffWriter(self.filename, bigtiff=True, ome=True)
+        self.coordinates = {}
+        self.frame_shape = None
+        self.dtype = None
+        self.error = False
+        self.pages_done = False
+
+        # Planes waiting to be written by the tiff thread
+        self.queue = queue.Queue(2)
+        self.tiff_thread = None
+
+    def start_writing(self, frame_shape, dtype):
+        '''Starts the thread writing the OME series for frames of a given shape'''
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = dtype
+        self.tiff_thread = threading.Thread(target = self.tiff_worker)
+        self.tiff_thread.start()
+
+    def pages(self):
+        '''Generator of 2D pages, in plane order (pages of missing planes are empty)'''
+        empty_page = np.zeros(self.frame_shape[-2:], self.dtype)
+        pages_per_plane = int(np.prod(self.frame_shape[:-2]))
+        plane = 0
+        while plane < self.number_of_planes:
+            item = self.queue.get()
+            if item is None:
+                break
+            next_plane, data = item
+            for _ in range((next_plane - plane) * pages_per_plane):
+                yield empty_page
+            for page in data.reshape((-1,) + self.frame_shape[-2:]):
+                yield page
+            plane = next_plane + 1
+        self.pages_done = True
+        for _ in range((self.number_of_planes - plane) * pages_per_plane):
+            yield empty_page
+
+    def tiff_worker(self):
+        metadata = {'axes':         'ZCYX' if len(self.frame_shape) == 3 else 'ZYX',
+                    'Name':         self.dataset_name,
+                    'Description':  ', '.join(str(name) + ': ' + str(value) for name, value in self.attributes.items()) }
+        try:
+            self.tiff.write(self.pages(), shape=(self.number_of_planes,) + self.frame_shape, dtype=self.dtype,
+                            photometric='minisblack', metadata=metadata)
+        except:
+            self.error = True
+            print('TiffVolumeWriter - write error')
+            # Keep draining planes so that write_plane never blocks
+            while not self.pages_done and self.queue.get() is not None:
+                pass
+
+    def write_plane(self, plane:int, data:np.ndarray, coordinates:dict=None, prepared=None):
+        '''
+        Appends a plane (2D frame or 3D ETL images) to the volume, planes must be written in order
+
+        The plane is copied, the caller can reuse data once write_plane returns
+        coordinates is a dictionary of {name: (value, units)} for this plane
+        '''
+        start = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = start
+        if self.tiff_thread is None:
+            self.start_writing(data.shape, data.dtype)
+        # Pages are written later by the tiff thread, the caller may reuse data as soon as this returns
+        self.queue.put((plane, np.array(data, copy=True)))
+        self.write_time += time.perf_counter() - start
+        self.raw_bytes += data.nbytes
+
+        if coordinates is not None:
+            for name, (value, units) in coordinates.items():
+                self.coordinates.setdefault((name, units), {})[plane] = value
+
+        self.planes_written = max(self.planes_written, plane + 1)
+
+    def close(self):
+        '''Completes the OME series, saves the coordinates and closes the file'''
+        if self.tiff_thread is not None:
+            self.queue.put(None)
+            self.tiff_thread.join()
+        self.tiff.close()
+        self.stored_bytes = os.path.getsize(self.filename)
+
+        if self.coordinates:
+            with open(self.coordinates_filename(), 'w', newline='') as coordinates_file:
+                coordinates_writer = csv.writer(coordinates_file)
+                coordinates_writer.writerow(['Plane'] + [name + ' (' + units + ')' for name, units in self.coordinates])
+                for plane in range(self.planes_written):
+                    coordinates_writer.writerow([plane] + [values.get(plane, '') for values in self.coordinates.values()])
+        self.end_time = time.perf_counter()
+
+    def coordinates_filename(self):
+        '''CSV file of the per-plane coordinates'''
+        return self.filename.replace('.ome.tif', '') + '_positions.csv'
+
+
+class ZarrVolumeWriter(VolumeWriter):
+    '''
+    Writes a stack of frames (or ETL images) into a Zarr v2 directory store with OME-NGFF metadata
+
+    The store is a group holding the full resolution level '0' of shape (number_of_planes,) + frame
+    shape, with ETL images along the first (channel) axis: axes zyx, or czyx, followed by one level
+    for each pyramid factor (downsampled in y and x). Each 2D image is a chunk saved in its own file,
+    so chunks of different planes can be computed and written by several threads (prepare_plane)
+    and the volume can be opened while it is being acquired.
+    gzip chunks are stored with the zarr shuffle filter and zlib compressor, other codecs are not
+    available without numcodecs and fall back to gzip. Coordinates are saved in the group attributes.
+    '''
+
+    def __init__(self, filename:str, number_of_planes:int, dataset_name:str='stack', attributes:dict=None,
+                 compression:str='none', compression_level:int=4, pyramid:tuple=()):
+        VolumeWriter.__init__(self, filename, number_of_planes, dataset_name, attributes, compression, compression_level, pyramid)
+        if self.compression not in ('none', 'gzip'):
+            print('ZarrVolumeWriter - ' + self.compression + ' not available, using gzip')
+            self.compression = 'gzip'
+
+        os.makedirs(self.filename, exist_ok=True)
+        self.write_json('.zgroup', {'zarr_format': 2})
+        self.frame_shape = None
+        self.dtype = None
+        self.coordinates = {}
+        self.lock = threading.Lock()
+
+    def write_json(self, key:str, content:dict):
+        '''Writes a metadata file of the store'''
+        path = os.path.join(self.filename, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as json_file:
+            json.dump(content, json_file, indent=4)
+
+    def write_chunk(self, key:str, chunk:bytes, raw_bytes:int=0):
+        '''Writes a chunk file of raw_bytes image bytes, readers never see partially written chunks'''
+        path = os.path.join(self.filename, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.partial', 'wb') as chunk_file:
+            chunk_file.write(chunk)
+        os.replace(path + '.partial', path)
+        with self.lock:
+            # Keys start with the resolution level, '0' is the full resolution
+            if key.startswith('0/'):
+                self.stored_bytes += len(chunk)
+            else:
+                self.pyramid_raw_bytes += raw_bytes
+                self.pyramid_stored_bytes += len(chunk)
+
+    def array_shape(self, planes:int, factor:int=1):
+        '''Shape of the zarr array (ETL images first) of a resolution level for a number of planes'''
+        return self.frame_shape[:-2] + (planes, self.frame_shape[-2] // factor, self.frame_shape[-1] // factor)
+
+    def create_array(self, frame_shape, dtype):
+        '''Writes the array and OME-NGFF metadata for frames of a given shape'''
+        with self.lock:
+            if self.frame_shape is not None:
+                return
+            self.frame_shape = tuple(frame_shape)
+            self.dtype = np.dtype(dtype)
+            self.write_array_metadata(self.number_of_planes)
+
+            axes = [{'name': 'z', 'type': 'space'}, {'name': 'y', 'type': 'space'}, {'name': 'x', 'type': 'space'}]
+            if len(self.frame_shape) == 3:
+                axes.insert(0, {'name': 'c', 'type': 'channel'})
+            datasets = []
+            for level, factor in enumerate((1,) + self.pyramid):
+                scale = [1.0] * (len(axes) - 2) + [float(factor), float(factor)]
+                datasets.append({'path': str(level), 'coordinateTransformations': [{'type': 'scale', 'scale': scale}]})
+            multiscales = [{'version':  '0.4',
+                            'name':     self.dataset_name,
+                            'axes':     axes,
+                            'datasets': datasets }]
+            self.write_json('.zattrs', dict(self.attributes, multiscales=multiscales))
+
+    def write_array_metadata(self, planes:int):
+        compressor = None
+        filters = None
+        if self.compression == 'gzip':
+            compressor = {'id': 'zlib', 'level': self.compression_level}
+            filters = [{'id': 'shuffle', 'elementsize': self.dtype.itemsize}]
+        for level, factor in enumerate((1,) + self.pyramid):
+            shape = self.array_shape(planes, factor)
+            self.write_json(str(level) + '/.zarray', {  'zarr_format':          2,
+                                                        'shape':                list(shape),
+                                                        'chunks':               [1] * (len(shape) - 2) + list(shape[-2:]),
+                                                        'dtype':                self.dtype.str,
+                                                        'compressor':           compressor,
+                                                        'fill_value':           0,
+                                                        'order':                'C',
+                                                        'filters':              filters,
+                                                        'dimension_separator':  '/' })
+
+    def encode_chunk(self, image:np.ndarray):
+        if self.compression == 'gzip':
+            return deflate_chunk(image, self.compression_level)
+        return np.ascontiguousarray(image).tobytes()
+
+    def prepare_plane(self, data:np.ndarray, plane:int=None):
+        '''
+        Computes the pyramid levels of a plane, encodes and writes all its chunks (thread-safe)
+
+        Returns the keys of the chunks written, or None if the plane index is unknown (the plane
+        is then written by write_plane)
+        '''
+        if plane is None:
+            return None
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        if self.frame_shape is None:
+            self.create_array(data.shape, data.dtype)
+        keys = []
+        for level, image in enumerate([data] + pyramid_levels(data, self.pyramid)):
+            for index in np.ndindex(image.shape[:-2]):
+                key = '/'.join(str(position) for position in (level,) + index + (plane, 0, 0))
+                self.write_chunk(key, self.encode_chunk(image[index]), image[index].nbytes)
+                keys.append(key)
+        return keys
+
+    def write_plane(self, plane:int, data:np.ndarray, coordinates:dict=None, prepared:list=None):
+        '''
+        Writes a plane (2D frame or 3D ETL images) at a given index of the volume
+
+        coordinates is a dictionary of {name: (value, units)} for this plane
+        prepared are the keys returned by prepare_plane, when the plane is already written
+        '''
+        start = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = start
+        if prepared is None:
+            self.prepare_plane(data, plane)
+        self.write_time += time.perf_counter() - start
+        self.raw_bytes += data.nbytes
+
+        if coordinates is not None:
+            for name, (value, units) in coordinates.items():
+                self.coordinates.setdefault(name, {'units': units, 'values': {}})['values'][plane] = value
+
+        self.planes_written = max(self.planes_written, plane + 1)
+
+    def close(self):
+        '''Trims the array to the planes written and saves the coordinates'''
+        if self.frame_shape is not None:
+            if self.planes_written < self.number_of_planes:
+                self.write_array_metadata(self.planes_written)
+            zattrs_path = os.path.join(self.filename, '.zattrs')
+            with open(zattrs_path) as zattrs_file:
+                zattrs = json.load(zattrs_file)
+            zattrs['coordinates'] = {name: {'units':    coordinate['units'],
+                                            'values':   [coordinate['values'].get(plane) for plane in range(self.planes_written)]}
+                                     for name, coordinate in self.coordinates.items()}
+            self.write_json('.zattrs', zattrs)
+        self.end_time = time.perf_counter()
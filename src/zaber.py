@@ -0,0 +1,341 @@
+'''
+Created on October 17, 2026
+'''
+
+import math
+import time
+import heapq
+import struct
+import itertools
+import threading
+
+# Binary protocol frame: device number, command number, data (signed 32 bits, little endian)
+FRAME = struct.Struct('<BBi')
+FRAME_SIZE = FRAME.size
+
+# Command numbers of the binary protocol
+COMMANDS = {}
+COMMANDS['reset']                   = 0
+COMMANDS['home']                    = 1
+COMMANDS['move absolute']           = 20
+COMMANDS['move relative']           = 21
+COMMANDS['stop']                    = 23
+COMMANDS['set target speed']        = 42
+COMMANDS['set acceleration']        = 43
+COMMANDS['return device id']        = 50
+COMMANDS['return setting']          = 53
+COMMANDS['echo data']               = 55
+COMMANDS['return current position'] = 60
+COMMANDS['error']                   = 255
+
+# Commands replying once the move is completed
+MOVE_COMMANDS = (COMMANDS['home'], COMMANDS['move absolute'], COMMANDS['move relative'])
+# Commands ending the current move
+INTERRUPTING_COMMANDS = MOVE_COMMANDS + (COMMANDS['stop'],)
+
+# T-series settings units: speed in 9.375 microsteps/s, acceleration in 11250 microsteps/s^2
+SPEED_UNIT = 9.375
+ACCELERATION_UNIT = 11250
+
+# Simulated stages by device ID (speed in mm/s and acceleration in mm/s^2 are approximate defaults)
+STAGES = {}
+STAGES[6210] = {'name': 'T-LSM050A', 'microstep size': 0.047625, 'microsteps max': 1066666, 'speed': 7.0,  'acceleration': 100.0}
+STAGES[6320] = {'name': 'T-LSM100B', 'microstep size': 0.19050,  'microsteps max': 533333,  'speed': 29.0, 'acceleration': 200.0}
+STAGES[4152] = {'name': 'T-LSR150B', 'microstep size': 0.49609,  'microsteps max': 258015,  'speed': 20.0, 'acceleration': 200.0}
+
+# Error codes (data of an error reply)
+ERROR_ABSOLUTE_OUT_OF_RANGE = 20
+ERROR_RELATIVE_OUT_OF_RANGE = 21
+ERROR_COMMAND_INVALID       = 64
+
+
+def wrap_data(data):
+    '''Wraps a data value into the signed 32 bits range (negative values may also be given as unsigned)'''
+    data = math.floor(data)
+    return ((data + 0x80000000) % 0x100000000) - 0x80000000
+
+
+def encode(device_number:int, cmd_no:int, data=0):
+    '''Returns the 6-byte instruction for a command'''
+    return FRAME.pack(int(device_number), int(cmd_no), wrap_data(data))
+
+
+def decode(frame:bytes):
+    '''Returns the (device number, command number, data) of a 6-byte reply'''
+    return FRAME.unpack(frame)
+
+
+def encode_batch(instructions):
+    '''
+    Serializes (device number, command number, data) instructions into a single buffer
+
+    The buffer is sent with a single write. A device handles one command at a time and a new
+    move replaces the current one, so a batch holds at most one move per device.
+    '''
+    instructions = list(instructions)
+    buffer = bytearray(FRAME_SIZE * len(instructions))
+    for index, (device_number, cmd_no, data) in enumerate(instructions):
+        FRAME.pack_into(buffer, index * FRAME_SIZE, int(device_number), int(cmd_no), wrap_data(data))
+    return bytes(buffer)
+
+
+def decode_batch(frames:bytes):
+    '''Returns the list of (device number, command number, data) of consecutive 6-byte frames'''
+    return list(FRAME.iter_unpack(frames[:len(frames) - len(frames) % FRAME_SIZE]))
+
+
+class SimulatedDevice:
+    '''
+    Zaber device answering binary protocol instructions
+
+    Moves are completed immediately. process() returns the reply the device sends once the
+    command is done (None for commands without reply) and the time it is done.
+    '''
+
+    def __init__(self, device_number:int, device_id:int, microsteps_max:int, position:int=0):
+        self.device_number = device_number
+        self.device_id = device_id
+        self.microsteps_max = microsteps_max
+        self.position = position
+        self.settings = {COMMANDS['set target speed']: 2922, COMMANDS['set acceleration']: 11}
+
+    def reply(self, cmd_no:int, data=0):
+        return encode(self.device_number, cmd_no, data)
+
+    def error(self, code:int):
+        return encode(self.device_number, COMMANDS['error'], code)
+
+    def target(self, cmd_no:int, data:int, now:float):
+        '''Target position of a move command (None if the command does not move the device)'''
+        if cmd_no == COMMANDS['home']:
+            return 0
+        elif cmd_no == COMMANDS['move absolute']:
+            return data
+        elif cmd_no == COMMANDS['move relative']:
+            return self.current_position(now) + data
+        return None
+
+    def current_position(self, now:float):
+        '''Position (in microsteps) at time now'''
+        return self.position
+
+    def start_move(self, target:int, now:float):
+        '''Starts a move to target at time now, returns the time the move is completed'''
+        self.position = target
+        return now
+
+    def stop(self, now:float):
+        '''Stops the device at time now'''
+        self.position = self.current_position(now)
+
+    def process(self, instruction:bytes, now:float=0.0):
+        '''Executes a 6-byte instruction received at time now, returns (6-byte reply, reply time)'''
+        device_number, cmd_no, data = decode(instruction)
+        if device_number not in (0, self.device_number):
+            return None, now
+
+        if cmd_no in (COMMANDS['home'], COMMANDS['move absolute'], COMMANDS['move relative']):
+            target = self.target(cmd_no, data, now)
+            if not 0 <= target <= self.microsteps_max:
+                return self.error(ERROR_ABSOLUTE_OUT_OF_RANGE if cmd_no == COMMANDS['move absolute'] else ERROR_RELATIVE_OUT_OF_RANGE), now
+            done = self.start_move(target, now)
+            return self.reply(cmd_no, target), done
+        elif cmd_no == COMMANDS['stop']:
+            self.stop(now)
+            return self.reply(cmd_no, self.position), now
+        elif cmd_no == COMMANDS['return current position']:
+            return self.reply(cmd_no, self.current_position(now)), now
+        elif cmd_no == COMMANDS['return device id']:
+            return self.reply(cmd_no, self.device_id), now
+        elif cmd_no == COMMANDS['echo data']:
+            return self.reply(cmd_no, data), now
+        elif cmd_no in self.settings:
+            self.settings[cmd_no] = data
+            return self.reply(cmd_no, data), now
+        elif cmd_no == COMMANDS['return setting']:
+            if data == COMMANDS['return current position']:
+                return self.reply(data, self.current_position(now)), now
+            elif data in self.settings:
+                return self.reply(data, self.settings[data]), now
+        elif cmd_no == COMMANDS['reset']:
+            self.stop(now)
+            self.position = 0
+            return None, now
+        return self.error(ERROR_COMMAND_INVALID), now
+
+
+class SimulatedStage(SimulatedDevice):
+    '''
+    Simulated T-series linear stage with trapezoidal move profiles
+
+    Travel speed and acceleration follow the 'set target speed' and 'set acceleration' settings
+    (T-series units), positions are interpolated along the profile while the stage moves.
+    '''
+
+    def __init__(self, device_number:int, device_id:int, position:int=0):
+        model = STAGES[device_id]
+        super().__init__(device_number, device_id, model['microsteps max'], position)
+        self.name = model['name']
+        self.microstep_size = model['microstep size']
+
+        # Default target speed and acceleration, from mm/s and mm/s^2
+        microsteps_per_mm = 1000 / self.microstep_size
+        self.settings[COMMANDS['set target speed']] = round(model['speed'] * microsteps_per_mm / SPEED_UNIT)
+        self.settings[COMMANDS['set acceleration']] = max(1, round(model['acceleration'] * microsteps_per_mm / ACCELERATION_UNIT))
+
+        # Current move profile
+        self.move_origin = position
+        self.move_start = 0.0
+        self.move_duration = 0.0
+        self.move_peak_speed = 0.0
+
+    def speed(self):
+        '''Target speed (in microsteps/s)'''
+        return max(1, self.settings[COMMANDS['set target speed']]) * SPEED_UNIT
+
+    def acceleration(self):
+        '''Acceleration (in microsteps/s^2)'''
+        return max(1, self.settings[COMMANDS['set acceleration']]) * ACCELERATION_UNIT
+
+    def move_time(self, distance:float):
+        '''Duration and peak speed of a move over distance microsteps'''
+        speed = self.speed()
+        acceleration = self.acceleration()
+        if distance >= speed * speed / acceleration:
+            return distance / speed + speed / acceleration, speed
+        # Too short to reach the target speed
+        ramp_time = (distance / acceleration) ** 0.5
+        return 2 * ramp_time, acceleration * ramp_time
+
+    def current_position(self, now:float):
+        elapsed = now - self.move_start
+        if elapsed >= self.move_duration:
+            return self.position
+        acceleration = self.acceleration()
+        ramp_time = self.move_peak_speed / acceleration
+        ramp_distance = 0.5 * acceleration * ramp_time * ramp_time
+        distance = abs(self.position - self.move_origin)
+        if elapsed < ramp_time:
+            travelled = 0.5 * acceleration * elapsed * elapsed
+        elif elapsed < self.move_duration - ramp_time:
+            travelled = ramp_distance + self.move_peak_speed * (elapsed - ramp_time)
+        else:
+            remaining = self.move_duration - elapsed
+            travelled = distance - 0.5 * acceleration * remaining * remaining
+        direction = 1 if self.position >= self.move_origin else -1
+        return int(round(self.move_origin + direction * travelled))
+
+    def start_move(self, target:int, now:float):
+        self.move_origin = self.current_position(now)
+        self.position = target
+        self.move_start = now
+        self.move_duration, self.move_peak_speed = self.move_time(abs(target - self.move_origin))
+        return now + self.move_duration
+
+    def stop(self, now:float):
+        # Deceleration is not modelled, the stage stops where it is
+        self.position = self.current_position(now)
+        self.move_duration = 0.0
+
+    def is_moving(self, now:float):
+        return now - self.move_start < self.move_duration
+
+
+class SimulatedPort:
+    '''
+    Serial port with simulated Zaber stages daisy-chained on it (same interface as serial.Serial)
+
+    Each 6-byte frame takes 60 bit times on the line (8N1), 6.25 ms at 9600 baud, in both
+    directions. Instructions are received one after the other, and a reply is read once the
+    command is done plus one frame time. A move interrupted by a new move or a stop replies
+    at once with the position reached.
+    '''
+
+    def __init__(self, devices=None, baudrate:int=9600, timeout:float=0.1):
+        if devices is None:
+            devices = [SimulatedStage(1, 6210), SimulatedStage(2, 6320), SimulatedStage(3, 4152)]
+        self.devices = list(devices)
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.frame_time = 10 * FRAME_SIZE / baudrate
+
+        self.condition = threading.Condition()
+        self.line_free = 0.0    # Time the instruction line is free
+        self.replies = []       # Heap of [reply time, sequence, reply, valid]
+        self.moves = {}         # Pending move reply by device number
+        self.sequence = itertools.count()
+        self.input = bytearray()
+        self.is_open = True
+
+    def reset_input_buffer(self):
+        with self.condition:
+            self.input.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def open(self):
+        with self.condition:
+            self.is_open = True
+
+    def close(self):
+        with self.condition:
+            self.is_open = False
+            self.condition.notify_all()
+
+    def schedule(self, reply_time:float, reply:bytes):
+        entry = [reply_time, next(self.sequence), reply, True]
+        heapq.heappush(self.replies, entry)
+        return entry
+
+    def write(self, data:bytes):
+        '''Sends instructions to the devices, returns the number of bytes written'''
+        data = bytes(data)
+        with self.condition:
+            now = time.monotonic()
+            for offset in range(0, len(data) - len(data) % FRAME_SIZE, FRAME_SIZE):
+                instruction = data[offset:offset + FRAME_SIZE]
+                received = max(now, self.line_free) + self.frame_time
+                self.line_free = received
+                device_number, cmd_no, _ = decode(instruction)
+                for device in self.devices:
+                    if device_number not in (0, device.device_number):
+                        continue
+                    if cmd_no in INTERRUPTING_COMMANDS:
+                        self.interrupt(device, received)
+                    reply, done = device.process(instruction, received)
+                    if reply is not None:
+                        entry = self.schedule(done + self.frame_time, reply)
+                        if cmd_no in MOVE_COMMANDS and reply[1] == cmd_no:
+                            self.moves[device.device_number] = entry
+            self.condition.notify_all()
+        return len(data)
+
+    def interrupt(self, device:SimulatedDevice, now:float):
+        '''Replies at once to the pending move of a device'''
+        entry = self.moves.pop(device.device_number, None)
+        if entry is not None and entry[3] and entry[0] > now + self.frame_time:
+            entry[3] = False
+            self.schedule(now + self.frame_time, encode(device.device_number, entry[2][1], device.current_position(now)))
+
+    def read(self, size:int=1):
+        '''Reads up to size bytes, waits at most timeout seconds'''
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                while self.replies and self.replies[0][0] <= now:
+                    entry = heapq.heappop(self.replies)
+                    if entry[3]:
+                        self.input += entry[2]
+                if len(self.input) >= size or not self.is_open:
+                    break
+                if deadline is not None and now >= deadline:
+                    break
+                wait = self.replies[0][0] - now if self.replies else None
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self.condition.wait(wait)
+            data = bytes(self.input[:size])
+            del self.input[:size]
+        return data
@@ -0,0 +1,45 @@
+'''
+Created on October 17, 2026
+'''
+
+import pytest
+
+from src import zaber
+from src.motors import ZaberConnection
+
+
+class FailingPort(zaber.SimulatedPort):
+    '''Simulated port whose next read raises once failing is set'''
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+
+    def read(self, size:int=1):
+        if self.failing:
+            self.failing = False
+            raise OSError('device disconnected')
+        return super().read(size)
+
+
+def test_read_error_fails_pending_commands_and_reopens():
+    port = FailingPort()
+    connection = ZaberConnection('sim', transport = port)
+    try:
+        # No device 9 on the port, the command waits until the read error
+        pending = connection.submit(zaber.encode(9, 60, 0))
+        port.failing = True
+        with pytest.raises(OSError):
+            pending.result(2.0)
+        connection.reader_thread.join(2.0)
+        assert not connection.connected
+        assert connection.serial is None
+        assert connection.pending == {}
+        assert connection.error
+
+        # The next command reopens the port
+        reply = connection.request(zaber.encode(2, 60, 0), 2.0)
+        assert reply is not None and zaber.decode(reply)[:2] == (2, 60)
+        assert connection.connected
+    finally:
+        connection.close()
@@ -0,0 +1,183 @@
+'''
+Created on October 17, 2026
+'''
+
+import numpy as np
+import pytest
+
+from src.stitching import FrameRing, LinearBlendStitcher, stitch_tiles, crop_tiles
+
+
+# Reference implementations: column by column reconstruction of the controller before vectorization
+
+def reference_crop(buffer):
+    '''Crops each tile with 20% overlap on both sides (previous Controller.reconstruct_frame_linear_blend)'''
+    tile_count, image_ysize, image_xsize = buffer.shape
+    tile_width = int(image_xsize/tile_count)
+    tile_width_overlap = int(tile_width*0.2)
+    cropped_buffer = np.zeros((tile_count, image_ysize, tile_width + (2*tile_width_overlap)), np.uint16)
+    for frame in range(tile_count):
+        first_column = int(frame * tile_width - tile_width_overlap)
+        next_first_column = int(first_column + tile_width + (2*tile_width_overlap))
+        if frame == 0:
+            cropped_buffer[frame,:,tile_width_overlap:] = buffer[frame,:,0:tile_width + tile_width_overlap]
+        elif frame == tile_count-1:
+            last_column_step = int(image_xsize - first_column)
+            cropped_buffer[frame,:,0:last_column_step] = buffer[frame,:,first_column:]
+        else:
+            cropped_buffer[frame,:,:] = buffer[frame,:,first_column:next_first_column]
+    return cropped_buffer
+
+
+def reference_linear_blend(buffer):
+    '''Previous Controller.reconstruct_frame_linear_blend'''
+    tile_count, image_ysize, image_xsize = buffer.shape
+    reconstructed_frame = np.zeros((image_ysize, image_xsize), np.uint16)
+    tile_width = int(image_xsize/tile_count)
+    tile_width_overlap = int(tile_width*0.2)
+    cropped_buffer = reference_crop(buffer)
+    weight_step = 1/(2*tile_width_overlap)
+    for frame in range(tile_count):
+        first_center_column = int(frame * tile_width + tile_width_overlap)
+        last_center_column = int((frame+1) * tile_width - tile_width_overlap)
+        previous_last_center_column = int(frame * tile_width - tile_width_overlap)
+        if frame == 0:
+            reconstructed_frame[:,0:last_center_column] = cropped_buffer[frame,:,tile_width_overlap:tile_width]
+        else:
+            for column in range(2*tile_width_overlap):
+                frame_column = column + previous_last_center_column
+                last_buffer_column = column + tile_width
+                buffer_weight = column * weight_step
+                last_buffer_weight = 1 - column * weight_step
+                reconstructed_frame[:,frame_column] = buffer_weight*cropped_buffer[frame,:,column] + last_buffer_weight*cropped_buffer[(frame-1),:,last_buffer_column]
+            if frame == tile_count-1:
+                last_column_step = int(image_xsize - first_center_column)
+                reconstructed_frame[:,first_center_column:] = cropped_buffer[frame,:,(2*tile_width_overlap):(2*tile_width_overlap)+last_column_step]
+            else:
+                reconstructed_frame[:,first_center_column:last_center_column] = cropped_buffer[frame,:,(2*tile_width_overlap):tile_width]
+    return reconstructed_frame
+
+
+def reference_stitch(buffer):
+    '''Previous Controller.reconstruct_frame (no overlap)'''
+    tile_count, image_ysize, image_xsize = buffer.shape
+    reconstructed_frame = np.zeros((image_ysize, image_xsize), np.uint16)
+    tile_width = int(image_xsize/tile_count)
+    for frame in range(tile_count):
+        first_column = frame * tile_width
+        next_first_column = first_column + tile_width
+        if frame == tile_count-1:
+            reconstructed_frame[:,first_column:] = buffer[frame,:,first_column:]
+        else:
+            reconstructed_frame[:,first_column:next_first_column] = buffer[frame,:,first_column:next_first_column]
+    return reconstructed_frame
+
+
+def random_buffer(tile_count, ysize, xsize, seed=0):
+    return np.random.default_rng(seed).integers(0, 65536, (tile_count, ysize, xsize), dtype=np.uint16)
+
+
+SHAPES = [(2, 16, 100), (3, 8, 64), (5, 12, 101), (6, 20, 256)]
+
+
+@pytest.mark.parametrize('tile_count, ysize, xsize', SHAPES)
+def test_linear_blend_matches_column_loop(tile_count, ysize, xsize):
+    buffer = random_buffer(tile_count, ysize, xsize)
+    expected = reference_linear_blend(buffer)
+    stitcher = LinearBlendStitcher()
+    np.testing.assert_array_equal(stitcher.stitch(buffer), expected)
+    # Sequence of 2D images and preallocated output frame
+    out = np.full((ysize, xsize), 7, np.uint16)
+    assert stitcher.stitch(list(buffer), out=out) is out
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize('tile_count, ysize, xsize', SHAPES)
+def test_linear_blend_float32_within_one_count(tile_count, ysize, xsize):
+    buffer = random_buffer(tile_count, ysize, xsize, seed=1)
+    difference = LinearBlendStitcher(accumulation=np.float32).stitch(buffer).astype(np.int32) - reference_linear_blend(buffer)
+    assert np.abs(difference).max() <= 1
+
+
+def test_linear_blend_single_tile():
+    buffer = random_buffer(1, 8, 32)
+    np.testing.assert_array_equal(LinearBlendStitcher().stitch(buffer), buffer[0])
+
+
+@pytest.mark.parametrize('tile_count, ysize, xsize', SHAPES)
+def test_stitch_tiles_matches_column_loop(tile_count, ysize, xsize):
+    buffer = random_buffer(tile_count, ysize, xsize, seed=2)
+    out = np.empty((ysize, xsize), np.uint16)
+    np.testing.assert_array_equal(stitch_tiles(list(buffer), out), reference_stitch(buffer))
+
+
+@pytest.mark.parametrize('tile_count, ysize, xsize', SHAPES)
+def test_crop_tiles_matches_previous_crop(tile_count, ysize, xsize):
+    buffer = random_buffer(tile_count, ysize, xsize, seed=3)
+    expected = reference_crop(buffer)
+    # Reused buffers hold the previous crop, columns outside the image must be zeroed
+    out = np.full(expected.shape, 9, np.uint16)
+    np.testing.assert_array_equal(crop_tiles(list(buffer), 0.2, out), expected)
+
+
+def test_frame_ring_reuses_released_frames():
+    ring = FrameRing()
+    frame = ring.next((4, 6))
+    assert frame.shape == (4, 6) and frame.dtype == np.uint16
+    ring.release(frame)
+    assert ring.next((4, 6)) is frame
+
+
+def test_frame_ring_keeps_held_frames():
+    ring = FrameRing()
+    frame = ring.next((4, 6))
+    # A consumer holds the frame (e.g. save queue) after its producer released it
+    ring.acquire(frame)
+    ring.release(frame)
+    other = ring.next((4, 6))
+    assert other is not frame
+    ring.release(frame)
+    ring.release(other)
+    assert ring.next((4, 6)) is frame
+
+
+def test_frame_ring_views_and_slices_hold_their_frame():
+    ring = FrameRing()
+    frame = ring.next((4, 6))
+    ring.release(frame)
+    ring.next((4, 6))
+    # Views and slices of a ring frame acquire and release the frame itself
+    view = np.transpose(frame)[1:3]
+    ring.acquire(view)
+    ring.release(frame)
+    assert ring.next((4, 6)) is not frame
+    ring.release(view)
+    assert ring.in_use() == 1
+
+
+def test_frame_ring_ignores_other_arrays():
+    ring = FrameRing()
+    frame = ring.next((4, 6))
+    ring.acquire(np.zeros((4, 6), np.uint16))
+    ring.release(np.zeros((4, 6), np.uint16))
+    ring.release(None)
+    assert ring.in_use() == 1
+    ring.release(frame)
+    assert ring.in_use() == 0
+
+
+def test_frame_ring_allocates_past_max_frames():
+    ring = FrameRing(max_frames=2)
+    frames = [ring.next((2, 2)) for _ in range(3)]
+    assert len({id(frame) for frame in frames}) == 3
+    assert len(ring.frames) == 2
+
+
+def test_frame_ring_shape_change_resets_ring():
+    ring = FrameRing()
+    frame = ring.next((4, 6))
+    ring.release(frame)
+    assert ring.next((6, 4)).shape == (6, 4)
+    # Frames of the previous shape are forgotten
+    ring.release(frame)
+    assert ring.in_use() == 1
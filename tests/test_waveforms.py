@@ -0,0 +1,131 @@
+'''
+Created on October 17, 2026
+'''
+
+import numpy as np
+import pytest
+
+from src.waveforms import squarewave, squarewave_period, sawtooth, sawtooth_period, staircase, staircase_levels, staircase_samples
+
+
+# Reference implementations: waveform generators before vectorization
+
+def reference_squarewave(pre_samples, active_samples, post_samples, shift, repeat, inverted=False):
+    period_vector = np.concatenate((np.full(pre_samples, False), np.full(active_samples, True), np.full(post_samples, False)))
+    if shift!=0:
+        period_vector = np.concatenate((period_vector[-shift:], period_vector[:-shift]))
+    if inverted:
+        period_vector = ~period_vector
+    return np.tile(period_vector, repeat)
+
+
+def reference_sawtooth(activated, pre_samples, trace_samples, retrace_samples, post_samples, shift, repeat, amplitude, offset, inverted, filtered=True):
+    period_samples = pre_samples + trace_samples + retrace_samples + post_samples
+    if activated:
+        period_vector = np.concatenate((np.zeros(pre_samples), np.linspace(0, 1, trace_samples), np.linspace(1, 0, retrace_samples), np.zeros(post_samples)))
+        if shift!=0:
+            period_vector = np.concatenate((period_vector[-shift:], period_vector[:-shift]))
+        if inverted:
+            period_vector = amplitude * (-period_vector + 1) + offset
+        else:
+            period_vector = amplitude * period_vector + offset
+        if filtered:
+            pad = retrace_samples//10
+            win = 2*pad + 1
+            tmpvec = np.concatenate((period_vector[-pad:], period_vector, period_vector[:pad]))
+            cusum = np.cumsum(np.insert(tmpvec, 0, 0))
+            period_vector = (cusum[win:] - cusum[:-win]) / win
+    else:
+        period_vector = np.ones((period_samples)) * offset
+    return np.tile(period_vector, repeat)
+
+
+def reference_staircase(activated, step_samples, nbr_steps, shift, amplitude, offset, direction='up', filtered=True):
+    total_samples = step_samples * nbr_steps
+    if activated:
+        if nbr_steps != 1:
+            step_run = step_samples
+            step_rise = amplitude/(nbr_steps-1)
+            if direction == 'down':
+                output_vector = np.ones(total_samples) * (offset + amplitude)
+                for step in range(nbr_steps):
+                    output_vector[step*step_run:(step+1)*step_run] = (offset + amplitude) - step * step_rise * np.ones(step_run)
+            else:
+                output_vector = np.ones(total_samples) * offset
+                for step in range(nbr_steps):
+                    output_vector[step*step_run:(step+1)*step_run] = offset + step * step_rise * np.ones(step_run)
+            if shift!=0:
+                output_vector = np.concatenate((output_vector[-shift:], output_vector[:-shift]))
+            if filtered:
+                pad = step_run//25
+                win = 2*(step_run//25) + 1
+                for _ in range(2):
+                    tmpvec = np.concatenate((output_vector[:pad], output_vector, output_vector[-pad:]))
+                    cusum = np.cumsum(np.insert(tmpvec, 0, 0))
+                    output_vector = (cusum[win:] - cusum[:-win]) / win
+        else:
+            output_vector = np.ones(total_samples) * (offset + amplitude/2)
+    else:
+        output_vector = np.ones((total_samples)) * offset
+    return output_vector
+
+
+@pytest.mark.parametrize('shift', [0, 3, -5, 140])
+@pytest.mark.parametrize('inverted', [False, True])
+def test_squarewave_matches_reference(shift, inverted):
+    arguments = dict(pre_samples=50, active_samples=80, post_samples=20, shift=shift, inverted=inverted)
+    np.testing.assert_array_equal(squarewave(repeat=4, **arguments), reference_squarewave(repeat=4, **arguments))
+    np.testing.assert_array_equal(squarewave_period(**arguments), reference_squarewave(repeat=1, **arguments))
+
+
+@pytest.mark.parametrize('activated', [False, True])
+@pytest.mark.parametrize('shift', [0, 7, -11])
+@pytest.mark.parametrize('inverted', [False, True])
+@pytest.mark.parametrize('filtered', [False, True])
+def test_sawtooth_matches_reference(activated, shift, inverted, filtered):
+    arguments = dict(activated=activated, pre_samples=30, trace_samples=200, retrace_samples=60, post_samples=10, shift=shift,
+                     amplitude=2.9, offset=-1.5, inverted=inverted, filtered=filtered)
+    np.testing.assert_allclose(sawtooth(repeat=3, **arguments), reference_sawtooth(repeat=3, **arguments), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(sawtooth_period(**arguments), reference_sawtooth(repeat=1, **arguments), rtol=0, atol=1e-9)
+
+
+STAIRCASES = [  dict(step_samples=100, nbr_steps=6, shift=0),
+                dict(step_samples=100, nbr_steps=6, shift=37),
+                dict(step_samples=250, nbr_steps=2, shift=-90),
+                dict(step_samples=1000, nbr_steps=10, shift=2999),
+                dict(step_samples=60, nbr_steps=5, shift=1),
+                dict(step_samples=500, nbr_steps=1, shift=20) ]
+
+
+@pytest.mark.parametrize('settings', STAIRCASES)
+@pytest.mark.parametrize('direction', ['up', 'down'])
+@pytest.mark.parametrize('filtered', [False, True])
+def test_staircase_matches_reference(settings, direction, filtered):
+    arguments = dict(settings, amplitude=1.5, offset=2.7, direction=direction, filtered=filtered)
+    np.testing.assert_allclose(staircase(True, **arguments), reference_staircase(True, **arguments), rtol=0, atol=1e-9)
+
+
+def test_staircase_deactivated():
+    np.testing.assert_array_equal(staircase(False, 100, 4, 10, 1.5, 2.5), reference_staircase(False, 100, 4, 10, 1.5, 2.5))
+
+
+def test_staircase_output_buffer():
+    out = np.full(600, np.nan)
+    assert staircase(True, 100, 6, 37, 1.5, 2.7, out=out) is out
+    np.testing.assert_allclose(out, reference_staircase(True, 100, 6, 37, 1.5, 2.7), rtol=0, atol=1e-9)
+    with pytest.raises(ValueError):
+        staircase(True, 100, 6, 37, 1.5, 2.7, out=np.empty(500))
+
+
+@pytest.mark.parametrize('settings', STAIRCASES)
+@pytest.mark.parametrize('chunk_samples', [None, 1, 17, 333])
+def test_staircase_chunks_match_full_staircase(settings, chunk_samples):
+    levels = staircase_levels(True, settings['nbr_steps'], 1.5, 2.7, 'down')
+    full = staircase_samples(levels, settings['step_samples'], settings['shift'])
+    total_samples = full.size
+    # Step by step (period writes) by default
+    chunk_samples = chunk_samples or settings['step_samples']
+    chunks = [staircase_samples(levels, settings['step_samples'], settings['shift'], first_sample=first_sample,
+                                samples=min(chunk_samples, total_samples - first_sample))
+              for first_sample in range(0, total_samples, chunk_samples)]
+    np.testing.assert_allclose(np.concatenate(chunks), full, rtol=0, atol=1e-12)
@@ -0,0 +1,140 @@
+'''
+Created on October 17, 2026
+'''
+
+import os
+import csv
+import json
+import numpy as np
+import h5py
+import tifffile
+import pytest
+
+from src.writers import HDF5VolumeWriter, TiffVolumeWriter, ZarrVolumeWriter, block_mean, pyramid_levels
+
+
+def random_planes(number_of_planes, frame_shape, seed=0):
+    return np.random.default_rng(seed).integers(0, 4096, (number_of_planes,) + tuple(frame_shape), dtype=np.uint16)
+
+
+def write_volume(writer, planes, prepare=True):
+    for plane, data in enumerate(planes):
+        prepared = writer.prepare_plane(data, plane) if prepare else None
+        writer.write_plane(plane, data, {'Horizontal Position': (10.0 * plane, 'μm')}, prepared)
+    writer.close()
+
+
+def test_block_mean():
+    image = np.arange(6 * 9, dtype=np.uint16).reshape(6, 9)
+    expected = image[:6, :8].reshape(3, 2, 4, 2).mean(axis=(1, 3))
+    np.testing.assert_allclose(block_mean(image, 2), expected)
+    assert block_mean(image, 2).dtype == np.float32
+    # Leading axes (ETL images) are kept
+    images = np.stack([image, 2 * image])
+    np.testing.assert_allclose(block_mean(images, 3)[1], 2 * block_mean(image, 3))
+
+
+def test_pyramid_levels_match_direct_downsampling():
+    image = random_planes(1, (64, 96))[0]
+    levels = pyramid_levels(image, (4, 2, 8))
+    assert [level.shape for level in levels] == [(32, 48), (16, 24), (8, 12)]
+    for factor, level in zip((2, 4, 8), levels):
+        assert level.dtype == image.dtype
+        # Levels reduced from the previous level are the block mean of the image (up to rounding)
+        assert np.abs(level.astype(np.int32) - np.rint(block_mean(image, factor))).max() <= 1
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip', 'lzf'])
+@pytest.mark.parametrize('frame_shape', [(32, 48), (3, 32, 48)])
+def test_hdf5_round_trip(tmp_path, compression, frame_shape):
+    planes = random_planes(4, frame_shape)
+    filename = str(tmp_path / 'volume.hdf5')
+    writer = HDF5VolumeWriter(filename, 4, 'stack', {'Sample Name': 'beads'}, compression, pyramid=(2,))
+    write_volume(writer, planes)
+    with h5py.File(filename, 'r') as volume:
+        np.testing.assert_array_equal(volume['stack'][()], planes)
+        assert volume['stack'].attrs['Sample Name'] == 'beads'
+        np.testing.assert_array_equal(volume['stack_2x'][()], np.stack([pyramid_levels(plane, (2,))[0] for plane in planes]))
+        np.testing.assert_array_equal(volume['Horizontal Position'][()], [0.0, 10.0, 20.0, 30.0])
+
+
+def test_hdf5_interrupted_volume_is_trimmed(tmp_path):
+    planes = random_planes(2, (16, 16))
+    filename = str(tmp_path / 'volume.hdf5')
+    write_volume(HDF5VolumeWriter(filename, 5, 'stack'), planes, prepare=False)
+    with h5py.File(filename, 'r') as volume:
+        assert volume['stack'].shape == (2, 16, 16)
+        assert volume['Horizontal Position'].shape == (2,)
+
+
+def test_tiff_round_trip(tmp_path):
+    planes = random_planes(3, (2, 16, 24))
+    filename = str(tmp_path / 'volume.ome.tif')
+    writer = TiffVolumeWriter(filename, 4, 'stack')
+    # Plane 1 is dropped, it is written as an empty plane
+    for plane in (0, 2):
+        writer.write_plane(plane, planes[plane], {'Horizontal Position': (10.0 * plane, 'μm')})
+    writer.close()
+    volume = tifffile.imread(filename)
+    assert volume.shape == (4, 2, 16, 24)
+    np.testing.assert_array_equal(volume[0], planes[0])
+    np.testing.assert_array_equal(volume[1], 0)
+    np.testing.assert_array_equal(volume[2], planes[2])
+    np.testing.assert_array_equal(volume[3], 0)
+    with open(writer.coordinates_filename(), newline='') as coordinates_file:
+        rows = list(csv.reader(coordinates_file))
+    assert rows[0] == ['Plane', 'Horizontal Position (μm)']
+    assert rows[1:] == [['0', '0.0'], ['1', ''], ['2', '20.0']]
+
+
+@pytest.mark.parametrize('writer_class, extension', [(HDF5VolumeWriter, '.hdf5'), (TiffVolumeWriter, '.ome.tif'), (ZarrVolumeWriter, '.ome.zarr')])
+def test_buffer_reused_after_write_plane(tmp_path, writer_class, extension):
+    # Reusable frames (FrameRing) are overwritten by the next plane as soon as write_plane returns
+    planes = random_planes(6, (16, 24))
+    filename = str(tmp_path / ('volume' + extension))
+    writer = writer_class(filename, 6, 'stack')
+    buffer = np.empty((16, 24), np.uint16)
+    for plane, data in enumerate(planes):
+        buffer[:] = data
+        writer.write_plane(plane, buffer, None, writer.prepare_plane(buffer, plane))
+    buffer[:] = 0
+    writer.close()
+    if writer_class is HDF5VolumeWriter:
+        with h5py.File(filename, 'r') as volume:
+            np.testing.assert_array_equal(volume['stack'][()], planes)
+    elif writer_class is TiffVolumeWriter:
+        np.testing.assert_array_equal(tifffile.imread(filename), planes)
+    else:
+        zarr = pytest.importorskip('zarr')
+        np.testing.assert_array_equal(zarr.open_group(filename, mode='r')['0'][:], planes)
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip'])
+def test_zarr_round_trip(tmp_path, compression):
+    zarr = pytest.importorskip('zarr')
+    planes = random_planes(3, (2, 32, 48))
+    filename = str(tmp_path / 'volume.ome.zarr')
+    writer = ZarrVolumeWriter(filename, 4, 'stack', {'Sample Name': 'beads'}, compression, pyramid=(2,))
+    write_volume(writer, planes)
+    group = zarr.open_group(filename, mode='r')
+    # ETL images along the first (channel) axis, volume trimmed to the planes written
+    np.testing.assert_array_equal(group['0'][:], planes.transpose(1, 0, 2, 3))
+    np.testing.assert_array_equal(group['1'][:], np.stack([pyramid_levels(plane, (2,))[0] for plane in planes]).transpose(1, 0, 2, 3))
+    with open(os.path.join(filename, '.zattrs')) as zattrs_file:
+        zattrs = json.load(zattrs_file)
+    assert zattrs['Sample Name'] == 'beads'
+    assert [dataset['path'] for dataset in zattrs['multiscales'][0]['datasets']] == ['0', '1']
+    assert zattrs['coordinates']['Horizontal Position']['values'] == [0.0, 10.0, 20.0]
+
+
+@pytest.mark.parametrize('writer_class, extension', [(HDF5VolumeWriter, '.hdf5'), (ZarrVolumeWriter, '.ome.zarr')])
+def test_statistics_count_pyramid_levels_separately(tmp_path, writer_class, extension):
+    planes = random_planes(3, (64, 64))
+    writer = writer_class(str(tmp_path / ('volume' + extension)), 3, 'stack', {}, 'none', pyramid=(2, 4))
+    write_volume(writer, planes)
+    statistics = writer.statistics()
+    assert statistics['raw'] == planes.nbytes
+    assert statistics['stored'] == planes.nbytes
+    assert statistics['ratio'] == pytest.approx(1.0)
+    assert statistics['pyramid raw'] == planes.nbytes // 4 + planes.nbytes // 16
+    assert statistics['pyramid stored'] == statistics['pyramid raw']
@@ -0,0 +1,65 @@
+'''
+Created on October 17, 2026
+'''
+
+import numpy as np
+import pytest
+
+from src import zaber
+
+
+# Reference implementations: byte by byte conversions of ZaberMotor before the struct codec
+
+def reference_encode(device_number, cmd_no, cmd_param):
+    if cmd_param < 0:
+        cmd_param = pow(256,4) + cmd_param
+    byte_6 = int(cmd_param // pow(256,3))
+    cmd_param = cmd_param % pow(256,3)
+    byte_5 = int(cmd_param // pow(256,2))
+    cmd_param = cmd_param % pow(256,2)
+    byte_4 = int(cmd_param // pow(256,1))
+    cmd_param = cmd_param % pow(256,1)
+    byte_3 = int(cmd_param // pow(256,0))
+    return bytes([int(device_number), int(cmd_no), byte_3, byte_4, byte_5, byte_6])
+
+
+def reference_decode(reply_bytes):
+    if reply_bytes[5] > 127:
+        reply_data = (pow(256,3) * reply_bytes[5] + pow(256,2) * reply_bytes[4] + pow(256,1) * reply_bytes[3] + pow(256,0) * reply_bytes[2]) - pow(256,4)
+    else:
+        reply_data = (pow(256,3) * reply_bytes[5] + pow(256,2) * reply_bytes[4] + pow(256,1) * reply_bytes[3] + pow(256,0) * reply_bytes[2])
+    return reply_bytes[0], reply_bytes[1], reply_data
+
+
+EDGE_VALUES = [0, 1, -1, 255, 256, -256, 65535, 2**24, -2**24, 2**31 - 1, -2**31, 2**31, 2**32 - 1, 1000.7, -1.5, -0.5]
+
+
+@pytest.mark.parametrize('data', EDGE_VALUES)
+def test_encode_matches_byte_conversion(data):
+    assert zaber.encode(3, 20, data) == reference_encode(3, 20, data)
+
+
+def test_encode_decode_random_values():
+    rng = np.random.default_rng(0)
+    for data in rng.integers(-2**31, 2**31, 1000):
+        data = int(data)
+        frame = zaber.encode(2, 60, data)
+        assert frame == reference_encode(2, 60, data)
+        assert zaber.decode(frame) == (2, 60, data)
+
+
+def test_decode_matches_byte_conversion():
+    rng = np.random.default_rng(1)
+    for frame in rng.integers(0, 256, (1000, 6), dtype=np.uint8):
+        frame = bytes(frame)
+        assert zaber.decode(frame) == reference_decode(frame)
+
+
+def test_encode_batch_is_concatenated_frames():
+    instructions = [(1, 20, 12345), (2, 21, -500), (3, 1, 0), (1, 60, 2**31 - 1)]
+    buffer = zaber.encode_batch(instructions)
+    assert buffer == b''.join(reference_encode(*instruction) for instruction in instructions)
+    assert zaber.decode_batch(buffer) == instructions
+    # Incomplete trailing frames are ignored
+    assert zaber.decode_batch(buffer + b'\x01\x14') == instructions
+    assert zaber.encode_batch([]) == b''